@@ -2,6 +2,7 @@
 Django settings for gravimeasure project.
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 from decouple import config
@@ -35,12 +36,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'medicoes.metricas.MetricasMiddleware',
+    'medicoes.instrumentacao.InstrumentacaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'medicoes.roteamento.AderenciaPrimarioMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -66,9 +70,32 @@ CSRF_COOKIE_SECURE = False  # Ativar em produção
 
 ROOT_URLCONF = 'gravimeasure.urls'
 
+# Server-Timing e log JSON por requisição (consultas, banco, templates, RBF, contorno, PDF)
+INSTRUMENTACAO_ATIVA = config('INSTRUMENTACAO_ATIVA', default=False, cast=bool)
+
+# Métricas Prometheus em /metrics. Com vários workers (gunicorn), aponte METRICAS_DIR para um
+# diretório compartilhado, limpo a cada deploy, para o endpoint somar todos os processos.
+METRICAS_ATIVAS = config('METRICAS_ATIVAS', default=True, cast=bool)
+METRICAS_DIR = config('METRICAS_DIR', default='')
+METRICAS_INTERVALO_GRAVACAO = config('METRICAS_INTERVALO_GRAVACAO', default=1.0, cast=float)
+METRICAS_TOKEN = config('METRICAS_TOKEN', default='')  # se vazio, só os IPs abaixo podem coletar
+METRICAS_IPS = config('METRICAS_IPS', default='127.0.0.1,::1', cast=lambda v: [s.strip() for s in v.split(',')])
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'medicoes.instrumentacao': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que mede a renderização quando INSTRUMENTACAO_ATIVA
+        'BACKEND': 'medicoes.instrumentacao.TemplatesInstrumentados',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -93,9 +120,80 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
         'ATOMIC_REQUESTS': True,
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# PRAGMAs aplicados a cada conexão SQLite (medicoes/db_signals.py). WAL deixa leitores
+# lendo enquanto uma importação escreve; synchronous=NORMAL é seguro em WAL.
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),  # ms
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-20000, cast=int),  # negativo = KiB
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=128 * 1024 * 1024, cast=int),
+    'temp_store': config('SQLITE_TEMP_STORE', default='MEMORY'),
+}
+
+# PostGIS opcional (DB_ENGINE=postgis): coluna geométrica com índice GiST para as consultas espaciais.
+# Requer GDAL/GEOS no sistema e o driver psycopg; sem isso o projeto segue no SQLite.
+USA_POSTGIS = config('DB_ENGINE', default='sqlite') == 'postgis'
+if USA_POSTGIS:
+    DATABASES['default'] = {
+        'ENGINE': 'django.contrib.gis.db.backends.postgis',
+        'NAME': config('DB_NAME', default='gravimeasure'),
+        'USER': config('DB_USER', default='postgres'),
+        'PASSWORD': config('DB_PASSWORD', default=''),
+        'HOST': config('DB_HOST', default='localhost'),
+        'PORT': config('DB_PORT', default='5432'),
+        'ATOMIC_REQUESTS': True,
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+    }
+    INSTALLED_APPS.append('django.contrib.gis')
+
+# Réplica de leitura opcional (outro arquivo SQLite ou réplica Postgres). Só recebe o tráfego
+# marcado em medicoes/roteamento.py; quem acabou de gravar lê do principal por alguns segundos.
+DB_REPLICA_NAME = config('DB_REPLICA_NAME', default='')
+if DB_REPLICA_NAME:
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        NAME=DB_REPLICA_NAME,
+        HOST=config('DB_REPLICA_HOST', default=DATABASES['default'].get('HOST', '')),
+        ATOMIC_REQUESTS=False,
+        TEST={'MIRROR': 'default'},
+    )
+DATABASE_ROUTERS = ['medicoes.roteamento.RoteadorReplica']
+REPLICA_ADERENCIA_SEGUNDOS = config('REPLICA_ADERENCIA_SEGUNDOS', default=15, cast=int)
+
+# Cache (CACHE_BACKEND=locmem, file ou redis; redis só se o pacote estiver instalado).
+# Os dados das views usam namespaces versionados em medicoes/cache_dados.py.
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+if CACHE_BACKEND == 'redis' and find_spec('redis'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_LOCATION', default='redis://127.0.0.1:6379/1'),
+    }}
+elif CACHE_BACKEND == 'file':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache')),
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'gravimeasure',
+    }}
+CACHE_DADOS_SEGUNDOS = config('CACHE_DADOS_SEGUNDOS', default=300, cast=int)
+
+# Limite de tentativas de login (medicoes/limite_login.py): falhas contadas no cache em janela
+# deslizante, por identificador e por IP; o bloqueio dura uma janela e é gravado em LoginAttempt.
+# Com vários workers use CACHE_BACKEND=redis ou file: no locmem cada processo conta as próprias falhas.
+LOGIN_MAX_TENTATIVAS = config('LOGIN_MAX_TENTATIVAS', default=5, cast=int)
+LOGIN_MAX_TENTATIVAS_IP = config('LOGIN_MAX_TENTATIVAS_IP', default=50, cast=int)
+LOGIN_JANELA_SEGUNDOS = config('LOGIN_JANELA_SEGUNDOS', default=900, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -151,9 +249,21 @@ USE_I18N = True
 USE_L10N = True  # Permite que o Django entenda o formato brasileiro nos inputs
 USE_TZ = True
 
+# Fórmula de gravidade normal usada no cálculo das anomalias: igsn71, grs80 ou wgs84
+GRAVIDADE_NORMAL_FORMULA = config('GRAVIDADE_NORMAL_FORMULA', default='igsn71')
+
+# Modelo Digital de Elevação local (.asc ou .tif) para a correção de terreno
+MDE_PATH = config('MDE_PATH', default='')
+
+# Paginação da lista de medições: offset (páginas numeradas) ou, opcional, cursor (keyset em data_medicao, id)
+LISTA_PAGINACAO = config('LISTA_PAGINACAO', default='offset')
+
 # Custom User Model
 AUTH_USER_MODEL = 'medicoes.CustomUser'
 
+# Login por username ou email com uma consulta e uma verificação de senha
+AUTHENTICATION_BACKENDS = ['medicoes.autenticacao.EmailOuUsuarioBackend']
+
 # Login URL
 LOGIN_URL = 'medicoes:login'
 LOGIN_REDIRECT_URL = 'medicoes:home'
@@ -170,4 +280,25 @@ DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@gravimeasure.
 
 # Se quiser manter o console apenas se NÃO houver credenciais:
 if DEBUG and not EMAIL_HOST_USER:
-    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
\ No newline at end of file
+    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Fila de saída (medicoes/fila_email.py): as views só enfileiram; o comando send_queued_emails
+# envia em lotes por uma conexão SMTP e repete falhas com espera exponencial.
+EMAIL_FILA_LOTE = config('EMAIL_FILA_LOTE', default=50, cast=int)
+EMAIL_FILA_MAX_TENTATIVAS = config('EMAIL_FILA_MAX_TENTATIVAS', default=6, cast=int)
+EMAIL_FILA_ESPERA_SEGUNDOS = config('EMAIL_FILA_ESPERA_SEGUNDOS', default=60, cast=int)
+EMAIL_FILA_ESPERA_MAXIMA_SEGUNDOS = config('EMAIL_FILA_ESPERA_MAXIMA_SEGUNDOS', default=3600, cast=int)
+EMAIL_FILA_RESERVA_SEGUNDOS = config('EMAIL_FILA_RESERVA_SEGUNDOS', default=300, cast=int)
+
+# Limpeza periódica (medicoes/limpeza.py, comando housekeeping). REGISTRO_PENDENTE_DIAS também
+# é a validade do link de ativação do cadastro.
+REGISTRO_PENDENTE_DIAS = config('REGISTRO_PENDENTE_DIAS', default=7, cast=int)
+LIMPEZA_TENTATIVAS_DIAS = config('LIMPEZA_TENTATIVAS_DIAS', default=7, cast=int)
+LIMPEZA_EMAILS_DIAS = config('LIMPEZA_EMAILS_DIAS', default=30, cast=int)
+LIMPEZA_MIDIA_HORAS = config('LIMPEZA_MIDIA_HORAS', default=24, cast=int)
+LIMPEZA_RELATORIOS_HORAS = config('LIMPEZA_RELATORIOS_HORAS', default=24, cast=int)
+
+# Cadastro em lote com convite (medicoes/provisionamento.py, comando provision_users).
+# SITE_URL monta o link do convite quando não há requisição (linha de comando).
+CONVITE_DIAS = config('CONVITE_DIAS', default=14, cast=int)
+SITE_URL = config('SITE_URL', default='http://localhost:8000')
\ No newline at end of file
@@ -1,10 +1,42 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import MedicaoGravimetrica, CustomUser, AreaOfExpertise
+from django.shortcuts import redirect, render
+from django.urls import path
+from django.utils import timezone
+from . import provisionamento
+from .anomalias import FORMULA_CHOICES
+from .forms import ImportarUsuariosForm
+from .models import MedicaoGravimetrica, ObservacaoGravimetrica, LigacaoGravimetrica, CustomUser, AreaOfExpertise, EmailEnfileirado
+from .recalculo import recalcular_anomalias
+
+
+class MedicaoActionForm(ActionForm):
+    """Formulário de ações com a escolha da fórmula de gravidade normal"""
+    formula = forms.ChoiceField(
+        choices=FORMULA_CHOICES,
+        required=False,
+        initial=settings.GRAVIDADE_NORMAL_FORMULA,
+        label='Fórmula',
+    )
+
+
+class ObservacaoGravimetricaInline(admin.TabularInline):
+    """Histórico de observações (reocupações) da estação"""
+    model = ObservacaoGravimetrica
+    extra = 0
+    fields = ['data_medicao', 'valor_gravidade', 'incerteza', 'altitude', 'anomalia_bouguer', 'operador', 'instrumento', 'usuario']
+    readonly_fields = ['anomalia_bouguer']
+    ordering = ['-data_medicao', '-id']
 
 
 @admin.register(MedicaoGravimetrica)
 class MedicaoGravimetricaAdmin(admin.ModelAdmin):
+    inlines = [ObservacaoGravimetricaInline]
+    action_form = MedicaoActionForm
+    actions = ['recalcular_anomalias_action']
     list_display = [
         'codigo_estacao',
         'nome_estacao',
@@ -17,9 +49,9 @@ class MedicaoGravimetricaAdmin(admin.ModelAdmin):
         'data_medicao',
         'ativo'
     ]
-    list_filter = ['ativo', 'data_medicao', 'operador', 'usuario']
+    list_filter = ['ativo', 'estacao_referencia', 'data_medicao', 'operador', 'usuario']
     search_fields = ['codigo_estacao', 'nome_estacao', 'operador', 'usuario__username']
-    readonly_fields = ['data_cadastro', 'data_atualizacao']
+    readonly_fields = ['gravidade_ajustada', 'incerteza_ajustada', 'data_cadastro', 'data_atualizacao']
     fieldsets = (
         ('Informações Básicas', {
             'fields': ('usuario', 'nome_estacao', 'codigo_estacao', 'ativo')
@@ -32,7 +64,11 @@ class MedicaoGravimetricaAdmin(admin.ModelAdmin):
             'description': 'Configurações visuais do marcador no mapa (apenas para administradores)'
         }),
         ('Dados da Medição', {
-            'fields': ('valor_gravidade', 'incerteza', 'anomalia_bouguer', 'densidade_referencia', 'data_medicao')
+            'fields': ('valor_gravidade', 'incerteza', 'anomalia_bouguer', 'correcao_terreno', 'densidade_referencia', 'data_medicao')
+        }),
+        ('Ajustamento da Rede', {
+            'fields': ('estacao_referencia', 'gravidade_ajustada', 'incerteza_ajustada'),
+            'description': 'Valores gravados pelo comando adjust_network'
         }),
         ('Informações Adicionais', {
             'fields': ('operador', 'instrumento', 'observacoes')
@@ -43,10 +79,35 @@ class MedicaoGravimetricaAdmin(admin.ModelAdmin):
         }),
     )
 
+    @admin.action(description='Recalcular anomalias de Bouguer')
+    def recalcular_anomalias_action(self, request, queryset):
+        formula = request.POST.get('formula') or settings.GRAVIDADE_NORMAL_FORMULA
+        try:
+            stats = recalcular_anomalias(queryset, formula=formula)
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        self.message_user(
+            request,
+            f"{stats['atualizadas']} de {stats['total']} anomalias atualizadas ({stats['formula']}) "
+            f"em {stats['segundos']:.2f}s ({stats['por_segundo']:.0f} estações/s).",
+            messages.SUCCESS,
+        )
+
+
+@admin.register(LigacaoGravimetrica)
+class LigacaoGravimetricaAdmin(admin.ModelAdmin):
+    list_display = ['estacao_origem', 'estacao_destino', 'diferenca', 'incerteza', 'data_medicao', 'instrumento', 'ativo']
+    list_filter = ['ativo', 'data_medicao', 'instrumento']
+    search_fields = ['estacao_origem__codigo_estacao', 'estacao_destino__codigo_estacao']
+    raw_id_fields = ['estacao_origem', 'estacao_destino']
+    list_select_related = ['estacao_origem', 'estacao_destino']
+
 
 @admin.register(CustomUser)
 class CustomUserAdmin(BaseUserAdmin):
     """Administrador customizado para o usuário com categorização por grupos"""
+    change_list_template = 'admin/medicoes/customuser/change_list.html'
     list_display = [
         'username',
         'email',
@@ -95,8 +156,67 @@ class CustomUserAdmin(BaseUserAdmin):
     
     get_expertise_areas.short_description = 'Áreas de Expertise'
 
+    def get_urls(self):
+        urls = [
+            path('importar-csv/', self.admin_site.admin_view(self.importar_csv), name='medicoes_customuser_importar_csv'),
+        ]
+        return urls + super().get_urls()
+
+    def importar_csv(self, request):
+        """Cadastro em lote a partir de um CSV, com convite por email (ver provisionamento.py)"""
+        if not self.has_add_permission(request):
+            return redirect('admin:medicoes_customuser_changelist')
+
+        erros = []
+        form = ImportarUsuariosForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                linhas, erros = provisionamento.ler_csv(form.cleaned_data['arquivo'])
+            except UnicodeDecodeError:
+                erros = [(1, 'O CSV deve estar em UTF-8')]
+            if not erros:
+                resultado = provisionamento.provisionar(
+                    linhas, request.build_absolute_uri('/'), convidar=form.cleaned_data['convidar'],
+                )
+                self.message_user(
+                    request,
+                    f"{len(resultado['criados'])} usuários criados, {resultado['convites']} convites enfileirados.",
+                    messages.SUCCESS,
+                )
+                if resultado['existentes']:
+                    self.message_user(
+                        request, f"{len(resultado['existentes'])} emails já cadastrados foram ignorados: "
+                        + ', '.join(resultado['existentes'][:20]), messages.WARNING,
+                    )
+                return redirect('admin:medicoes_customuser_changelist')
+
+        return render(request, 'admin/medicoes/customuser/importar_csv.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar usuários de CSV',
+            'form': form,
+            'erros': erros,
+            'colunas': provisionamento.COLUNAS,
+        })
+
 
 @admin.register(AreaOfExpertise)
 class AreaOfExpertiseAdmin(admin.ModelAdmin):
     list_display = ['key', 'label']
     search_fields = ['key', 'label']
+
+
+@admin.register(EmailEnfileirado)
+class EmailEnfileiradoAdmin(admin.ModelAdmin):
+    list_display = ['assunto', 'destinatarios', 'status', 'tentativas', 'proxima_tentativa', 'criado_em', 'enviado_em']
+    list_filter = ['status']
+    search_fields = ['assunto']
+    readonly_fields = ['tentativas', 'ultimo_erro', 'criado_em', 'enviado_em']
+    actions = ['reenfileirar']
+
+    @admin.action(description='Reenfileirar emails selecionados')
+    def reenfileirar(self, request, queryset):
+        total = queryset.exclude(status=EmailEnfileirado.ENVIADO).update(
+            status=EmailEnfileirado.PENDENTE, tentativas=0, proxima_tentativa=timezone.now(),
+        )
+        self.message_user(request, f'{total} emails voltaram para a fila.', messages.SUCCESS)
@@ -0,0 +1,204 @@
+"""Ajustamento de redes gravimétricas por mínimos quadrados esparsos
+
+Cada ligação relativa i → j fornece a equação de observação
+g_j - g_i = Δg_ij, com peso 1/σ² (incerteza da ligação ou, na falta dela,
+a combinação das incertezas das duas estações). Estações de referência
+(absolutas) são fixas e saem do vetor de incógnitas. A matriz normal
+N = AᵀPA é montada e fatorada em formato esparso (scipy.sparse), o que
+mantém redes de dezenas de milhares de estações na casa dos segundos.
+"""
+
+import time
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix, diags
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
+
+from django.utils import timezone
+
+from .anomalias import quantizar
+from .models import LigacaoGravimetrica, MedicaoGravimetrica
+from .recalculo import atualizacao_em_lote
+
+INCERTEZA_PADRAO = 0.05  # mGal, quando nem a ligação nem as estações informam incerteza
+COLUNAS_POR_BLOCO = 512
+
+
+def ajustar_rede_gravimetrica(ligacoes=None, codigos_fixos=(), calcular_incertezas=True):
+    """
+    Ajusta a rede formada pelas ligações ativas e grava ``gravidade_ajustada``
+    e ``incerteza_ajustada`` nas estações.
+
+    Ficam fixas as estações marcadas como ``estacao_referencia`` e as de
+    ``codigos_fixos``, no seu ``valor_gravidade``. O peso de cada ligação vem
+    da sua incerteza ou, na falta dela, de sqrt(σ_i² + σ_j²) das estações
+    envolvidas (INCERTEZA_PADRAO quando nenhuma informa).
+
+    Retorna um dicionário com sigma0, graus de liberdade, número de ligações,
+    estações ajustadas, estações sem referência e tempo decorrido.
+    """
+    inicio = time.perf_counter()
+    if ligacoes is None:
+        ligacoes = LigacaoGravimetrica.objects.filter(ativo=True)
+    linhas = list(ligacoes.values_list('estacao_origem_id', 'estacao_destino_id', 'diferenca', 'incerteza'))
+
+    codigos_fixos = set(codigos_fixos)
+    faltando = codigos_fixos - set(
+        MedicaoGravimetrica.objects.filter(codigo_estacao__in=codigos_fixos).values_list('codigo_estacao', flat=True)
+    )
+    if faltando:
+        raise ValueError(f"Estações não encontradas: {', '.join(sorted(faltando))}")
+
+    estacoes = MedicaoGravimetrica.objects.values_list(
+        'pk', 'codigo_estacao', 'valor_gravidade', 'incerteza', 'estacao_referencia',
+        'gravidade_ajustada', 'incerteza_ajustada',
+    )
+
+    pks, indice, gravidades, incertezas, fixas, atuais = [], {}, [], [], [], []
+    for i, (pk, codigo, gravidade, incerteza, referencia, *ajustados) in enumerate(estacoes.iterator()):
+        pks.append(pk)
+        indice[pk] = i
+        gravidades.append(float(gravidade))
+        incertezas.append(np.nan if incerteza is None else float(incerteza))
+        atuais.append(tuple(ajustados))
+        if referencia or codigo in codigos_fixos:
+            fixas.append(i)
+    if not fixas:
+        raise ValueError("Nenhuma estação de referência (fixa) definida")
+
+    gravidades = np.array(gravidades)
+    incertezas = np.array(incertezas)
+    origem = np.array([indice[o] for o, _, _, _ in linhas], dtype=np.int64)
+    destino = np.array([indice[d] for _, d, _, _ in linhas], dtype=np.int64)
+    diferencas = np.array([float(dif) for _, _, dif, _ in linhas])
+    sigmas = np.array([np.nan if inc is None else float(inc) for _, _, _, inc in linhas])
+
+    combinadas = np.hypot(incertezas[origem], incertezas[destino])
+    sigmas = np.where(np.isnan(sigmas) | (sigmas <= 0), combinadas, sigmas)
+    sigmas = np.where(np.isnan(sigmas) | (sigmas <= 0), INCERTEZA_PADRAO, sigmas)
+
+    resultado = ajustar_rede(
+        len(pks), origem, destino, diferencas, sigmas, fixas, gravidades[fixas],
+        calcular_incertezas=calcular_incertezas,
+    )
+
+    # Só regrava estações cujo resultado mudou (inclui as que saíram da rede)
+    agora = timezone.now()
+    alterados = [
+        (valor, desvio, agora, pk)
+        for pk, valor, desvio, atual in zip(
+            pks, quantizar(resultado['valores']), quantizar(resultado['desvios']), atuais
+        )
+        if (valor, desvio) != atual
+    ]
+    if alterados:
+        atualizacao_em_lote(['gravidade_ajustada', 'incerteza_ajustada', 'data_atualizacao'])(alterados)
+
+    return {
+        'sigma0': resultado['sigma0'],
+        'graus_liberdade': resultado['graus_liberdade'],
+        'ligacoes': len(linhas),
+        'ajustadas': resultado['incognitas'],
+        'gravadas': len(alterados),
+        'fixas': len(fixas),
+        'sem_referencia': int(np.isnan(resultado['valores'][np.union1d(origem, destino)]).sum()),
+        'segundos': time.perf_counter() - inicio,
+    }
+
+
+def ajustar_rede(n_estacoes, origem, destino, diferencas, sigmas, fixas, valores_fixos, calcular_incertezas=True):
+    """
+    Ajusta a rede por mínimos quadrados ponderados.
+
+    ``origem``/``destino`` são índices (0..n_estacoes-1) das ligações,
+    ``diferencas`` as diferenças medidas (g_destino - g_origem) e ``sigmas``
+    seus desvios-padrão. ``fixas`` são os índices das estações de referência
+    com valores em ``valores_fixos``.
+
+    Retorna um dicionário com ``valores`` e ``desvios`` ajustados por estação
+    (NaN para estações sem ligação a uma referência), ``residuos`` por ligação,
+    ``sigma0`` (desvio-padrão a posteriori da unidade de peso), graus de
+    liberdade e número de incógnitas.
+    """
+    origem = np.asarray(origem, dtype=np.int64)
+    destino = np.asarray(destino, dtype=np.int64)
+    diferencas = np.asarray(diferencas, dtype=np.float64)
+    sigmas = np.asarray(sigmas, dtype=np.float64)
+    fixas = np.asarray(fixas, dtype=np.int64)
+
+    fixa = np.zeros(n_estacoes, dtype=bool)
+    fixa[fixas] = True
+    g_fixo = np.zeros(n_estacoes)
+    g_fixo[fixas] = np.asarray(valores_fixos, dtype=np.float64)
+
+    # Só componentes conexas que contêm ao menos uma referência têm solução
+    grafo = coo_matrix((np.ones(origem.size), (origem, destino)), shape=(n_estacoes, n_estacoes))
+    _, rotulos = connected_components(grafo, directed=False)
+    componentes_ok = np.unique(rotulos[fixa])
+    resolvivel = np.isin(rotulos, componentes_ok)
+
+    incognitas = np.flatnonzero(resolvivel & ~fixa)
+    coluna = np.full(n_estacoes, -1, dtype=np.int64)
+    coluna[incognitas] = np.arange(incognitas.size)
+
+    usadas = np.flatnonzero(resolvivel[origem])
+    o, d = origem[usadas], destino[usadas]
+    m, k = usadas.size, incognitas.size
+
+    # Termo independente: referências passam para o lado das observações
+    l = diferencas[usadas] - np.where(fixa[d], g_fixo[d], 0.0) + np.where(fixa[o], g_fixo[o], 0.0)
+    p = 1.0 / sigmas[usadas] ** 2
+
+    linhas = np.concatenate([np.arange(m)[~fixa[o]], np.arange(m)[~fixa[d]]])
+    colunas = np.concatenate([coluna[o[~fixa[o]]], coluna[d[~fixa[d]]]])
+    valores = np.concatenate([-np.ones(int((~fixa[o]).sum())), np.ones(int((~fixa[d]).sum()))])
+    A = csr_matrix((valores, (linhas, colunas)), shape=(m, k))
+
+    valores_ajustados = np.full(n_estacoes, np.nan)
+    desvios = np.full(n_estacoes, np.nan)
+    valores_ajustados[fixa] = g_fixo[fixa]
+    desvios[fixa] = 0.0
+    residuos = np.full(origem.size, np.nan)
+
+    graus_liberdade = m - k
+    sigma0 = 1.0
+    if k:
+        N = (A.T @ diags(p) @ A).tocsc()
+        lu = splu(N)
+        x = lu.solve(A.T @ (p * l))
+        v = A @ x - l
+        if graus_liberdade > 0:
+            sigma0 = float(np.sqrt(np.sum(p * v * v) / graus_liberdade))
+        valores_ajustados[incognitas] = x
+        residuos[usadas] = v
+        if calcular_incertezas:
+            desvios[incognitas] = sigma0 * np.sqrt(_diagonal_inversa(lu, k))
+    elif m:
+        residuos[usadas] = -l
+
+    return {
+        'valores': valores_ajustados,
+        'desvios': desvios,
+        'residuos': residuos,
+        'sigma0': sigma0,
+        'graus_liberdade': graus_liberdade,
+        'incognitas': k,
+    }
+
+
+def _diagonal_inversa(lu, k):
+    """
+    Diagonal de N⁻¹ resolvendo a fatoração LU para blocos da identidade.
+
+    Custa k resoluções e domina o tempo em redes grandes (~5 s para 10 mil
+    incógnitas), por isso pode ser desligada com ``calcular_incertezas``.
+    """
+    diagonal = np.empty(k)
+    for inicio in range(0, k, COLUNAS_POR_BLOCO):
+        fim = min(inicio + COLUNAS_POR_BLOCO, k)
+        largura = fim - inicio
+        identidade = np.zeros((k, largura))
+        identidade[np.arange(inicio, fim), np.arange(largura)] = 1.0
+        diagonal[inicio:fim] = lu.solve(identidade)[np.arange(inicio, fim), np.arange(largura)]
+    return diagonal
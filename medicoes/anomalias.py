@@ -0,0 +1,207 @@
+"""Motor vetorizado de gravidade normal e anomalias gravimétricas
+
+Calcula gravidade normal, correções e anomalias (ar livre e Bouguer simples)
+para arrays de estações em uma única chamada NumPy. A etapa de quantização
+devolve Decimals idênticos aos do cálculo escalar original do modelo: valores
+que caem perto de uma fronteira de arredondamento são recalculados com
+Decimal, de modo que o erro de ponto flutuante nunca altera a 5ª casa.
+"""
+
+import math
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+# Gradiente vertical de ar livre (mGal/m)
+GRADIENTE_AR_LIVRE = 0.3086
+# Fator da placa de Bouguer: 2πG·ρ (mGal/m por g/cm³)
+FATOR_BOUGUER = 0.0419
+DENSIDADE_PADRAO = 2.67
+
+# Fórmula da Gravidade Normal (IAG 1967)
+# g_normal = 978031.8 * (1 + 0.0053024 * sin²(φ) - 0.0000058 * sin²(2φ))
+GE_1967 = 978031.8
+A_1967 = 0.0053024
+B_1967 = 0.0000058
+
+# Fórmula fechada de Somigliana: g_normal = ge * (1 + k sin²φ) / sqrt(1 - e² sin²φ)
+# ge em mGal, k e e² adimensionais
+SOMIGLIANA = {
+    'grs80': (978032.67715, 0.001931851353, 0.00669438002290),
+    'wgs84': (978032.53359, 0.00193185265241, 0.00669437999013),
+}
+
+FORMULA_PADRAO = 'igsn71'
+FORMULA_CHOICES = (
+    ('igsn71', 'IGSN71 / GRS67 (IAG 1967)'),
+    ('grs80', 'GRS80 (Somigliana)'),
+    ('wgs84', 'WGS84 (Somigliana)'),
+)
+
+CASAS_DECIMAIS = Decimal('0.00001')
+ESCALA = 100000
+
+# Distância mínima (em unidades da 5ª casa) até a fronteira de arredondamento
+# para confiar no resultado em float64; abaixo disso recalcula com Decimal.
+MARGEM_ARREDONDAMENTO = 1e-3
+
+
+def _como_array(valores):
+    """Converte escalares, listas com Decimal/None ou arrays em float64 (None → NaN)."""
+    if isinstance(valores, np.ndarray) and valores.dtype.kind == 'f':
+        return valores.astype(np.float64, copy=False)
+    if np.ndim(valores) == 0:
+        valores = [valores]
+    return np.array([np.nan if v is None else float(v) for v in valores], dtype=np.float64)
+
+
+def _como_decimal(valor):
+    return Decimal(repr(float(valor)))
+
+
+def gravidade_normal(latitude, formula=FORMULA_PADRAO):
+    """Gravidade normal (mGal) para um array de latitudes em graus."""
+    phi = np.radians(_como_array(latitude))
+    sin_phi2 = np.sin(phi) ** 2
+
+    if formula == 'igsn71':
+        sin_2phi2 = np.sin(2 * phi) ** 2
+        return GE_1967 * (1 + A_1967 * sin_phi2 - B_1967 * sin_2phi2)
+    if formula in SOMIGLIANA:
+        ge, k, e2 = SOMIGLIANA[formula]
+        return ge * (1 + k * sin_phi2) / np.sqrt(1 - e2 * sin_phi2)
+    raise ValueError(f"Fórmula de gravidade normal inválida: {formula}")
+
+
+def calcular_anomalias(latitude, altitude, gravidade, densidade=DENSIDADE_PADRAO, formula=FORMULA_PADRAO):
+    """
+    Calcula, em float64, as grandezas de redução gravimétrica de várias estações.
+
+    Retorna um dicionário de arrays: gravidade_normal, correcao_ar_livre,
+    correcao_bouguer, anomalia_ar_livre e anomalia_bouguer. Entradas ausentes
+    (None/NaN) propagam NaN.
+    """
+    g_obs = _como_array(gravidade)
+    h = _como_array(altitude)
+    dens = _como_array(densidade)
+
+    g_normal = gravidade_normal(latitude, formula)
+    correcao_ar_livre = GRADIENTE_AR_LIVRE * h
+    correcao_bouguer = FATOR_BOUGUER * dens * h
+    anomalia_ar_livre = g_obs - g_normal + correcao_ar_livre
+
+    return {
+        'gravidade_normal': g_normal,
+        'correcao_ar_livre': correcao_ar_livre,
+        'correcao_bouguer': correcao_bouguer,
+        'anomalia_ar_livre': anomalia_ar_livre,
+        'anomalia_bouguer': anomalia_ar_livre - correcao_bouguer,
+    }
+
+
+# ============================================================================
+# Cálculo escalar exato (referência em Decimal)
+# ============================================================================
+
+def gravidade_normal_decimal(latitude):
+    """Gravidade normal em Decimal, exatamente como o cálculo histórico do modelo."""
+    phi = math.radians(float(latitude))
+    sin_phi2 = math.sin(phi)**2
+    sin_2phi2 = math.sin(2*phi)**2
+
+    return Decimal('978031.8') * (
+        Decimal('1') +
+        Decimal('0.0053024') * Decimal(str(sin_phi2)) -
+        Decimal('0.0000058') * Decimal(str(sin_2phi2))
+    )
+
+
+def anomalia_decimal(latitude, altitude, gravidade, densidade=None):
+    """
+    Anomalia em Decimal quantizada na 5ª casa.
+
+    Sem densidade calcula a anomalia de ar livre; com densidade, a de Bouguer.
+    """
+    g_normal = gravidade_normal_decimal(latitude)
+    h = Decimal(str(altitude))
+    g_obs = Decimal(str(gravidade))
+
+    correcao_ar_livre = Decimal('0.3086') * h
+    if densidade is None:
+        anomalia = g_obs - g_normal + correcao_ar_livre
+    else:
+        dens = Decimal(str(densidade))
+        correcao_bouguer = Decimal('0.0419') * dens * h
+        anomalia = g_obs - g_normal + correcao_ar_livre - correcao_bouguer
+
+    return anomalia.quantize(CASAS_DECIMAIS, rounding=ROUND_HALF_UP)
+
+
+# ============================================================================
+# Quantização
+# ============================================================================
+
+def quantizar(valores, recalcular=None):
+    """
+    Arredonda um array float64 para Decimals com 5 casas (ROUND_HALF_UP).
+
+    Posições em que o valor está a menos de MARGEM_ARREDONDAMENTO de uma
+    fronteira de arredondamento são delegadas a ``recalcular(indice)``, que
+    deve devolver o Decimal exato. NaN vira None.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    escalado = np.abs(valores) * ESCALA
+    fracao = escalado - np.floor(escalado)
+    # ROUND_HALF_UP do Decimal arredonda o meio para longe do zero
+    inteiros = np.copysign(np.floor(escalado + 0.5), valores)
+    ambiguos = np.abs(fracao - 0.5) < MARGEM_ARREDONDAMENTO
+
+    resultado = []
+    for i, (n, valido, ambiguo) in enumerate(zip(inteiros.tolist(), np.isfinite(valores).tolist(), ambiguos.tolist())):
+        if not valido:
+            resultado.append(None)
+        elif ambiguo and recalcular is not None:
+            resultado.append(recalcular(i))
+        else:
+            resultado.append(Decimal(int(n)).scaleb(-5))
+    return resultado
+
+
+def _mascara_validas(latitude, altitude, gravidade):
+    # Mesma regra do modelo: valores ausentes ou zero não geram anomalia
+    valido = np.ones(latitude.shape, dtype=bool)
+    for arr in (latitude, altitude, gravidade):
+        valido &= np.isfinite(arr) & (arr != 0)
+    return valido
+
+
+def _anomalias_quantizadas(chave, latitude, altitude, gravidade, densidade, formula):
+    lat = _como_array(latitude)
+    h = _como_array(altitude)
+    g_obs = _como_array(gravidade)
+    dens = np.broadcast_to(_como_array(densidade), lat.shape) if densidade is not None else None
+
+    valores = calcular_anomalias(lat, h, g_obs, DENSIDADE_PADRAO if dens is None else dens, formula)[chave]
+    valores = np.where(_mascara_validas(lat, h, g_obs), valores, np.nan)
+
+    # Só a fórmula de 1967 tem cálculo de referência histórico em Decimal
+    if formula != 'igsn71':
+        return quantizar(valores)
+
+    def recalcular(i):
+        return anomalia_decimal(
+            lat[i], _como_decimal(h[i]), _como_decimal(g_obs[i]),
+            None if dens is None else _como_decimal(dens[i]),
+        )
+
+    return quantizar(valores, recalcular)
+
+
+def anomalias_bouguer(latitude, altitude, gravidade, densidade=DENSIDADE_PADRAO, formula=FORMULA_PADRAO):
+    """Anomalias de Bouguer simples quantizadas (lista de Decimal ou None)."""
+    return _anomalias_quantizadas('anomalia_bouguer', latitude, altitude, gravidade, densidade, formula)
+
+
+def anomalias_ar_livre(latitude, altitude, gravidade, formula=FORMULA_PADRAO):
+    """Anomalias de ar livre quantizadas (lista de Decimal ou None)."""
+    return _anomalias_quantizadas('anomalia_ar_livre', latitude, altitude, gravidade, None, formula)
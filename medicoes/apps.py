@@ -7,4 +7,10 @@ class MedicoesConfig(AppConfig):
     verbose_name = 'Medições Gravimétricas'
     def ready(self):
         """Importar signals quando o app está pronto"""
-        from . import db_signals  # noqa
\ No newline at end of file
+        from django.db.models.signals import post_migrate
+
+        from . import cache_dados, db_signals, espacial  # noqa
+        from .busca import garantir_indice_busca
+
+        post_migrate.connect(garantir_indice_busca, sender=self)
+        post_migrate.connect(espacial.garantir_ponto_postgis, sender=self)
\ No newline at end of file
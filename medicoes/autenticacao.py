@@ -0,0 +1,49 @@
+"""Backend de autenticação por nome de usuário ou email
+
+Resolve o identificador numa única consulta indexada (username ou, se tiver
+'@', também email) e verifica a senha uma vez só; só no caso raro de o
+identificador ser o username de uma conta e o email de outra a senha é
+testada nas duas, primeiro na do username. Para identificadores
+desconhecidos a senha é verificada contra um hash fictício com o mesmo
+algoritmo e custo, para que o tempo de resposta não revele quais contas
+existem.
+"""
+
+from functools import lru_cache
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models import Q
+from django.utils.crypto import get_random_string
+
+UserModel = get_user_model()
+
+
+@lru_cache(maxsize=1)
+def _hash_ficticio():
+    return make_password(get_random_string(32))
+
+
+class EmailOuUsuarioBackend(ModelBackend):
+    """ModelBackend que aceita username ou email no campo de usuário"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if not username or password is None:
+            return None
+
+        filtro = Q(username=username)
+        if '@' in username:
+            filtro |= Q(email=username)
+        # Se o email de uma conta for o username de outra, a do username é testada primeiro
+        candidatos = sorted(UserModel._default_manager.filter(filtro)[:2], key=lambda u: u.username != username)
+
+        if not candidatos:
+            check_password(password, _hash_ficticio())
+            return None
+        for user in candidatos:
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
+        return None
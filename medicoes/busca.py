@@ -0,0 +1,118 @@
+"""Busca textual de estações por nome, código e operador
+
+No SQLite a busca usa a tabela FTS5 trigram ``medicoes_busca`` (ver
+IndiceBuscaEstacao), mantida por triggers, de modo que o custo depende do
+número de estações encontradas e não do tamanho da tabela. Como o SQLite
+descarta os triggers ao recriar a tabela num AlterField, ``garantir_indice_busca``
+os repõe ao fim de cada migrate. No PostgreSQL o
+mesmo ``icontains`` é servido pelos índices GIN pg_trgm criados na migração
+0012. Termos com menos de 3 caracteres não formam trigramas e caem no
+``icontains`` tradicional.
+"""
+
+from django.db import connections, models
+from django.db.models.functions import Greatest
+
+CAMPOS_BUSCA = ('nome_estacao', 'codigo_estacao', 'operador')
+TAMANHO_TRIGRAMA = 3
+
+TABELA_ESTACOES = 'medicoes_medicaogravimetrica'
+_colunas = ', '.join(CAMPOS_BUSCA)
+_novos = ', '.join('new.' + c for c in CAMPOS_BUSCA)
+_antigos = ', '.join('old.' + c for c in CAMPOS_BUSCA)
+
+SQLITE_TABELA_BUSCA = f"""CREATE VIRTUAL TABLE IF NOT EXISTS medicoes_busca USING fts5(
+    {_colunas}, content='{TABELA_ESTACOES}', content_rowid='id', tokenize='trigram'
+)"""
+SQLITE_TRIGGERS_BUSCA = {
+    'medicoes_busca_ai': f"""CREATE TRIGGER IF NOT EXISTS medicoes_busca_ai AFTER INSERT ON {TABELA_ESTACOES} BEGIN
+        INSERT INTO medicoes_busca(rowid, {_colunas}) VALUES (new.id, {_novos});
+    END""",
+    'medicoes_busca_ad': f"""CREATE TRIGGER IF NOT EXISTS medicoes_busca_ad AFTER DELETE ON {TABELA_ESTACOES} BEGIN
+        INSERT INTO medicoes_busca(medicoes_busca, rowid, {_colunas}) VALUES ('delete', old.id, {_antigos});
+    END""",
+    'medicoes_busca_au': f"""CREATE TRIGGER IF NOT EXISTS medicoes_busca_au AFTER UPDATE OF {_colunas} ON {TABELA_ESTACOES} BEGIN
+        INSERT INTO medicoes_busca(medicoes_busca, rowid, {_colunas}) VALUES ('delete', old.id, {_antigos});
+        INSERT INTO medicoes_busca(rowid, {_colunas}) VALUES (new.id, {_novos});
+    END""",
+}
+SQLITE_RECONSTRUIR_BUSCA = "INSERT INTO medicoes_busca(medicoes_busca) VALUES ('rebuild')"
+
+
+class SimilaridadePalavra(models.Func):
+    """word_similarity() do pg_trgm"""
+    function = 'WORD_SIMILARITY'
+    output_field = models.FloatField()
+
+
+def _consulta_fts(termos):
+    # Cada termo vira uma frase entre aspas (aspas internas duplicadas), unidas por AND
+    return ' AND '.join('"{}"'.format(termo.replace('"', '""')) for termo in termos)
+
+
+def _contem(termo):
+    return models.Q(*[models.Q(**{f'{campo}__icontains': termo}) for campo in CAMPOS_BUSCA], _connector=models.Q.OR)
+
+
+def buscar_estacoes(queryset, busca):
+    """
+    Filtra o queryset pelas estações que contêm todos os termos de ``busca``
+    em nome, código ou operador, anotando ``relevancia``.
+
+    Correspondências de prefixo no código ou no nome vêm antes; entre elas
+    vale o ranking bm25 do FTS5 (ou a similaridade trigram no PostgreSQL).
+    Ordene com ``ORDEM_RELEVANCIA``.
+    """
+    termos = busca.split()
+    if not termos:
+        return queryset
+
+    longos = [t for t in termos if len(t) >= TAMANHO_TRIGRAMA]
+    curtos = [t for t in termos if len(t) < TAMANHO_TRIGRAMA]
+    vendor = connections[queryset.db].vendor
+
+    if longos and vendor == 'sqlite':
+        queryset = queryset.filter(indice_busca__documento__match=_consulta_fts(longos))
+        # bm25 é negativo: quanto menor, mais relevante
+        pontuacao = -models.F('indice_busca__rank')
+    else:
+        for termo in longos:
+            queryset = queryset.filter(_contem(termo))
+        if longos and vendor == 'postgresql':
+            pontuacao = Greatest(*[
+                SimilaridadePalavra(models.Value(busca), models.F(campo)) for campo in CAMPOS_BUSCA[:2]
+            ])
+        else:
+            pontuacao = models.Value(0.0)
+
+    for termo in curtos:
+        queryset = queryset.filter(_contem(termo))
+
+    prefixo = models.Q(codigo_estacao__istartswith=termos[0]) | models.Q(nome_estacao__istartswith=termos[0])
+    return queryset.annotate(
+        prefixo=models.Case(models.When(prefixo, then=1), default=0, output_field=models.IntegerField()),
+        relevancia=pontuacao,
+    )
+
+
+ORDEM_RELEVANCIA = ('-prefixo', '-relevancia', '-data_medicao', '-id')
+
+
+def garantir_indice_busca(using='default', **kwargs):
+    """
+    Recria os triggers do índice FTS5 que faltarem e reconstrói o índice.
+
+    Ligado ao post_migrate: no SQLite, migrações que alteram a tabela de
+    estações a recriam (CREATE/INSERT/DROP/RENAME) e os triggers se perdem.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE %s", ['medicoes_busca%'])
+        existentes = {nome for nome, in cursor.fetchall()}
+        if 'medicoes_busca' not in existentes or existentes.issuperset(SQLITE_TRIGGERS_BUSCA):
+            return
+        for sql in SQLITE_TRIGGERS_BUSCA.values():
+            cursor.execute(sql)
+        cursor.execute(SQLITE_RECONSTRUIR_BUSCA)
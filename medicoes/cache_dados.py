@@ -0,0 +1,103 @@
+"""Cache de dados das views com namespaces versionados
+
+Cada chave inclui a versão do seu namespace (``estacoes`` ou ``usuarios``).
+Salvar ou excluir uma estação, observação ou usuário incrementa a versão, e
+as entradas antigas deixam de ser lidas e expiram sozinhas; nada precisa ser
+apagado por padrão de chave, o que funciona igual em locmem, arquivo e Redis.
+
+A versão é incrementada na hora e de novo no commit: a segunda vez descarta
+o que outra requisição tenha calculado com os dados antigos enquanto a
+transação ainda estava aberta. Pelo mesmo motivo, o que é lido da réplica
+(que pode estar atrasada) não é guardado: quem acabou de gravar lê do
+principal (``roteamento``) e não pode receber do cache um valor anterior à
+própria gravação. Gravações que não disparam signals
+(``executemany``, ``bulk_create``, ``QuerySet.update``) devem chamar
+``invalidar()``.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .metricas import CACHE_CONSULTAS
+from .roteamento import lendo_da_replica
+
+ESTACOES = 'estacoes'
+USUARIOS = 'usuarios'
+
+_AUSENTE = object()
+
+
+def _chave_versao(namespace):
+    return f'medicoes:{namespace}:versao'
+
+
+def versao(namespace=ESTACOES):
+    """Versão atual do namespace"""
+    atual = cache.get(_chave_versao(namespace))
+    if atual is None:
+        # Começa pelo relógio: se a chave for despejada, a nova versão não repete uma antiga
+        cache.add(_chave_versao(namespace), time.time_ns(), None)
+        atual = cache.get(_chave_versao(namespace), 0)
+    return atual
+
+
+def _incrementar(namespace):
+    try:
+        cache.incr(_chave_versao(namespace))
+    except ValueError:
+        cache.set(_chave_versao(namespace), time.time_ns(), None)
+
+
+def invalidar(namespace=ESTACOES):
+    """Descarta tudo o que foi guardado no namespace"""
+    _incrementar(namespace)
+    transaction.on_commit(lambda: _incrementar(namespace))
+
+
+def chave(nome, *partes, namespace=ESTACOES):
+    resumo = hashlib.sha1(repr(partes).encode()).hexdigest()
+    return f'medicoes:{namespace}:{versao(namespace)}:{nome}:{resumo}'
+
+
+def em_cache(nome, *partes, calcular, namespace=ESTACOES, timeout=None, por_banco=False):
+    """
+    Devolve o valor guardado para (nome, partes) ou o calcula com ``calcular()``.
+
+    ``partes`` identificam a variante (código da estação, parâmetros da
+    consulta...); exceções de ``calcular`` não são guardadas. O timeout
+    padrão é ``settings.CACHE_DADOS_SEGUNDOS``. Valores calculados na réplica
+    só são guardados com ``por_banco=True``, quando ``partes`` já incluem o
+    alias do banco lido.
+    """
+    chave_atual = chave(nome, *partes, namespace=namespace)
+    valor = cache.get(chave_atual, _AUSENTE)
+    CACHE_CONSULTAS.inc(nome=nome, resultado='falha' if valor is _AUSENTE else 'acerto')
+    if valor is _AUSENTE:
+        valor = calcular()
+        if por_banco or not lendo_da_replica():
+            cache.set(chave_atual, valor, settings.CACHE_DADOS_SEGUNDOS if timeout is None else timeout)
+    return valor
+
+
+@receiver([post_save, post_delete], sender='medicoes.MedicaoGravimetrica')
+@receiver([post_save, post_delete], sender='medicoes.ObservacaoGravimetrica')
+def _estacoes_alteradas(sender, **kwargs):
+    invalidar(ESTACOES)
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+@receiver([post_save, post_delete], sender='medicoes.AreaOfExpertise')
+def _usuarios_alterados(sender, **kwargs):
+    invalidar(USUARIOS)
+
+
+@receiver(m2m_changed)
+def _areas_alteradas(sender, action, model, **kwargs):
+    if action.startswith('post_') and model._meta.label in (settings.AUTH_USER_MODEL, 'medicoes.AreaOfExpertise'):
+        invalidar(USUARIOS)
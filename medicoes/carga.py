@@ -0,0 +1,252 @@
+"""Teste de carga HTTP das jornadas principais contra um servidor local
+
+Cada usuário virtual é uma thread com seus próprios cookies (sessão e CSRF)
+que faz login e segue, com pausas aleatórias, as jornadas de ``CENARIOS``:
+mapa da home, lista com filtros, detalhe, PDF e importação de planilha. As
+latências são agrupadas pelo nome da rota (os mesmos nomes das métricas do
+``/metrics``) e o relatório traz p50/p95/p99, falhas e vazão de cada uma.
+
+Só usa a biblioteca padrão (urllib + threads); o gargalo esperado é o
+servidor, não o cliente, até algumas dezenas de usuários simultâneos.
+"""
+
+import io
+import json
+import random
+import threading
+import time
+import uuid
+import zlib
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+import numpy as np
+
+from django.conf import settings
+from django.urls import reverse
+
+# Jornadas e pesos do sorteio (a home com o mapa é o que mais se abre em campo)
+CENARIOS = {'mapa': 4, 'lista': 3, 'detalhe': 3, 'pdf': 1, 'importacao': 1}
+FILTROS_LISTA = (
+    {},
+    {'data_inicio': '2015-01-01'},
+    {'gravidade_min': '978000', 'gravidade_max': '978500'},
+    {'bbox': '-50,-25,-40,-15'},
+    {'search': 'EST'},
+    # 'last' existe para qualquer volume de dados; com paginação por cursor o parâmetro é ignorado
+    {'operador': 'a', 'page': 'last'},
+)
+LINHAS_PLANILHA = 10
+
+
+class Estatisticas:
+    """Latências e falhas por rota, compartilhadas pelas threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencias = {}
+        self.falhas = {}
+        self.inicio = time.monotonic()
+        self.fim = None
+
+    def registrar(self, nome, segundos, ok):
+        with self.lock:
+            self.latencias.setdefault(nome, []).append(segundos)
+            if not ok:
+                self.falhas[nome] = self.falhas.get(nome, 0) + 1
+
+    def relatorio(self):
+        duracao = (self.fim or time.monotonic()) - self.inicio
+        linhas = []
+        todas = []
+        with self.lock:
+            for nome in sorted(self.latencias):
+                latencias = self.latencias[nome]
+                todas += latencias
+                linhas.append(_resumo(nome, latencias, self.falhas.get(nome, 0), duracao))
+            if todas:
+                linhas.append(_resumo('total', todas, sum(self.falhas.values()), duracao))
+        return linhas
+
+
+def _resumo(nome, latencias, falhas, duracao):
+    ms = np.array(latencias) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'rota': nome,
+        'requisicoes': len(latencias),
+        'falhas': falhas,
+        'por_segundo': round(len(latencias) / duracao, 2) if duracao > 0 else 0.0,
+        'p50_ms': round(float(p50), 1),
+        'p95_ms': round(float(p95), 1),
+        'p99_ms': round(float(p99), 1),
+        'max_ms': round(float(ms.max()), 1),
+    }
+
+
+class _SemRedirecionamento(HTTPRedirectHandler):
+    """Devolve o 302 em vez de segui-lo: cada requisição é medida sozinha"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Sessao:
+    """Um navegador: cookies próprios, CSRF e medição de cada requisição"""
+
+    def __init__(self, base, estatisticas, timeout):
+        self.base = base
+        self.estatisticas = estatisticas
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), _SemRedirecionamento)
+
+    def csrf(self):
+        return next((c.value for c in self.cookies if c.name == settings.CSRF_COOKIE_NAME), '')
+
+    def requisitar(self, nome, caminho, params=None, dados=None, arquivos=None, esperado=(200,)):
+        url = urljoin(self.base, caminho)
+        if params:
+            url += '?' + urlencode(params)
+        cabecalhos = {'Accept-Encoding': 'identity'}
+        corpo = None
+        if dados is not None or arquivos:
+            dados = {**(dados or {}), 'csrfmiddlewaretoken': self.csrf()}
+            cabecalhos.update({'X-CSRFToken': self.csrf(), 'Referer': url})
+            if arquivos:
+                corpo, cabecalhos['Content-Type'] = _multipart(dados, arquivos)
+            else:
+                corpo = urlencode(dados).encode()
+                cabecalhos['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        inicio = time.perf_counter()
+        try:
+            with self.opener.open(Request(url, corpo, cabecalhos), timeout=self.timeout) as resposta:
+                status, conteudo = resposta.status, resposta.read()
+        except HTTPError as e:
+            status, conteudo = e.code, e.read()
+        except (URLError, OSError):
+            status, conteudo = None, b''
+        self.estatisticas.registrar(nome, time.perf_counter() - inicio, status in esperado)
+        return status, conteudo
+
+
+def _multipart(campos, arquivos):
+    fronteira = uuid.uuid4().hex
+    partes = []
+    for nome, valor in campos.items():
+        partes.append(f'--{fronteira}\r\nContent-Disposition: form-data; name="{nome}"\r\n\r\n{valor}\r\n'.encode())
+    for nome, (arquivo, conteudo) in arquivos.items():
+        partes.append(
+            f'--{fronteira}\r\nContent-Disposition: form-data; name="{nome}"; filename="{arquivo}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + conteudo + b'\r\n'
+        )
+    partes.append(f'--{fronteira}--\r\n'.encode())
+    return b''.join(partes), f'multipart/form-data; boundary={fronteira}'
+
+
+def planilha(prefixo, linhas=LINHAS_PLANILHA):
+    """Planilha .xlsx pequena com estações novas; reenviada, vira reocupação"""
+    import pandas as pd
+
+    rng = np.random.default_rng(zlib.crc32(prefixo.encode()))
+    tabela = pd.DataFrame({
+        'codigo_estacao': [f'{prefixo}-{i:03d}' for i in range(linhas)],
+        'nome_estacao': [f'Campanha {prefixo} {i}' for i in range(linhas)],
+        'latitude': rng.uniform(-20, -10, linhas).round(6),
+        'longitude': rng.uniform(-50, -40, linhas).round(6),
+        'valor_gravidade': rng.uniform(978000, 978300, linhas).round(3),
+        'altitude': rng.uniform(5, 1200, linhas).round(2),
+        'data_medicao': pd.Timestamp.today().date(),
+    })
+    conteudo = io.BytesIO()
+    tabela.to_excel(conteudo, index=False)
+    return conteudo.getvalue()
+
+
+class UsuarioVirtual:
+    """Operador que faz login e percorre as jornadas sorteadas"""
+
+    def __init__(self, indice, base, credenciais, estatisticas, timeout=60):
+        self.indice = indice
+        self.login_usuario, self.senha = credenciais
+        self.sessao = Sessao(base, estatisticas, timeout)
+        self.rng = random.Random(indice)
+        self.estacoes = []
+        self._planilha = None
+
+    def login(self):
+        self.sessao.requisitar('login GET', reverse('medicoes:login'))
+        status, _ = self.sessao.requisitar(
+            'login POST', reverse('medicoes:login'),
+            dados={'username': self.login_usuario, 'password': self.senha}, esperado=(302,),
+        )
+        return status == 302
+
+    def mapa(self):
+        self.sessao.requisitar('home', reverse('medicoes:home'))
+        status, conteudo = self.sessao.requisitar('medicoes_api', reverse('medicoes:medicoes_api'))
+        if status == 200:
+            medicoes = json.loads(conteudo).get('medicoes', [])
+            self.estacoes = [(m['codigo_estacao'], m['id']) for m in medicoes]
+
+    def lista(self):
+        self.sessao.requisitar('medicao_lista', reverse('medicoes:medicao_lista'), params=self.rng.choice(FILTROS_LISTA))
+
+    def detalhe(self):
+        if not self.estacoes:
+            return self.mapa()
+        codigo, _ = self.rng.choice(self.estacoes)
+        self.sessao.requisitar('medicao_detail', reverse('medicoes:medicao_detail', args=[codigo]))
+
+    def pdf(self):
+        if not self.estacoes:
+            return self.mapa()
+        _, pk = self.rng.choice(self.estacoes)
+        self.sessao.requisitar('medicao_pdf', reverse('medicoes:medicao_pdf', args=[pk]))
+
+    def importacao(self):
+        if self._planilha is None:
+            self._planilha = planilha(f'CARGA-{self.indice}')
+        url = reverse('medicoes:importar_excel')
+        self.sessao.requisitar('importar_excel GET', url)
+        self.sessao.requisitar(
+            'importar_excel POST', url, dados={},
+            arquivos={'arquivo': ('campanha.xlsx', self._planilha)}, esperado=(302,),
+        )
+
+    def executar(self, fim, cenarios, pausa):
+        if not self.login():
+            return
+        self.mapa()  # o login leva à home com o mapa
+        pesos = [CENARIOS[c] for c in cenarios]
+        while time.monotonic() < fim:
+            getattr(self, self.rng.choices(cenarios, pesos)[0])()
+            time.sleep(self.rng.uniform(*pausa))
+
+
+def executar(base, usuarios, duracao, credenciais, cenarios=tuple(CENARIOS), rampa=0.0, pausa=(0.5, 2.0), timeout=60):
+    """
+    Roda ``usuarios`` usuários virtuais por ``duracao`` segundos e devolve as Estatisticas.
+
+    ``credenciais`` é uma lista de pares (login, senha) distribuídos entre os
+    usuários; eles entram aos poucos ao longo de ``rampa`` segundos.
+    """
+    estatisticas = Estatisticas()
+    fim = time.monotonic() + duracao
+
+    def iniciar(indice):
+        time.sleep(rampa * indice / usuarios)
+        UsuarioVirtual(indice, base, credenciais[indice % len(credenciais)], estatisticas, timeout).executar(
+            fim, list(cenarios), pausa,
+        )
+
+    threads = [threading.Thread(target=iniciar, args=(i,), daemon=True) for i in range(usuarios)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    estatisticas.fim = time.monotonic()
+    return estatisticas
@@ -4,7 +4,9 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
+from .cache_dados import USUARIOS, em_cache
 from .models import CustomUser, AreaOfExpertise
+from .roteamento import leitura_replica
 from .user_categories import UserCategoryManager
 
 
@@ -15,6 +17,7 @@ def is_staff(user):
 @login_required
 @user_passes_test(is_staff, login_url='medicoes:login')
 @require_http_methods(["GET"])
+@leitura_replica
 def user_categories_dashboard(request):
     manager = UserCategoryManager()
     
@@ -57,9 +60,10 @@ def user_category_list(request, category_type, category_key):
 @login_required
 @user_passes_test(is_staff, login_url='medicoes:login')
 @require_http_methods(["GET"])
+@leitura_replica
 def user_statistics_api(request):
     manager = UserCategoryManager()
-    stats = manager.get_users_statistics()
+    stats = em_cache('estatisticas', namespace=USUARIOS, calcular=manager.get_users_statistics)
     return JsonResponse(stats, safe=False)
 
 
@@ -1,18 +1,42 @@
 """
-Middleware para habilitar Foreign Key constraints no SQLite
+Configuração das conexões SQLite: foreign keys e PRAGMAs de desempenho
 """
 
-from django.db.backends.sqlite3.base import DatabaseWrapper
+import re
+
+from django.conf import settings
 from django.db.backends.signals import connection_created
 from django.dispatch import receiver
 
+PRAGMAS_PERMITIDOS = ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store')
+
+
+def comandos_pragma(pragmas):
+    """
+    Converte o dicionário de PRAGMAs em comandos SQL.
+
+    Os valores não podem ser parametrizados em PRAGMA, então só são aceitos
+    nomes conhecidos e valores inteiros ou palavras simples (WAL, NORMAL...).
+    """
+    comandos = []
+    for nome, valor in pragmas.items():
+        if nome not in PRAGMAS_PERMITIDOS:
+            raise ValueError(f"PRAGMA não suportado: {nome}")
+        if not re.fullmatch(r'-?\d+|[A-Za-z]+', str(valor)):
+            raise ValueError(f"Valor inválido para PRAGMA {nome}: {valor}")
+        comandos.append(f'PRAGMA {nome} = {valor};')
+    return comandos
+
 
 @receiver(connection_created)
 def enable_sqlite_fk_constraints(sender, connection, **kwargs):
     """
     Habilita constraints de foreign key no SQLite quando a conexão é criada
+    e aplica os PRAGMAs de ``settings.SQLITE_PRAGMAS``
     """
     if connection.vendor == 'sqlite':
         cursor = connection.cursor()
         cursor.execute('PRAGMA foreign_keys = ON;')
+        for comando in comandos_pragma(getattr(settings, 'SQLITE_PRAGMAS', {})):
+            cursor.execute(comando)
         cursor.close()
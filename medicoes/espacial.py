@@ -0,0 +1,399 @@
+"""Consultas espaciais de estações: retângulo, raio e vizinhos mais próximos
+
+Cada estação guarda o seu geohash (base32, PRECISAO_GEOHASH caracteres), que
+ordena as células numa curva Z: um retângulo vira poucos intervalos
+contíguos de geohash, servidos pelo índice B-tree da coluna em qualquer
+banco. O filtro exato por latitude/longitude é aplicado em seguida sobre os
+candidatos. Para vizinhos mais próximos há uma KD-tree em memória (vetores
+unitários 3D), reconstruída quando estações são salvas ou excluídas.
+
+Com ``settings.USA_POSTGIS`` as mesmas funções passam a consultar a coluna
+``ponto`` (geometry Point 4326 com índice GiST, mantida por trigger a partir
+de latitude/longitude; criada pela migração 0015 e fora do modelo, por isso
+usada só por SQL): retângulos com ``&&``, distâncias com
+ST_DistanceSphere e vizinhos com o operador KNN ``<->``.
+"""
+
+import math
+import threading
+import time
+
+import numpy as np
+
+from django.conf import settings
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Sqrt, Substr
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+ALFABETO_GEOHASH = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISAO_GEOHASH = 9  # células de ~4,8 m x 4,8 m
+MAX_CELULAS_BBOX = 64
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU = math.pi * RAIO_TERRA_KM / 180
+VALIDADE_INDICE_SEGUNDOS = 300
+
+_ALFABETO_BYTES = np.frombuffer(ALFABETO_GEOHASH.encode(), dtype=np.uint8)
+
+
+# ============================================================================
+# Geohash
+# ============================================================================
+
+def _bits(precisao):
+    """Bits de longitude e de latitude de um geohash com ``precisao`` caracteres."""
+    total = 5 * precisao
+    return (total + 1) // 2, total // 2
+
+
+def _intercalar(ix, iy, precisao):
+    """Intercala bits de longitude (ix) e latitude (iy), começando pela longitude."""
+    bits_lon, bits_lat = _bits(precisao)
+    codigo = np.zeros(np.shape(ix), dtype=np.int64)
+    for posicao in range(5 * precisao):
+        if posicao % 2 == 0:
+            bit = (ix >> (bits_lon - 1 - posicao // 2)) & 1
+        else:
+            bit = (iy >> (bits_lat - 1 - posicao // 2)) & 1
+        codigo = (codigo << 1) | bit
+    return codigo
+
+
+def _texto(codigos, precisao):
+    deslocamentos = 5 * np.arange(precisao - 1, -1, -1, dtype=np.int64)
+    indices = (np.asarray(codigos, dtype=np.int64)[:, None] >> deslocamentos) & 31
+    return [s.decode() for s in _ALFABETO_BYTES[indices].view(f'S{precisao}').ravel()]
+
+
+def _celulas(latitudes, longitudes, precisao):
+    bits_lon, bits_lat = _bits(precisao)
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    ix = np.clip(np.floor((lon + 180) / 360 * (1 << bits_lon)), 0, (1 << bits_lon) - 1).astype(np.int64)
+    iy = np.clip(np.floor((lat + 90) / 180 * (1 << bits_lat)), 0, (1 << bits_lat) - 1).astype(np.int64)
+    return ix, iy
+
+
+def geohashes(latitudes, longitudes, precisao=PRECISAO_GEOHASH):
+    """Geohashes de arrays de latitudes/longitudes (lista de str)."""
+    ix, iy = _celulas(np.atleast_1d(latitudes), np.atleast_1d(longitudes), precisao)
+    return _texto(_intercalar(ix, iy, precisao), precisao)
+
+
+def geohash(latitude, longitude, precisao=PRECISAO_GEOHASH):
+    return geohashes([float(latitude)], [float(longitude)], precisao)[0]
+
+
+def intervalos_geohash(lat_min, lat_max, lon_min, lon_max):
+    """
+    Intervalos [inicio, fim) de geohash que cobrem o retângulo, usando a
+    maior precisão com no máximo MAX_CELULAS_BBOX células. Células com
+    códigos consecutivos na curva Z são fundidas num único intervalo.
+    """
+    for precisao in range(PRECISAO_GEOHASH, 0, -1):
+        (x0, x1), (y0, y1) = _celulas([lat_min, lat_max], [lon_min, lon_max], precisao)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= MAX_CELULAS_BBOX or precisao == 1:
+            break
+
+    ix, iy = np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1))
+    codigos = np.unique(_intercalar(ix.ravel(), iy.ravel(), precisao))
+    quebras = np.flatnonzero(np.diff(codigos) != 1) + 1
+    inicios = np.concatenate([[codigos[0]], codigos[quebras]])
+    fins = np.concatenate([codigos[quebras - 1], [codigos[-1]]])
+    # '{' vem logo depois de 'z' em ASCII: fecha todos os geohashes com o prefixo final
+    return [(a, b + '{') for a, b in zip(_texto(inicios, precisao), _texto(fins, precisao))]
+
+
+# ============================================================================
+# Filtros para querysets
+# ============================================================================
+
+PONTO_SQL = 'ST_SetSRID(ST_MakePoint(%s, %s), 4326)'
+
+
+def usa_postgis(queryset):
+    return settings.USA_POSTGIS and connections[queryset.db].vendor == 'postgresql'
+
+
+# Mesmo SQL da migração 0015 (lá congelado); idempotente
+POSTGIS_CRIAR_PONTO = """
+ALTER TABLE medicoes_medicaogravimetrica ADD COLUMN IF NOT EXISTS ponto geometry(Point, 4326) NULL;
+CREATE INDEX IF NOT EXISTS medicoes_medicaogravimetrica_ponto_id
+    ON medicoes_medicaogravimetrica USING GIST (ponto);
+
+CREATE OR REPLACE FUNCTION medicoes_sincronizar_ponto() RETURNS trigger AS $$
+BEGIN
+    NEW.ponto := ST_SetSRID(ST_MakePoint(NEW.longitude::float8, NEW.latitude::float8), 4326);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS medicoes_ponto_sincronizado ON medicoes_medicaogravimetrica;
+CREATE TRIGGER medicoes_ponto_sincronizado
+    BEFORE INSERT OR UPDATE OF latitude, longitude ON medicoes_medicaogravimetrica
+    FOR EACH ROW EXECUTE FUNCTION medicoes_sincronizar_ponto();
+
+UPDATE medicoes_medicaogravimetrica
+    SET ponto = ST_SetSRID(ST_MakePoint(longitude::float8, latitude::float8), 4326);
+"""
+
+
+def garantir_ponto_postgis(using='default', **kwargs):
+    """
+    Cria a coluna ``ponto``, o índice e o trigger que faltarem.
+
+    Ligado ao post_migrate: a migração 0015 só age se USA_POSTGIS estiver
+    ligado ao migrar, e um banco PostgreSQL migrado antes ficaria sem a coluna.
+    """
+    connection = connections[using]
+    if not settings.USA_POSTGIS or connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'medicoes_medicaogravimetrica' AND column_name = 'ponto'), "
+            "EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'medicoes_ponto_sincronizado')"
+        )
+        if all(cursor.fetchone()):
+            return
+        cursor.execute(POSTGIS_CRIAR_PONTO)
+
+
+def filtrar_bbox(queryset, lat_min, lat_max, lon_min, lon_max):
+    """Estações dentro do retângulo (aceita retângulos que cruzam o antimeridiano)."""
+    lat_min, lat_max = max(lat_min, -90.0), min(lat_max, 90.0)
+    if lon_min > lon_max:
+        faixas = [(lon_min, 180.0), (-180.0, lon_max)]
+    else:
+        faixas = [(max(lon_min, -180.0), min(lon_max, 180.0))]
+
+    if usa_postgis(queryset):
+        # && compara caixas envolventes pelo índice GiST; a checagem exata fica com lat/lon
+        envelopes = ' OR '.join(['ponto && ST_MakeEnvelope(%s, %s, %s, %s, 4326)'] * len(faixas))
+        params = [v for x0, x1 in faixas for v in (x0, lat_min, x1, lat_max)]
+        dentro = RawSQL(f'({envelopes})', params, output_field=models.BooleanField())
+        longitude = models.Q()
+        for x0, x1 in faixas:
+            longitude |= models.Q(longitude__gte=x0, longitude__lte=x1)
+        return queryset.alias(no_envelope=dentro).filter(
+            longitude, no_envelope=True, latitude__gte=lat_min, latitude__lte=lat_max
+        )
+
+    condicao = models.Q()
+    for x0, x1 in faixas:
+        celulas = models.Q()
+        for inicio, fim in intervalos_geohash(lat_min, lat_max, x0, x1):
+            celulas |= models.Q(geohash__gte=inicio, geohash__lt=fim)
+        condicao |= celulas & models.Q(longitude__gte=x0, longitude__lte=x1)
+    return queryset.filter(condicao, latitude__gte=lat_min, latitude__lte=lat_max)
+
+
+def bbox_do_raio(latitude, longitude, raio_km):
+    """Retângulo (lat_min, lat_max, lon_min, lon_max) que contém o círculo."""
+    dlat = raio_km / KM_POR_GRAU
+    lat_min, lat_max = latitude - dlat, latitude + dlat
+    cos_lat = math.cos(math.radians(min(abs(latitude) + dlat, 90.0)))
+    if lat_min <= -90 or lat_max >= 90 or cos_lat < 1e-6 or dlat / cos_lat >= 180:
+        return max(lat_min, -90.0), min(lat_max, 90.0), -180.0, 180.0
+    dlon = dlat / cos_lat
+    lon_min = (longitude - dlon + 180) % 360 - 180
+    lon_max = (longitude + dlon + 180) % 360 - 180
+    return lat_min, lat_max, lon_min, lon_max
+
+
+def filtrar_raio(queryset, latitude, longitude, raio_km):
+    """
+    Estações a até ``raio_km`` do ponto, anotadas com ``distancia_km``.
+
+    O retângulo envolvente usa o índice de geohash; a distância é a
+    aproximação equiretangular, calculada no banco só com aritmética
+    (erro < 0,1% até algumas centenas de km). No PostGIS a distância é a
+    esférica (ST_DistanceSphere).
+    """
+    queryset = filtrar_bbox(queryset, *bbox_do_raio(latitude, longitude, raio_km))
+    if usa_postgis(queryset):
+        distancia = RawSQL(
+            f'ST_DistanceSphere(ponto, {PONTO_SQL}) / 1000.0', (longitude, latitude), output_field=models.FloatField()
+        )
+        return queryset.annotate(distancia_km=distancia).filter(distancia_km__lte=raio_km)
+
+    cos_lat = math.cos(math.radians(latitude))
+    dx = (models.F('longitude') - longitude) * cos_lat
+    dy = models.F('latitude') - latitude
+    quadrado = models.ExpressionWrapper(dx * dx + dy * dy, output_field=models.FloatField())
+    return queryset.alias(distancia2=quadrado).filter(
+        distancia2__lte=(raio_km / KM_POR_GRAU) ** 2
+    ).annotate(distancia_km=Sqrt(models.F('distancia2')) * KM_POR_GRAU)
+
+
+def _numero(params, nome):
+    try:
+        return float(params.get(nome, '').replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def filtrar_por_parametros(queryset, params):
+    """
+    Aplica os filtros espaciais da query string: ``bbox=lon_min,lat_min,lon_max,lat_max``
+    e/ou ``lat``, ``lon`` e ``raio_km``. Valores inválidos são ignorados.
+    """
+    bbox = params.get('bbox', '')
+    if bbox:
+        try:
+            lon_min, lat_min, lon_max, lat_max = (float(v) for v in bbox.split(','))
+        except ValueError:
+            pass
+        else:
+            queryset = filtrar_bbox(queryset, lat_min, lat_max, lon_min, lon_max)
+
+    lat, lon, raio = _numero(params, 'lat'), _numero(params, 'lon'), _numero(params, 'raio_km')
+    if None not in (lat, lon, raio) and -90 <= lat <= 90 and -180 <= lon <= 180 and raio > 0:
+        queryset = filtrar_raio(queryset, lat, lon, raio)
+    return queryset
+
+
+def agrupar(queryset, precisao):
+    """
+    Agrupa as estações em células (para o mapa em escalas pequenas), no banco.
+
+    Sem PostGIS as células são os prefixos de geohash com ``precisao``
+    caracteres; no PostGIS, uma grade ST_SnapToGrid do mesmo tamanho. Devolve
+    dicionários com quantidade e centro médio (latitude, longitude) de cada célula.
+    """
+    if usa_postgis(queryset):
+        bits_lon, bits_lat = _bits(precisao)
+        celula = RawSQL(
+            'ST_AsText(ST_SnapToGrid(ponto, %s, %s))', (360 / (1 << bits_lon), 180 / (1 << bits_lat)),
+            output_field=models.CharField(),
+        )
+    else:
+        celula = Substr('geohash', 1, precisao)
+    linhas = queryset.order_by().annotate(celula=celula).values('celula').annotate(
+        quantidade=models.Count('id'),
+        latitude_media=models.Avg(Cast('latitude', models.FloatField())),
+        longitude_media=models.Avg(Cast('longitude', models.FloatField())),
+    )
+    return [
+        {'quantidade': linha['quantidade'], 'latitude': linha['latitude_media'], 'longitude': linha['longitude_media']}
+        for linha in linhas
+    ]
+
+
+# ============================================================================
+# Vizinhos mais próximos (KD-tree em memória)
+# ============================================================================
+
+def _vetores_unitarios(latitudes, longitudes):
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class IndiceVizinhos:
+    """KD-tree das estações ativas sobre a esfera"""
+
+    def __init__(self, pks, latitudes, longitudes):
+        from scipy.spatial import cKDTree
+
+        self.pks = np.asarray(pks, dtype=np.int64)
+        self.arvore = cKDTree(_vetores_unitarios(latitudes, longitudes)) if len(self.pks) else None
+        self.construido_em = time.monotonic()
+
+    @classmethod
+    def construir(cls):
+        from .models import MedicaoGravimetrica
+
+        # SQL do ORM executado direto no cursor: sem conversores nem um Decimal por coordenada
+        queryset = MedicaoGravimetrica.objects.filter(ativo=True).values_list(
+            'pk', Cast('latitude', models.FloatField()), Cast('longitude', models.FloatField())
+        ).order_by()
+        sql, params = queryset.query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            dados = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+        return cls(dados[:, 0], dados[:, 1], dados[:, 2])
+
+    def consultar(self, latitude, longitude, k=5, raio_km=None, excluir=()):
+        """Lista de (pk, distância em km) das ``k`` estações mais próximas, da mais perto à mais longe."""
+        if self.arvore is None or k < 1:
+            return []
+        excluir = set(excluir)
+        limite = np.inf if raio_km is None else 2 * math.sin(min(raio_km / RAIO_TERRA_KM, math.pi) / 2) + 1e-12
+        quantidade = min(k + len(excluir), len(self.pks))
+        cordas, posicoes = self.arvore.query(
+            _vetores_unitarios([latitude], [longitude])[0], k=quantidade, distance_upper_bound=limite
+        )
+        resultado = []
+        for corda, posicao in zip(np.atleast_1d(cordas), np.atleast_1d(posicoes)):
+            if not np.isfinite(corda):
+                break
+            pk = int(self.pks[posicao])
+            if pk in excluir:
+                continue
+            resultado.append((pk, 2 * RAIO_TERRA_KM * math.asin(min(corda / 2, 1.0))))
+            if len(resultado) == k:
+                break
+        return resultado
+
+
+_indice = None
+_trava_indice = threading.Lock()
+
+
+def indice_vizinhos():
+    """Índice do processo, reconstruído após alterações ou a cada VALIDADE_INDICE_SEGUNDOS."""
+    global _indice
+    with _trava_indice:
+        if _indice is None or time.monotonic() - _indice.construido_em > VALIDADE_INDICE_SEGUNDOS:
+            _indice = IndiceVizinhos.construir()
+        return _indice
+
+
+def invalidar_indice():
+    global _indice
+    with _trava_indice:
+        _indice = None
+
+
+def estacoes_proximas(latitude, longitude, k=5, raio_km=None, excluir=()):
+    """
+    As ``k`` estações ativas mais próximas do ponto, como instâncias com o
+    atributo ``distancia_km``, em ordem crescente de distância.
+    """
+    from .models import MedicaoGravimetrica
+
+    queryset = MedicaoGravimetrica.objects.filter(ativo=True)
+    if usa_postgis(queryset):
+        return _proximas_postgis(queryset.exclude(pk__in=list(excluir)), float(latitude), float(longitude), k, raio_km)
+
+    vizinhos = indice_vizinhos().consultar(float(latitude), float(longitude), k, raio_km, excluir)
+    estacoes = MedicaoGravimetrica.objects.in_bulk([pk for pk, _ in vizinhos])
+    resultado = []
+    for pk, distancia in vizinhos:
+        if pk in estacoes:
+            estacoes[pk].distancia_km = distancia
+            resultado.append(estacoes[pk])
+    return resultado
+
+
+def _proximas_postgis(queryset, latitude, longitude, k, raio_km):
+    # 1) KNN pelo índice GiST (distância planar em graus, só para achar candidatos);
+    # 2) a maior distância esférica entre eles limita a busca exata por raio.
+    knn = RawSQL(f'ponto <-> {PONTO_SQL}', (longitude, latitude))
+    distancia = RawSQL(f'ST_DistanceSphere(ponto, {PONTO_SQL}) / 1000.0', (longitude, latitude))
+    candidatos = list(
+        queryset.annotate(knn=knn, distancia_km=distancia).order_by('knn').values_list('distancia_km', flat=True)[:k]
+    )
+    if not candidatos:
+        return []
+    limite = max(candidatos) * (1 + 1e-6)
+    if raio_km is not None:
+        limite = min(limite, raio_km)
+    return list(filtrar_raio(queryset, latitude, longitude, limite).order_by('distancia_km')[:k])
+
+
+@receiver([post_save, post_delete], sender='medicoes.MedicaoGravimetrica')
+def _estacao_alterada(sender, **kwargs):
+    invalidar_indice()
@@ -0,0 +1,147 @@
+"""Fila de saída de emails
+
+As views só gravam o email (``enfileirar``) e respondem na hora; o comando
+``send_queued_emails`` envia os vencidos em lotes por uma única conexão do
+``EMAIL_BACKEND``. Cada email é reservado por ``EMAIL_FILA_RESERVA_SEGUNDOS``
+com um UPDATE condicional, para dois workers não enviarem o mesmo; se o
+worker cair no meio do lote, a reserva vence e o email volta para a fila.
+Falhas são repetidas com espera exponencial até ``EMAIL_FILA_MAX_TENTATIVAS``.
+"""
+
+import logging
+import random
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import EmailEnfileirado
+
+logger = logging.getLogger(__name__)
+
+
+def texto_simples(html):
+    """Versão em texto de um email HTML (sem <head>/<style> e sem linhas em branco repetidas)"""
+    html = re.sub(r'<(head|style)\b.*?</\1>', '', html, flags=re.S | re.I)
+    linhas = (linha.strip() for linha in strip_tags(html).splitlines())
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(linhas)).strip()
+
+
+def enfileirar(assunto, corpo, destinatarios, corpo_html='', remetente=None):
+    """Grava o email na fila (na transação atual) e devolve o registro"""
+    return EmailEnfileirado.objects.create(
+        assunto=assunto,
+        corpo=corpo,
+        corpo_html=corpo_html or '',
+        remetente=remetente or settings.DEFAULT_FROM_EMAIL,
+        destinatarios=list(destinatarios),
+    )
+
+
+def enfileirar_lote(mensagens, tamanho=500):
+    """
+    Grava muitos emails com INSERTs de ``tamanho`` linhas e devolve quantos.
+
+    ``mensagens`` é um iterável de tuplas ``(assunto, corpo, destinatarios, corpo_html)``.
+    """
+    emails = [
+        EmailEnfileirado(
+            assunto=assunto, corpo=corpo, corpo_html=corpo_html or '',
+            remetente=settings.DEFAULT_FROM_EMAIL, destinatarios=list(destinatarios),
+        )
+        for assunto, corpo, destinatarios, corpo_html in mensagens
+    ]
+    EmailEnfileirado.objects.bulk_create(emails, batch_size=tamanho)
+    return len(emails)
+
+
+def espera(tentativas):
+    """Segundos até a próxima tentativa após ``tentativas`` falhas (exponencial com variação de até 10%)"""
+    base = min(settings.EMAIL_FILA_ESPERA_SEGUNDOS * 2 ** (tentativas - 1), settings.EMAIL_FILA_ESPERA_MAXIMA_SEGUNDOS)
+    return base * random.uniform(1.0, 1.1)
+
+
+def reservar(tamanho):
+    """Reserva até ``tamanho`` emails vencidos para este worker"""
+    agora = timezone.now()
+    candidatos = (
+        EmailEnfileirado.objects
+        .filter(status=EmailEnfileirado.PENDENTE, proxima_tentativa__lte=agora)
+        .order_by('proxima_tentativa', 'id')
+        .values_list('pk', 'proxima_tentativa')[:tamanho]
+    )
+    reserva = agora + timedelta(seconds=settings.EMAIL_FILA_RESERVA_SEGUNDOS)
+    reservados = [
+        pk for pk, proxima in candidatos
+        # Só vence quem ainda vê o valor lido; outro worker que reservou antes já o mudou
+        if EmailEnfileirado.objects.filter(pk=pk, proxima_tentativa=proxima).update(proxima_tentativa=reserva)
+    ]
+    return list(EmailEnfileirado.objects.filter(pk__in=reservados).order_by('proxima_tentativa', 'id'))
+
+
+def _mensagem(email, conexao):
+    mensagem = EmailMultiAlternatives(
+        email.assunto, email.corpo, email.remetente, email.destinatarios, connection=conexao,
+    )
+    if email.corpo_html:
+        mensagem.attach_alternative(email.corpo_html, 'text/html')
+    return mensagem
+
+
+def _registrar_falha(email, erro):
+    tentativas = email.tentativas + 1
+    campos = {'tentativas': tentativas, 'ultimo_erro': str(erro)[:2000]}
+    if tentativas >= settings.EMAIL_FILA_MAX_TENTATIVAS:
+        campos['status'] = EmailEnfileirado.FALHOU
+    else:
+        campos['proxima_tentativa'] = timezone.now() + timedelta(seconds=espera(tentativas))
+    EmailEnfileirado.objects.filter(pk=email.pk).update(**campos)
+    return campos.get('status') == EmailEnfileirado.FALHOU
+
+
+def enviar_lote(tamanho=None):
+    """
+    Envia um lote de emails vencidos por uma conexão só.
+
+    Retorna um dicionário com ``enviados``, ``adiados`` (voltam para a fila)
+    e ``desistidos`` (passaram de EMAIL_FILA_MAX_TENTATIVAS).
+    """
+    resultado = {'enviados': 0, 'adiados': 0, 'desistidos': 0}
+    emails = reservar(tamanho or settings.EMAIL_FILA_LOTE)
+    if not emails:
+        return resultado
+
+    conexao = get_connection()
+    try:
+        conexao.open()
+    except Exception as e:
+        logger.warning('Falha ao conectar ao servidor de email: %s', e)
+        for email in emails:
+            resultado['desistidos' if _registrar_falha(email, e) else 'adiados'] += 1
+        return resultado
+
+    try:
+        for email in emails:
+            try:
+                _mensagem(email, conexao).send()
+            except Exception as e:
+                logger.warning('Falha ao enviar email %s: %s', email.pk, e)
+                resultado['desistidos' if _registrar_falha(email, e) else 'adiados'] += 1
+                # A conexão pode ter caído: reabre para o resto do lote
+                conexao.close()
+                try:
+                    conexao.open()
+                except Exception:
+                    pass
+                continue
+            EmailEnfileirado.objects.filter(pk=email.pk).update(
+                status=EmailEnfileirado.ENVIADO, tentativas=email.tentativas + 1,
+                enviado_em=timezone.now(), ultimo_erro='',
+            )
+            resultado['enviados'] += 1
+    finally:
+        conexao.close()
+    return resultado
@@ -1,11 +1,30 @@
 from django import forms
 from django.core.exceptions import ValidationError
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import SetPasswordForm, UserCreationForm
 from django.contrib.auth.password_validation import validate_password
 from .models import MedicaoGravimetrica, CustomUser, validar_gravidade_range, AreaOfExpertise, PendingRegistration
 import re
 
 
+def validar_senha_forte(password, user=None):
+    """Validadores do Django mais maiúscula, minúscula, número e caractere especial"""
+    try:
+        # Usar validadores padrão do Django
+        validate_password(password, user)
+    except ValidationError as e:
+        raise forms.ValidationError('; '.join(e.messages))
+
+    # Validações adicionais customizadas
+    if not re.search(r'[A-Z]', password):
+        raise forms.ValidationError('Senha deve conter pelo menos uma letra MAIÚSCULA.')
+    if not re.search(r'[a-z]', password):
+        raise forms.ValidationError('Senha deve conter pelo menos uma letra minúscula.')
+    if not re.search(r'[0-9]', password):
+        raise forms.ValidationError('Senha deve conter pelo menos um número.')
+    if not re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
+        raise forms.ValidationError('Senha deve conter pelo menos um caractere especial (!@#$%^&*...).')
+
+
 class SignUpForm(UserCreationForm):
     """Formulário de registro de novo usuário"""
     
@@ -120,22 +139,7 @@ class SignUpForm(UserCreationForm):
         """Validação adicional de senha forte."""
         password = self.cleaned_data.get('password1')
         if password:
-            try:
-                # Usar validadores padrão do Django
-                validate_password(password)
-            except ValidationError as e:
-                raise forms.ValidationError('; '.join(e.messages))
-            
-            # Validações adicionais customizadas
-            if not re.search(r'[A-Z]', password):
-                raise forms.ValidationError('Senha deve conter pelo menos uma letra MAIÚSCULA.')
-            if not re.search(r'[a-z]', password):
-                raise forms.ValidationError('Senha deve conter pelo menos uma letra minúscula.')
-            if not re.search(r'[0-9]', password):
-                raise forms.ValidationError('Senha deve conter pelo menos um número.')
-            if not re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
-                raise forms.ValidationError('Senha deve conter pelo menos um caractere especial (!@#$%^&*...).')
-        
+            validar_senha_forte(password)
         return password
 
     # Email will be confirmed via activation link sent by email
@@ -413,3 +417,30 @@ class UploadExcelForm(forms.Form):
         
         return arquivo
 
+
+class DefinirSenhaConviteForm(SetPasswordForm):
+    """Senha escolhida por quem recebeu o convite do cadastro em lote"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for campo in self.fields.values():
+            campo.widget.attrs['class'] = 'form-control'
+
+    def clean_new_password1(self):
+        password = self.cleaned_data.get('new_password1')
+        if password:
+            validar_senha_forte(password, self.user)
+        return password
+
+
+class ImportarUsuariosForm(forms.Form):
+    arquivo = forms.FileField(label='Arquivo CSV')
+    convidar = forms.BooleanField(label='Enviar convite por email', required=False, initial=True)
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data.get('arquivo')
+        if not arquivo.name.lower().endswith('.csv'):
+            raise forms.ValidationError('Apenas arquivos .csv são permitidos.')
+        if arquivo.size > 5 * 1024 * 1024:
+            raise forms.ValidationError('Arquivo muito grande. Máximo: 5MB.')
+        return arquivo
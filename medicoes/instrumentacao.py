@@ -0,0 +1,133 @@
+"""Instrumentação por requisição: consultas, tempo de banco, templates e trechos
+
+Com ``settings.INSTRUMENTACAO_ATIVA`` o ``InstrumentacaoMiddleware`` abre uma
+medição por requisição, conta consultas e tempo de banco (``execute_wrapper``
+em todas as conexões), e soma o tempo de cada trecho marcado com
+``trecho(nome)`` (templates, interpolação RBF, mapa de contorno, PDF...). O
+resultado vai no cabeçalho ``Server-Timing`` (aba Network do navegador) e
+numa linha JSON no logger ``medicoes.instrumentacao``.
+
+Desativada, o middleware sai da cadeia (MiddlewareNotUsed) e ``trecho`` só
+consulta uma ContextVar vazia.
+"""
+
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+_medicao_atual = ContextVar('medicao_instrumentacao', default=None)
+
+
+class Medicao:
+    """Acumuladores de uma requisição; também serve de execute_wrapper"""
+
+    __slots__ = ('inicio', 'consultas', 'tempo_db', 'trechos')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.trechos = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.tempo_db += time.perf_counter() - inicio
+
+    def somar(self, nome, segundos):
+        self.trechos[nome] = self.trechos.get(nome, 0.0) + segundos
+
+    def server_timing(self, total):
+        partes = [f'total;dur={total * 1000:.1f}', f'db;dur={self.tempo_db * 1000:.1f};desc="{self.consultas} consultas"']
+        partes += [f'{nome};dur={segundos * 1000:.1f}' for nome, segundos in self.trechos.items()]
+        return ', '.join(partes)
+
+
+@contextmanager
+def trecho(nome):
+    """Soma a duração do bloco ao trecho ``nome`` da requisição atual (se instrumentada)"""
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.somar(nome, time.perf_counter() - inicio)
+
+
+@contextmanager
+def medir():
+    """Abre uma medição (consultas, tempo de banco e trechos) para o bloco; usada também fora de requisições"""
+    medicao = Medicao()
+    token = _medicao_atual.set(medicao)
+    try:
+        with ExitStack() as pilha:
+            for alias in connections:
+                pilha.enter_context(connections[alias].execute_wrapper(medicao))
+            yield medicao
+    finally:
+        _medicao_atual.reset(token)
+
+
+class InstrumentacaoMiddleware:
+    """Mede cada requisição e publica o resultado em Server-Timing e no log"""
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTACAO_ATIVA:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with medir() as medicao:
+            response = self.get_response(request)
+
+        total = time.perf_counter() - medicao.inicio
+        response['Server-Timing'] = medicao.server_timing(total)
+        match = getattr(request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'metodo': request.method,
+            'caminho': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'consultas': medicao.consultas,
+            'db_ms': round(medicao.tempo_db * 1000, 1),
+            'trechos_ms': {nome: round(s * 1000, 1) for nome, s in medicao.trechos.items()},
+        }, ensure_ascii=False))
+        return response
+
+
+class TemplatesInstrumentados(DjangoTemplates):
+    """Backend DjangoTemplates que mede a renderização como trecho ``template``"""
+
+    def from_string(self, template_code):
+        return _TemplateMedido(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TemplateMedido(super().get_template(template_name))
+
+
+class _TemplateMedido:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, nome):
+        return getattr(self.template, nome)
+
+    def render(self, context=None, request=None):
+        with trecho('template'):
+            return self.template.render(context, request)
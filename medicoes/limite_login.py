@@ -0,0 +1,152 @@
+"""Limite de tentativas de login no cache, por identificador e por IP
+
+Cada falha incrementa dois contadores de janela deslizante (identificador e
+IP): o total é a contagem da janela atual somada à da anterior, ponderada
+pelo quanto dela ainda cabe nos últimos ``LOGIN_JANELA_SEGUNDOS``. Ao chegar
+ao limite (``LOGIN_MAX_TENTATIVAS`` por identificador,
+``LOGIN_MAX_TENTATIVAS_IP`` por IP) o alvo fica bloqueado pelo mesmo período.
+
+Tentativas comuns só tocam o cache; o banco (LoginAttempt) recebe uma linha
+apenas no bloqueio, para que ele valha em todos os workers e sobreviva a uma
+limpeza do cache. Um bloqueio encontrado no banco fica no cache até acabar;
+a resposta "sem bloqueio", só por LIVRE_SEGUNDOS, para que o bloqueio gravado
+por outro worker valha logo. O comando ``prune_login_attempts`` remove as
+linhas vencidas.
+
+Os contadores ficam no cache: com vários workers e o cache locmem (padrão),
+cada processo conta as suas falhas e o limite efetivo se multiplica pelo
+número de workers. Em produção use um cache compartilhado
+(``CACHE_BACKEND=redis`` ou ``file``).
+"""
+
+import hashlib
+import math
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .metricas import LOGIN_BLOQUEIOS
+from .models import LoginAttempt
+
+IDENTIFICADOR = 'id'
+IP = 'ip'
+LIVRE = 0
+# Por quanto tempo a ausência de bloqueio no banco é reaproveitada
+LIVRE_SEGUNDOS = 5
+
+
+def _normalizar(identificador):
+    return identificador.strip().lower()
+
+
+def _alvos(identificador, ip):
+    """Pares (tipo, valor) limitados, com o limite de cada um"""
+    alvos = [(IDENTIFICADOR, _normalizar(identificador), settings.LOGIN_MAX_TENTATIVAS)]
+    if ip:
+        alvos.append((IP, ip, settings.LOGIN_MAX_TENTATIVAS_IP))
+    return alvos
+
+
+def _registro(tipo, valor):
+    # Nome gravado em LoginAttempt.identifier
+    return f'ip:{valor}' if tipo == IP else valor
+
+
+def _chave(tipo, valor, sufixo):
+    resumo = hashlib.sha256(valor.encode()).hexdigest()[:32]
+    return f'medicoes:login:{tipo}:{resumo}:{sufixo}'
+
+
+def _janela():
+    janela = settings.LOGIN_JANELA_SEGUNDOS
+    agora = time.time()
+    return janela, int(agora // janela), (agora % janela) / janela
+
+
+def tentativas(tipo, valor):
+    """Falhas de ``valor`` nos últimos LOGIN_JANELA_SEGUNDOS (estimativa da janela deslizante)"""
+    _, indice, decorrido = _janela()
+    contagens = cache.get_many([_chave(tipo, valor, indice), _chave(tipo, valor, indice - 1)])
+    return contagens.get(_chave(tipo, valor, indice), 0) + contagens.get(_chave(tipo, valor, indice - 1), 0) * (1 - decorrido)
+
+
+def _incrementar(tipo, valor):
+    janela, indice, decorrido = _janela()
+    chave = _chave(tipo, valor, indice)
+    # A janela atual ainda é lida como "anterior" durante a próxima
+    cache.add(chave, 0, 2 * janela)
+    try:
+        atual = cache.incr(chave)
+    except ValueError:
+        cache.set(chave, 1, 2 * janela)
+        atual = 1
+    return atual + cache.get(_chave(tipo, valor, indice - 1), 0) * (1 - decorrido)
+
+
+def bloqueado_ate(identificador, ip=None):
+    """Fim do bloqueio mais longo que atinge o identificador ou o IP (None se livre)"""
+    chaves = {_chave(tipo, valor, 'bloqueio'): _registro(tipo, valor) for tipo, valor, _ in _alvos(identificador, ip)}
+    # A marca é o timestamp do fim do bloqueio, ou LIVRE quando o banco já foi consultado
+    marcados = cache.get_many(list(chaves))
+    if len(marcados) < len(chaves):
+        # Bloqueio anterior a uma limpeza do cache (ou de outro worker, com cache local)
+        bloqueios = dict(LoginAttempt.objects.filter(
+            identifier__in=[chaves[chave] for chave in chaves if chave not in marcados],
+            blocked_until__gt=timezone.now(),
+        ).values_list('identifier', 'blocked_until'))
+        for chave, registro in chaves.items():
+            if chave in marcados:
+                continue
+            if registro in bloqueios:
+                marcados[chave] = bloqueios[registro].timestamp()
+                cache.set(chave, marcados[chave], max(1, marcados[chave] - time.time()))
+            else:
+                marcados[chave] = LIVRE
+                cache.set(chave, LIVRE, LIVRE_SEGUNDOS)
+    ate = max(marcados.values())
+    return datetime.fromtimestamp(ate, tz=dt_timezone.utc) if ate > LIVRE else None
+
+
+def registrar_falha(identificador, ip=None):
+    """
+    Conta uma falha de login e bloqueia quem passou do limite.
+
+    Retorna ``(restantes, bloqueado_ate)``: tentativas que o identificador
+    ainda tem antes do bloqueio e o fim do bloqueio, se houve.
+    """
+    restantes = settings.LOGIN_MAX_TENTATIVAS
+    bloqueio = None
+    for tipo, valor, limite in _alvos(identificador, ip):
+        total = _incrementar(tipo, valor)
+        if tipo == IDENTIFICADOR:
+            restantes = max(0, math.ceil(limite - total))
+        if total >= limite:
+            bloqueio = _bloquear(tipo, valor, total)
+    return restantes, bloqueio
+
+
+def _bloquear(tipo, valor, total):
+    segundos = settings.LOGIN_JANELA_SEGUNDOS
+    ate = timezone.now() + timedelta(seconds=segundos)
+    cache.set(_chave(tipo, valor, 'bloqueio'), ate.timestamp(), segundos)
+    # As falhas que levaram ao bloqueio não contam de novo quando ele acabar
+    _zerar(tipo, valor)
+    LoginAttempt.objects.update_or_create(
+        identifier=_registro(tipo, valor),
+        defaults={'failed_attempts': math.floor(total), 'blocked_until': ate},
+    )
+    LOGIN_BLOQUEIOS.inc()
+    return ate
+
+
+def _zerar(tipo, valor):
+    _, indice, _ = _janela()
+    cache.delete_many([_chave(tipo, valor, indice), _chave(tipo, valor, indice - 1)])
+
+
+def registrar_sucesso(identificador):
+    """Zera as falhas do identificador (as do IP continuam contando)"""
+    _zerar(IDENTIFICADOR, _normalizar(identificador))
@@ -0,0 +1,169 @@
+"""Limpeza periódica de registros e arquivos vencidos
+
+Cada tarefa de ``TAREFAS`` recebe ``lote`` e ``simular`` e devolve quantos
+itens removeu (ou removeria). As exclusões no banco são feitas em lotes de
+chaves primárias lidas por um índice, para não travar tabelas grandes numa
+transação longa; os arquivos são removidos um a um pelo ``default_storage``.
+O comando ``housekeeping`` roda todas (de um cron ou em laço).
+"""
+
+import os
+import pickle
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EmailEnfileirado, LoginAttempt, MedicaoGravimetrica, PendingRegistration
+
+# Pastas do MEDIA_ROOT com uploads das estações (upload_to de foto_estacao e croqui)
+PASTAS_MIDIA = ('estacoes', 'croquis')
+PASTA_RELATORIOS = 'tmp_pdf_debug'
+SUFIXO_CACHE = '.djcache'
+
+
+def excluir_em_lotes(queryset, lote, simular=False):
+    """Exclui as linhas do queryset em lotes de ``lote`` chaves e devolve o total"""
+    if simular:
+        return queryset.count()
+    total = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:lote])
+        if not pks:
+            return total
+        total += queryset.model._default_manager.filter(pk__in=pks).delete()[1].get(queryset.model._meta.label, 0)
+
+
+def registros_pendentes_vencidos():
+    """Pré-cadastros cujo link de ativação já expirou"""
+    limite = timezone.now() - timedelta(days=settings.REGISTRO_PENDENTE_DIAS)
+    return PendingRegistration.objects.filter(created_at__lt=limite)
+
+
+def tentativas_login_vencidas(dias=None):
+    """LoginAttempt sem bloqueio ativo e sem tentativa nos últimos ``dias``"""
+    agora = timezone.now()
+    dias = settings.LIMPEZA_TENTATIVAS_DIAS if dias is None else dias
+    return LoginAttempt.objects.filter(
+        Q(blocked_until__isnull=True) | Q(blocked_until__lte=agora),
+        last_attempt__lt=agora - timedelta(days=dias),
+    )
+
+
+def emails_enviados_vencidos():
+    """Emails da fila já enviados há mais de LIMPEZA_EMAILS_DIAS"""
+    limite = timezone.now() - timedelta(days=settings.LIMPEZA_EMAILS_DIAS)
+    return EmailEnfileirado.objects.filter(status=EmailEnfileirado.ENVIADO, enviado_em__lt=limite)
+
+
+def _arquivos(pasta):
+    """Caminhos relativos ao storage de todos os arquivos abaixo de ``pasta``"""
+    try:
+        subpastas, arquivos = default_storage.listdir(pasta)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    for nome in arquivos:
+        yield f'{pasta}/{nome}'
+    for subpasta in subpastas:
+        yield from _arquivos(f'{pasta}/{subpasta}')
+
+
+def _referenciados():
+    fotos = MedicaoGravimetrica.objects.exclude(foto_estacao='').values_list('foto_estacao', flat=True)
+    croquis = MedicaoGravimetrica.objects.exclude(croqui='').values_list('croqui', flat=True)
+    return set(fotos.iterator(chunk_size=5000)) | set(croquis.iterator(chunk_size=5000))
+
+
+def limpar_midia_orfa(lote=1000, simular=False):
+    """Remove fotos e croquis que nenhuma estação referencia"""
+    referenciados = _referenciados()
+    # Arquivos recentes podem ser de um upload cuja estação ainda não foi gravada
+    limite = timezone.now() - timedelta(hours=settings.LIMPEZA_MIDIA_HORAS)
+    total = 0
+    for pasta in PASTAS_MIDIA:
+        for nome in _arquivos(pasta):
+            if nome in referenciados or default_storage.get_modified_time(nome) >= limite:
+                continue
+            if not simular:
+                default_storage.delete(nome)
+            total += 1
+    return total
+
+
+def limpar_relatorios(lote=1000, simular=False):
+    """
+    Remove relatórios e entradas de cache vencidos em disco.
+
+    São os HTML que a geração de PDF grava em ``tmp_pdf_debug`` (mais velhos
+    que LIMPEZA_RELATORIOS_HORAS) e, com o cache em arquivo, as entradas já
+    expiradas, que o FileBasedCache só apaga quando alguém as lê ou no corte
+    de entradas ao gravar. A pasta do cache é percorrida aqui mesmo, lendo o
+    cabeçalho de expiração de cada arquivo, sem métodos internos do backend.
+    """
+    total = 0
+    pasta = os.path.join(settings.BASE_DIR, PASTA_RELATORIOS)
+    limite = time.time() - settings.LIMPEZA_RELATORIOS_HORAS * 3600
+    if os.path.isdir(pasta):
+        for entrada in os.scandir(pasta):
+            if entrada.is_file() and entrada.stat().st_mtime < limite:
+                if not simular:
+                    os.remove(entrada.path)
+                total += 1
+
+    if isinstance(caches['default'], FileBasedCache):
+        total += _limpar_cache_em_arquivo(settings.CACHES['default']['LOCATION'], simular)
+    return total
+
+
+def _limpar_cache_em_arquivo(pasta, simular):
+    # Cada arquivo começa com o instante de expiração serializado (None = não expira)
+    total = 0
+    agora = time.time()
+    for nome in os.listdir(pasta) if os.path.isdir(pasta) else ():
+        if not nome.endswith(SUFIXO_CACHE):
+            continue
+        caminho = os.path.join(pasta, nome)
+        try:
+            with open(caminho, 'rb') as arquivo:
+                try:
+                    expira = pickle.load(arquivo)
+                except EOFError:
+                    expira = 0  # arquivo vazio conta como vencido
+        except (FileNotFoundError, pickle.UnpicklingError):
+            continue
+        if expira is None or expira >= agora:
+            continue
+        if not simular:
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                continue
+        total += 1
+    return total
+
+
+def limpar_registros_pendentes(lote=1000, simular=False):
+    return excluir_em_lotes(registros_pendentes_vencidos(), lote, simular)
+
+
+def limpar_tentativas_login(lote=1000, simular=False):
+    return excluir_em_lotes(tentativas_login_vencidas(), lote, simular)
+
+
+def limpar_emails_enviados(lote=1000, simular=False):
+    return excluir_em_lotes(emails_enviados_vencidos(), lote, simular)
+
+
+TAREFAS = {
+    'registros_pendentes': limpar_registros_pendentes,
+    'tentativas_login': limpar_tentativas_login,
+    'emails_enviados': limpar_emails_enviados,
+    'midia_orfa': limpar_midia_orfa,
+    'relatorios': limpar_relatorios,
+}
+
@@ -0,0 +1,44 @@
+"""
+Management command para ajustar a rede gravimétrica por mínimos quadrados
+Uso: python manage.py adjust_network [--fixas EST-001 EST-002 ...] [--sem-incertezas]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medicoes.ajustamento import ajustar_rede_gravimetrica
+
+
+class Command(BaseCommand):
+    help = 'Ajusta as ligações gravimétricas relativas às estações de referência e grava os valores ajustados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixas', nargs='+', default=[],
+            help='Códigos de estações mantidas fixas, além das marcadas como referência',
+        )
+        parser.add_argument(
+            '--sem-incertezas', action='store_true',
+            help='Não calcula as incertezas a posteriori (mais rápido em redes grandes)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            stats = ajustar_rede_gravimetrica(
+                codigos_fixos=options['fixas'],
+                calcular_incertezas=not options['sem_incertezas'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"Ligações: {stats['ligacoes']} | Estações fixas: {stats['fixas']} | "
+            f"Ajustadas: {stats['ajustadas']} | Graus de liberdade: {stats['graus_liberdade']}\n"
+            f"Sigma0 a posteriori: {stats['sigma0']:.4f}"
+        )
+        if stats['sem_referencia']:
+            self.stdout.write(self.style.WARNING(
+                f"⚠ {stats['sem_referencia']} estações ligadas sem caminho até uma referência (não ajustadas)"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Concluído em {stats['segundos']:.2f}s ({stats['gravadas']} estações gravadas)"
+        ))
@@ -0,0 +1,307 @@
+"""
+Management command para medir os caminhos críticos da aplicação em vários tamanhos de base
+Uso: python manage.py benchmark [--tamanhos 250 1000 4000] [--repeticoes 3] [--casos api_mapa pdf_medicao ...]
+                               [--saida benchmark.json] [--comparar anterior.json] [--tolerancia 0.2] [--falhar]
+
+Cria um banco de teste temporário (como o test runner), povoa com
+seed_stations até cada tamanho e mede: serialização da API do mapa, lista
+com filtros, interpolação e desenho do mapa de contorno, PDF, importação de
+planilha e estatísticas de usuários. O cache de dados fica desligado para
+medir o cálculo, não a leitura do cache. Os resultados vão para um JSON que
+pode ser comparado com o de outro commit (``--comparar``).
+"""
+
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.runner import DiscoverRunner
+from django.urls import reverse
+
+from medicoes import instrumentacao
+from medicoes.models import AreaOfExpertise, MedicaoGravimetrica
+from medicoes.user_categories import UserCategoryManager
+from medicoes.views.mapacontornoview import gerar_mapa_contorno_medicao
+
+User = get_user_model()
+
+TAMANHOS_PADRAO = (250, 1000, 4000)
+PREFIXO = 'BENCH'
+PREFIXO_IMPORTACAO = 'BENCHIMP'
+FILTROS_LISTA = {
+    'data_inicio': '2010-01-01',
+    'gravidade_min': '977500',
+    'operador': 'Equipe',
+    'bbox': '-60,-25,-40,-5',
+}
+
+
+class Bancada:
+    """Estado compartilhado pelos casos em um tamanho de base"""
+
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self.client = Client()
+        self.client.force_login(_administrador())
+        self.estacao = MedicaoGravimetrica.objects.filter(codigo_estacao__startswith=f'{PREFIXO}-').order_by('pk').first()
+        self.linhas_importacao = max(tamanho // 10, 20)
+        self.planilha = _planilha(self.linhas_importacao)
+
+
+def _get(bancada, url, **params):
+    resposta = bancada.client.get(url, params)
+    if resposta.status_code != 200:
+        raise CommandError(f'{url} respondeu {resposta.status_code}')
+    return resposta
+
+
+def caso_api_mapa(bancada):
+    _get(bancada, reverse('medicoes:medicoes_api'))
+
+
+def caso_lista_filtros(bancada):
+    _get(bancada, reverse('medicoes:medicao_lista'), **FILTROS_LISTA)
+
+
+def caso_contorno(bancada):
+    gerar_mapa_contorno_medicao(bancada.estacao)
+
+
+def caso_pdf_medicao(bancada):
+    _get(bancada, reverse('medicoes:medicao_pdf', args=[bancada.estacao.pk]))
+
+
+def caso_importacao_excel(bancada):
+    # A importação é desfeita a cada repetição para não mudar o tamanho da base
+    with transaction.atomic():
+        bancada.client.post(reverse('medicoes:importar_excel'), {
+            'arquivo': SimpleUploadedFile('benchmark.xlsx', bancada.planilha),
+        })
+        importadas = MedicaoGravimetrica.objects.filter(codigo_estacao__startswith=f'{PREFIXO_IMPORTACAO}-').count()
+        transaction.set_rollback(True)
+    if importadas != bancada.linhas_importacao:
+        raise CommandError(f'Importação gravou {importadas} de {bancada.linhas_importacao} linhas')
+    return {'linhas': importadas}
+
+
+def caso_estatisticas_usuarios(bancada):
+    UserCategoryManager.get_users_statistics()
+
+
+CASOS = {
+    'api_mapa': caso_api_mapa,
+    'lista_filtros': caso_lista_filtros,
+    'contorno': caso_contorno,
+    'pdf_medicao': caso_pdf_medicao,
+    'importacao_excel': caso_importacao_excel,
+    'estatisticas_usuarios': caso_estatisticas_usuarios,
+}
+
+
+def _administrador():
+    usuario, criado = User.objects.get_or_create(
+        username='bench-admin', defaults={'email': 'bench-admin@benchmark.invalid', 'user_type': 'admin'},
+    )
+    return usuario
+
+
+def _planilha(linhas):
+    import pandas as pd
+
+    rng = np.random.default_rng(linhas)
+    tabela = pd.DataFrame({
+        'codigo_estacao': [f'{PREFIXO_IMPORTACAO}-{i:06d}' for i in range(linhas)],
+        'nome_estacao': [f'Importada {i}' for i in range(linhas)],
+        'latitude': rng.uniform(-20, -10, linhas).round(6),
+        'longitude': rng.uniform(-50, -40, linhas).round(6),
+        'valor_gravidade': rng.uniform(978000, 978300, linhas).round(3),
+        'altitude': rng.uniform(5, 1200, linhas).round(2),
+        'incerteza': rng.uniform(0.01, 0.05, linhas).round(3),
+        'data_medicao': pd.Timestamp('2024-05-01').date(),
+    })
+    conteudo = io.BytesIO()
+    tabela.to_excel(conteudo, index=False)
+    return conteudo.getvalue()
+
+
+def povoar(tamanho):
+    """Completa a base com estações e usuários sintéticos até o tamanho pedido"""
+    faltam = tamanho - MedicaoGravimetrica.objects.filter(codigo_estacao__startswith=f'{PREFIXO}-').count()
+    if faltam > 0:
+        call_command('seed_stations', faltam, prefixo=PREFIXO, stdout=io.StringIO())
+
+    if not AreaOfExpertise.objects.exists():
+        call_command('populate_areas', stdout=io.StringIO())
+    areas = list(AreaOfExpertise.objects.values_list('pk', flat=True))
+    existentes = User.objects.filter(username__startswith='bench-usuario-').count()
+    papeis = [chave for chave, _ in User.ROLE_CATEGORY_CHOICES]
+    tipos = [chave for chave, _ in User.USER_TYPE_CHOICES]
+    senha = make_password(None)
+    novos = User.objects.bulk_create([
+        User(
+            username=f'bench-usuario-{i}', email=f'bench-usuario-{i}@benchmark.invalid', password=senha,
+            role_category=papeis[i % len(papeis)], user_type=tipos[i % len(tipos)],
+        )
+        for i in range(existentes, max(tamanho // 10, 10))
+    ])
+    User.areas.through.objects.bulk_create([
+        User.areas.through(customuser_id=usuario.pk, areaofexpertise_id=areas[(usuario.pk + k) % len(areas)])
+        for usuario in novos for k in range(2)
+    ])
+
+
+def medir_caso(funcao, bancada, repeticoes):
+    """Uma execução de aquecimento e ``repeticoes`` medidas com trechos e consultas"""
+    funcao(bancada)
+    tempos, consultas, trechos, extras = [], [], {}, {}
+    for _ in range(repeticoes):
+        with instrumentacao.medir() as medicao:
+            inicio = time.perf_counter()
+            extras = funcao(bancada) or {}
+            tempos.append(time.perf_counter() - inicio)
+        consultas.append(medicao.consultas)
+        for nome, segundos in medicao.trechos.items():
+            trechos.setdefault(nome, []).append(segundos)
+
+    tempos_ms = np.array(tempos) * 1000
+    resultado = {
+        'mediana_ms': round(float(np.median(tempos_ms)), 3),
+        'min_ms': round(float(tempos_ms.min()), 3),
+        'p95_ms': round(float(np.percentile(tempos_ms, 95)), 3),
+        'media_ms': round(float(tempos_ms.mean()), 3),
+        'consultas': int(np.median(consultas)),
+        'trechos_ms': {nome: round(float(np.median(v)) * 1000, 3) for nome, v in trechos.items()},
+    }
+    if 'linhas' in extras:
+        resultado['linhas_por_segundo'] = round(extras['linhas'] / float(np.median(tempos)), 1)
+    return resultado
+
+
+def executar(tamanhos, repeticoes, casos=tuple(CASOS), escrever=None):
+    """Mede os casos em cada tamanho (crescente) na base atual e devolve a lista de resultados"""
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta, override_settings(
+        CACHE_DADOS_SEGUNDOS=0, BASE_DIR=Path(pasta), MEDIA_ROOT=pasta,
+    ):
+        for tamanho in sorted(tamanhos):
+            povoar(tamanho)
+            bancada = Bancada(tamanho)
+            for nome in casos:
+                resultado = {'caso': nome, 'tamanho': tamanho, **medir_caso(CASOS[nome], bancada, repeticoes)}
+                resultados.append(resultado)
+                if escrever:
+                    escrever(resultado)
+    return resultados
+
+
+def comparar(resultados, anteriores, tolerancia):
+    """Pares (resultado, mediana anterior, razão, regrediu) para os casos presentes nos dois"""
+    base = {(r['caso'], r['tamanho']): r['mediana_ms'] for r in anteriores}
+    comparacao = []
+    for resultado in resultados:
+        anterior = base.get((resultado['caso'], resultado['tamanho']))
+        if anterior:
+            razao = resultado['mediana_ms'] / anterior
+            comparacao.append((resultado, anterior, razao, razao > 1 + tolerancia))
+    return comparacao
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True, timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def formatar(resultado):
+    trechos = ' '.join(f'{nome}={ms:.0f}' for nome, ms in resultado['trechos_ms'].items())
+    linha = (
+        f"{resultado['caso']:>22} {resultado['tamanho']:>7} | mediana {resultado['mediana_ms']:9.1f} ms | "
+        f"min {resultado['min_ms']:9.1f} | p95 {resultado['p95_ms']:9.1f} | {resultado['consultas']:5d} consultas"
+    )
+    if 'linhas_por_segundo' in resultado:
+        linha += f" | {resultado['linhas_por_segundo']:.0f} linhas/s"
+    return linha + (f' | {trechos}' if trechos else '')
+
+
+class Command(BaseCommand):
+    help = 'Mede os caminhos críticos da aplicação em vários tamanhos de base e grava os resultados em JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', type=int, nargs='+', default=list(TAMANHOS_PADRAO), help='Estações na base')
+        parser.add_argument('--repeticoes', type=int, default=3, help='Medidas por caso (após um aquecimento)')
+        parser.add_argument('--casos', nargs='+', choices=list(CASOS), default=list(CASOS), help='Casos a medir')
+        parser.add_argument('--saida', help='Arquivo JSON de resultados (padrão: benchmark-<commit>.json)')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar medianas')
+        parser.add_argument('--tolerancia', type=float, default=0.2, help='Aumento relativo aceito antes de acusar regressão')
+        parser.add_argument('--falhar', action='store_true', help='Termina com erro se houver regressão')
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] < 1 or min(options['tamanhos']) < 1:
+            raise CommandError('--repeticoes e --tamanhos devem ser positivos')
+        anteriores = None
+        if options['comparar']:
+            try:
+                anteriores = json.loads(Path(options['comparar']).read_text())['resultados']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Não foi possível ler {options['comparar']}: {e}")
+
+        commit = _commit()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        bancos = runner.setup_databases()
+        try:
+            banco = connection.vendor
+            resultados = executar(
+                options['tamanhos'], options['repeticoes'], options['casos'],
+                escrever=lambda r: self.stdout.write(formatar(r)),
+            )
+        finally:
+            runner.teardown_databases(bancos)
+            runner.teardown_test_environment()
+
+        saida = Path(options['saida'] or f"benchmark-{commit or 'local'}.json")
+        saida.write_text(json.dumps({
+            'commit': commit,
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'banco': banco,
+            'cpus': os.cpu_count(),
+            'repeticoes': options['repeticoes'],
+            'resultados': resultados,
+        }, indent=2, ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(f'✓ Resultados gravados em {saida}'))
+
+        if anteriores is None:
+            return
+        regressoes = 0
+        for resultado, anterior, razao, regrediu in comparar(resultados, anteriores, options['tolerancia']):
+            texto = f"{resultado['caso']:>22} {resultado['tamanho']:>7} | {anterior:9.1f} → {resultado['mediana_ms']:9.1f} ms ({razao:.2f}x)"
+            if regrediu:
+                regressoes += 1
+                self.stdout.write(self.style.WARNING(f'⚠ {texto}'))
+            else:
+                self.stdout.write(texto)
+        if regressoes and options['falhar']:
+            raise CommandError(f'{regressoes} caso(s) mais lentos que a tolerância de {options["tolerancia"]:.0%}')
@@ -0,0 +1,165 @@
+"""
+Management command para medir leituras concorrentes durante importações no SQLite
+Uso: python manage.py benchmark_sqlite [--segundos 5] [--leitores 4] [--estacoes 20000]
+
+Roda a mesma carga (leitores paginando a lista + um escritor importando lotes)
+num banco temporário, primeiro com o journal padrão do SQLite e depois com
+settings.SQLITE_PRAGMAS, e compara vazão e latência das leituras.
+"""
+
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from medicoes.db_signals import comandos_pragma
+
+PRAGMAS_PADRAO = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000}
+LOTE_IMPORTACAO = 500
+
+ESQUEMA = """
+CREATE TABLE estacao (
+    id INTEGER PRIMARY KEY,
+    codigo TEXT NOT NULL UNIQUE,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    gravidade REAL NOT NULL,
+    data_medicao TEXT NOT NULL,
+    ativo INTEGER NOT NULL
+);
+CREATE INDEX estacao_ativo_data ON estacao (data_medicao, id) WHERE ativo;
+"""
+
+
+def _conectar(caminho, pragmas):
+    conexao = sqlite3.connect(caminho, timeout=30, isolation_level=None, check_same_thread=False)
+    for comando in comandos_pragma(pragmas):
+        conexao.execute(comando)
+    return conexao
+
+
+def _linha(i, rng):
+    return (
+        f'BENCH-{i}', rng.uniform(-33, 5), rng.uniform(-74, -34), rng.uniform(977800, 978400),
+        f'20{rng.randint(10, 24):02d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}', 1,
+    )
+
+
+def medir(caminho, pragmas, segundos, leitores):
+    """Executa a carga mista por ``segundos`` e devolve as estatísticas"""
+    parar = threading.Event()
+    latencias = [[] for _ in range(leitores)]
+    erros = []
+    importadas = [0]
+
+    def ler(indice):
+        conexao = _conectar(caminho, pragmas)
+        rng = random.Random(indice)
+        try:
+            while not parar.is_set():
+                inicio = time.perf_counter()
+                conexao.execute(
+                    'SELECT id, codigo, latitude, longitude, gravidade FROM estacao '
+                    'WHERE ativo ORDER BY data_medicao DESC, id DESC LIMIT 20 OFFSET ?',
+                    (rng.randrange(0, 2000),),
+                ).fetchall()
+                conexao.execute('SELECT COUNT(*) FROM estacao WHERE ativo').fetchone()
+                latencias[indice].append(time.perf_counter() - inicio)
+        except sqlite3.OperationalError as e:
+            erros.append(str(e))
+        finally:
+            conexao.close()
+
+    def importar():
+        conexao = _conectar(caminho, pragmas)
+        rng = random.Random(-1)
+        proximo = conexao.execute('SELECT MAX(id) FROM estacao').fetchone()[0] + 1
+        try:
+            while not parar.is_set():
+                lote = [_linha(i, rng) for i in range(proximo, proximo + LOTE_IMPORTACAO)]
+                conexao.execute('BEGIN IMMEDIATE')
+                conexao.executemany(
+                    'INSERT INTO estacao (codigo, latitude, longitude, gravidade, data_medicao, ativo) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', lote,
+                )
+                conexao.execute('COMMIT')
+                proximo += LOTE_IMPORTACAO
+                importadas[0] += LOTE_IMPORTACAO
+        except sqlite3.OperationalError as e:
+            erros.append(str(e))
+        finally:
+            conexao.close()
+
+    threads = [threading.Thread(target=ler, args=(i,)) for i in range(leitores)]
+    threads.append(threading.Thread(target=importar))
+    for thread in threads:
+        thread.start()
+    time.sleep(segundos)
+    parar.set()
+    for thread in threads:
+        thread.join()
+
+    todas = np.array([t for lista in latencias for t in lista]) * 1000
+    return {
+        'leituras_por_segundo': todas.size / segundos,
+        'p50_ms': float(np.percentile(todas, 50)) if todas.size else float('nan'),
+        'p95_ms': float(np.percentile(todas, 95)) if todas.size else float('nan'),
+        'importadas_por_segundo': importadas[0] / segundos,
+        'erros': erros,
+    }
+
+
+def preparar_banco(caminho, estacoes):
+    conexao = sqlite3.connect(caminho, isolation_level=None)
+    conexao.executescript(ESQUEMA)
+    rng = random.Random(0)
+    conexao.execute('BEGIN')
+    conexao.executemany(
+        'INSERT INTO estacao (codigo, latitude, longitude, gravidade, data_medicao, ativo) VALUES (?, ?, ?, ?, ?, ?)',
+        (_linha(i, rng) for i in range(estacoes)),
+    )
+    conexao.execute('COMMIT')
+    conexao.close()
+
+
+class Command(BaseCommand):
+    help = 'Compara leituras concorrentes com importação em andamento no SQLite (journal padrão x SQLITE_PRAGMAS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segundos', type=float, default=5.0, help='Duração de cada cenário')
+        parser.add_argument('--leitores', type=int, default=4, help='Threads leitoras simultâneas')
+        parser.add_argument('--estacoes', type=int, default=20000, help='Estações no banco inicial')
+
+    def handle(self, *args, **options):
+        if options['segundos'] <= 0 or options['leitores'] < 1 or options['estacoes'] < 1:
+            raise CommandError('--segundos, --leitores e --estacoes devem ser positivos')
+
+        cenarios = [('journal padrão', PRAGMAS_PADRAO), ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS)]
+        resultados = []
+        for nome, pragmas in cenarios:
+            with tempfile.TemporaryDirectory() as pasta:
+                caminho = str(Path(pasta) / 'benchmark.sqlite3')
+                preparar_banco(caminho, options['estacoes'])
+                stats = medir(caminho, pragmas, options['segundos'], options['leitores'])
+            resultados.append(stats)
+            self.stdout.write(
+                f"{nome:>16}: {stats['leituras_por_segundo']:8.0f} leituras/s | "
+                f"p50 {stats['p50_ms']:6.2f} ms | p95 {stats['p95_ms']:7.2f} ms | "
+                f"{stats['importadas_por_segundo']:8.0f} estações importadas/s"
+            )
+            for erro in stats['erros']:
+                self.stdout.write(self.style.WARNING(f"⚠ {nome}: {erro}"))
+
+        padrao, ajustado = resultados
+        if padrao['leituras_por_segundo']:
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ Leituras {ajustado['leituras_por_segundo'] / padrao['leituras_por_segundo']:.1f}x "
+                f"com SQLITE_PRAGMAS"
+            ))
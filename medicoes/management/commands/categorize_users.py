@@ -3,6 +3,7 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from medicoes.models import CustomUser, AreaOfExpertise
+from medicoes.roteamento import leitura_na_replica
 from medicoes.user_categories import UserCategoryManager
 
 
@@ -21,13 +22,15 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         manager = UserCategoryManager()
         
-        # Relatório completo
+        # Relatório completo (só leitura: pode vir da réplica)
         if options['report']:
-            self.print_report(manager)
+            with leitura_na_replica():
+                self.print_report(manager)
         
         # Estatísticas
         elif options['statistics']:
-            self.print_statistics(manager)
+            with leitura_na_replica():
+                self.print_statistics(manager)
         
         # Categorizar usuário específico
         elif options['user_id']:
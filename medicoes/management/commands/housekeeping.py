@@ -0,0 +1,50 @@
+"""
+Management command de limpeza periódica
+Uso: python manage.py housekeeping [--tarefas registros_pendentes midia_orfa ...] [--lote 1000]
+                                   [--dry-run] [--intervalo SEGUNDOS]
+
+Remove pré-cadastros expirados, tentativas de login vencidas, emails enviados
+antigos, fotos e croquis órfãos e relatórios/cache vencidos em disco (ver
+medicoes/limpeza.py). Feito para um cron diário; com ``--intervalo`` fica
+rodando e repete a limpeza a cada N segundos, para implantações sem cron.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medicoes import limpeza
+
+
+class Command(BaseCommand):
+    help = 'Remove registros, arquivos de mídia e relatórios vencidos, em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tarefas', nargs='+', choices=list(limpeza.TAREFAS), default=list(limpeza.TAREFAS),
+                            help='Tarefas a executar (padrão: todas)')
+        parser.add_argument('--lote', type=int, default=1000, help='Linhas removidas por DELETE')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas contar, sem remover')
+        parser.add_argument('--intervalo', type=float, default=None, help='Repetir a cada N segundos')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote deve ser positivo')
+
+        try:
+            while True:
+                self.limpar(options)
+                if options['intervalo'] is None:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+    def limpar(self, options):
+        verbo = 'seriam removidos' if options['dry_run'] else 'removidos'
+        total = 0
+        for tarefa in options['tarefas']:
+            inicio = time.perf_counter()
+            removidos = limpeza.TAREFAS[tarefa](lote=options['lote'], simular=options['dry_run'])
+            total += removidos
+            self.stdout.write(f'{tarefa}: {removidos} {verbo} ({time.perf_counter() - inicio:.2f}s)')
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} itens {verbo}'))
@@ -0,0 +1,96 @@
+"""
+Management command para teste de carga HTTP das jornadas principais
+Uso: python manage.py load_test [--url http://127.0.0.1:8000] [--usuarios 20] [--duracao 60] [--rampa 10]
+                                [--cenarios mapa lista detalhe pdf importacao] [--criar-contas] [--saida carga.json]
+
+Roda contra um servidor já no ar (runserver ou gunicorn). Os usuários
+virtuais entram com ``--login``/``--senha`` ou, com ``--criar-contas``, com
+contas ``carga-operador-N`` criadas no banco configurado (o mesmo do servidor
+local). O cenário ``importacao`` grava estações ``CARGA-*`` de verdade.
+"""
+
+import json
+import os
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from medicoes import carga
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Teste de carga HTTP (login, mapa, lista, detalhe, PDF e importação) com latências por rota'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Endereço do servidor')
+        parser.add_argument('--usuarios', type=int, default=20, help='Usuários virtuais simultâneos')
+        parser.add_argument('--duracao', type=float, default=60.0, help='Duração do teste em segundos')
+        parser.add_argument('--rampa', type=float, default=10.0, help='Segundos para todos os usuários entrarem')
+        parser.add_argument('--pausa', type=float, nargs=2, default=[0.5, 2.0], metavar=('MIN', 'MAX'),
+                            help='Pausa entre ações de um usuário (segundos)')
+        parser.add_argument('--cenarios', nargs='+', choices=list(carga.CENARIOS), default=list(carga.CENARIOS),
+                            help='Jornadas sorteadas após o login')
+        parser.add_argument('--login', help='Usuário ou email usado por todos os usuários virtuais')
+        parser.add_argument('--senha', default=os.environ.get('CARGA_SENHA'), help='Senha (padrão: $CARGA_SENHA)')
+        parser.add_argument('--criar-contas', action='store_true',
+                            help='Cria/atualiza contas carga-operador-N com --senha no banco configurado')
+        parser.add_argument('--timeout', type=float, default=60.0, help='Timeout de cada requisição')
+        parser.add_argument('--saida', help='Grava o relatório em JSON')
+
+    def handle(self, *args, **options):
+        if options['usuarios'] < 1 or options['duracao'] <= 0 or options['rampa'] < 0:
+            raise CommandError('--usuarios e --duracao devem ser positivos e --rampa não pode ser negativa')
+        if not options['senha']:
+            raise CommandError('Informe --senha (ou CARGA_SENHA)')
+
+        if options['criar_contas']:
+            credenciais = self.criar_contas(options['usuarios'], options['senha'])
+        elif options['login']:
+            credenciais = [(options['login'], options['senha'])]
+        else:
+            raise CommandError('Informe --login ou use --criar-contas')
+
+        self.stdout.write(
+            f"{options['usuarios']} usuários por {options['duracao']:.0f}s contra {options['url']} "
+            f"({', '.join(options['cenarios'])})"
+        )
+        estatisticas = carga.executar(
+            options['url'], options['usuarios'], options['duracao'], credenciais,
+            cenarios=options['cenarios'], rampa=options['rampa'], pausa=tuple(options['pausa']),
+            timeout=options['timeout'],
+        )
+        relatorio = estatisticas.relatorio()
+        if not relatorio:
+            raise CommandError('Nenhuma requisição concluída; o servidor está no ar?')
+
+        self.stdout.write(
+            f"{'rota':>20} {'req':>6} {'falhas':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for linha in relatorio:
+            texto = (
+                f"{linha['rota']:>20} {linha['requisicoes']:6d} {linha['falhas']:6d} {linha['por_segundo']:7.2f} "
+                f"{linha['p50_ms']:8.1f} {linha['p95_ms']:8.1f} {linha['p99_ms']:8.1f} {linha['max_ms']:8.1f}"
+            )
+            self.stdout.write(self.style.WARNING(texto) if linha['falhas'] else texto)
+
+        if options['saida']:
+            Path(options['saida']).write_text(json.dumps({
+                'url': options['url'], 'usuarios': options['usuarios'], 'duracao': options['duracao'],
+                'cenarios': options['cenarios'], 'rotas': relatorio,
+            }, indent=2, ensure_ascii=False))
+            self.stdout.write(self.style.SUCCESS(f"✓ Relatório gravado em {options['saida']}"))
+
+    def criar_contas(self, quantidade, senha):
+        hash_senha = make_password(senha)  # um hash só: as contas são descartáveis
+        credenciais = []
+        for i in range(1, quantidade + 1):
+            nome = f'carga-operador-{i}'
+            User.objects.update_or_create(username=nome, defaults={
+                'email': f'{nome}@carga.invalid', 'password': hash_senha, 'user_type': 'operator', 'is_active': True,
+            })
+            credenciais.append((nome, senha))
+        return credenciais
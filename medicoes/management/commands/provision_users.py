@@ -0,0 +1,56 @@
+"""
+Management command para cadastrar em lote os usuários de uma instituição
+Uso: python manage.py provision_users usuarios.csv [--sem-convite] [--url-base https://...] [--dry-run]
+
+O CSV tem cabeçalho com as colunas email (obrigatória), first_name,
+last_name, role_category, user_type, areas (chaves ou nomes separados por
+";"), phone e organization. Categorias e tipos aceitam a chave
+(student) ou o rótulo (Estudante). Se alguma linha tiver erro nada é gravado.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from medicoes import provisionamento
+
+
+class Command(BaseCommand):
+    help = 'Cadastra usuários de um CSV (com categoria e áreas) e enfileira os convites por email'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do CSV')
+        parser.add_argument('--sem-convite', action='store_true', help='Não enfileirar os emails de convite')
+        parser.add_argument('--url-base', default=None, help='Endereço do site nos links do convite (padrão: SITE_URL)')
+        parser.add_argument('--lote', type=int, default=500, help='Linhas por INSERT')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas validar o arquivo')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                linhas, erros = provisionamento.ler_csv(arquivo)
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler {options["arquivo"]}: {e}')
+        except UnicodeDecodeError:
+            raise CommandError('O CSV deve estar em UTF-8')
+
+        for numero, mensagem in erros:
+            self.stderr.write(f'Linha {numero}: {mensagem}')
+        if erros:
+            raise CommandError(f'{len(erros)} erros no arquivo; nenhum usuário foi criado')
+        if options['dry_run']:
+            self.stdout.write(f'{len(linhas)} linhas válidas')
+            return
+
+        resultado = provisionamento.provisionar(
+            linhas, options['url_base'] or settings.SITE_URL,
+            convidar=not options['sem_convite'], lote=options['lote'],
+        )
+        for email in resultado['existentes']:
+            self.stdout.write(f'Já cadastrado, ignorado: {email}')
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {len(resultado['criados'])} usuários criados, {resultado['convites']} convites enfileirados "
+            f"em {time.perf_counter() - inicio:.1f}s"
+        ))
@@ -0,0 +1,36 @@
+"""
+Management command para remover registros de tentativas de login vencidos
+Uso: python manage.py prune_login_attempts [--dias 7] [--dry-run]
+
+Com o limite de login no cache, LoginAttempt só guarda bloqueios; uma linha
+cujo bloqueio terminou há mais de ``--dias`` dias (ou que nunca bloqueou, do
+esquema antigo) não serve para mais nada.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medicoes.limpeza import excluir_em_lotes, tentativas_login_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Remove registros de LoginAttempt sem bloqueio ativo e sem uso recente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=7, help='Idade mínima (dias desde a última tentativa)')
+        parser.add_argument('--lote', type=int, default=1000, help='Registros removidos por DELETE')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas contar, sem remover')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 0:
+            raise CommandError('--dias não pode ser negativo')
+        if options['lote'] < 1:
+            raise CommandError('--lote deve ser positivo')
+
+        vencidos = tentativas_login_vencidas(options['dias'])
+        removidos = excluir_em_lotes(vencidos, options['lote'], simular=options['dry_run'])
+
+        if options['dry_run']:
+            self.stdout.write(f'{removidos} registros seriam removidos')
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'✓ {removidos} registros de tentativas de login removidos'))
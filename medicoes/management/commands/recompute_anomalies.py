@@ -0,0 +1,77 @@
+"""
+Management command para recalcular as anomalias de Bouguer armazenadas
+Uso: python manage.py recompute_anomalies [--formula grs80] [--ativos] [--codigo EST-001 ...]
+"""
+
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from medicoes.anomalias import FORMULA_CHOICES
+from medicoes.models import MedicaoGravimetrica
+from medicoes.recalculo import recalcular_anomalias, TAMANHO_LOTE_PADRAO
+
+
+class Command(BaseCommand):
+    help = 'Recalcula anomalias de Bouguer em lote com a fórmula de gravidade normal escolhida'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--formula',
+            choices=[key for key, _ in FORMULA_CHOICES],
+            help=f'Fórmula de gravidade normal (padrão: {settings.GRAVIDADE_NORMAL_FORMULA})',
+        )
+        parser.add_argument('--densidade', help='Nova densidade de referência (g/cm³) para as estações filtradas')
+        parser.add_argument('--ativos', action='store_true', help='Apenas medições ativas')
+        parser.add_argument('--codigo', nargs='+', help='Códigos de estação')
+        parser.add_argument('--data-inicio', help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('--data-fim', help='Data final (AAAA-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=TAMANHO_LOTE_PADRAO, help='Estações por lote')
+
+    def handle(self, *args, **options):
+        queryset = MedicaoGravimetrica.objects.all()
+
+        if options['ativos']:
+            queryset = queryset.filter(ativo=True)
+        if options['codigo']:
+            queryset = queryset.filter(codigo_estacao__in=options['codigo'])
+        if options['data_inicio']:
+            queryset = queryset.filter(data_medicao__gte=self.parse_date(options['data_inicio']))
+        if options['data_fim']:
+            queryset = queryset.filter(data_medicao__lte=self.parse_date(options['data_fim']))
+
+        densidade = None
+        if options['densidade']:
+            try:
+                densidade = Decimal(options['densidade'].replace(',', '.'))
+            except InvalidOperation:
+                raise CommandError(f"Densidade inválida: {options['densidade']}")
+
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser positivo')
+
+        stats = recalcular_anomalias(
+            queryset,
+            formula=options['formula'],
+            densidade=densidade,
+            batch_size=options['batch_size'],
+        )
+
+        self.stdout.write(
+            f"Fórmula: {stats['formula']}\n"
+            f"Processadas: {stats['total']} | Atualizadas: {stats['atualizadas']} | "
+            f"Sem dados suficientes: {stats['ignoradas']}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ Concluído em {stats['segundos']:.2f}s ({stats['por_segundo']:.0f} estações/s)"
+            )
+        )
+
+    def parse_date(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Data inválida: {value} (use AAAA-MM-DD)')
@@ -0,0 +1,258 @@
+"""
+Management command para gerar estações sintéticas para testes de carga e escala
+Uso: python manage.py seed_stations 100000 [--batch-size 5000] [--seed 0] [--prefixo SYN]
+                                          [--usuarios 50] [--imagens 20]
+
+Sorteia posições dentro de um contorno simplificado do Brasil, altitudes de
+um relevo suave e gravidades coerentes com a gravidade normal, as correções
+de ar livre e Bouguer e um campo de anomalias sintético (fontes gaussianas +
+tendência regional) com ruído. Cada estação ganha a sua primeira observação,
+como acontece no cadastro normal. As linhas são gravadas com bulk_create em
+lotes, sem signals; o cache de dados e o índice de vizinhos são invalidados
+ao final.
+"""
+
+import io
+import re
+import time
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.functions import Length
+
+from medicoes import anomalias, cache_dados, espacial
+from medicoes.models import CAMPOS_OBSERVACAO, MedicaoGravimetrica, ObservacaoGravimetrica
+
+User = get_user_model()
+
+TAMANHO_LOTE_PADRAO = 5000
+
+# Contorno simplificado do Brasil (longitude, latitude), dentro dos limites de validar_coordenadas_brasil
+CONTORNO_BRASIL = np.array([
+    (-60.0, 5.2), (-56.5, 1.9), (-51.6, 4.2), (-50.0, 1.8), (-48.5, -1.0), (-44.0, -2.5),
+    (-38.5, -3.7), (-35.0, -5.2), (-34.8, -7.5), (-37.0, -11.0), (-39.0, -13.5), (-39.2, -17.7),
+    (-41.0, -22.0), (-44.5, -23.3), (-48.5, -26.0), (-48.6, -28.5), (-53.4, -33.7), (-57.6, -30.2),
+    (-53.8, -27.1), (-54.6, -25.5), (-58.2, -20.0), (-57.5, -16.2), (-60.3, -13.7), (-65.3, -9.8),
+    (-73.0, -9.4), (-73.8, -7.3), (-70.0, -4.2), (-69.5, 0.9), (-67.0, 1.8), (-63.4, 3.9),
+])
+LON_MIN, LAT_MIN = CONTORNO_BRASIL.min(axis=0)
+LON_MAX, LAT_MAX = CONTORNO_BRASIL.max(axis=0)
+
+INSTRUMENTOS = ('CG-5 Autograv', 'CG-6 Autograv', 'LaCoste & Romberg G', 'Burris B-series')
+DATA_INICIAL = date(2000, 1, 1).toordinal()
+
+
+def dentro_do_contorno(longitudes, latitudes, contorno=CONTORNO_BRASIL):
+    """Teste ponto-no-polígono (raio horizontal) vetorizado"""
+    dentro = np.zeros(longitudes.shape, dtype=bool)
+    x1, y1 = contorno[:, 0], contorno[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    for xa, ya, xb, yb in zip(x1, y1, x2, y2):
+        cruza = (ya > latitudes) != (yb > latitudes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_corte = xa + (latitudes - ya) * (xb - xa) / (yb - ya)
+        dentro ^= cruza & (longitudes < x_corte)
+    return dentro
+
+
+class CampoSintetico:
+    """Relevo e anomalia de Bouguer suaves, fixos para uma semente"""
+
+    def __init__(self, rng, fontes=24):
+        self.centros = np.column_stack([rng.uniform(LON_MIN, LON_MAX, fontes), rng.uniform(LAT_MIN, LAT_MAX, fontes)])
+        self.amplitudes = rng.uniform(-60, 60, fontes)       # mGal
+        self.larguras = rng.uniform(0.8, 5.0, fontes)        # graus
+        self.fase = rng.uniform(0, 2 * np.pi, 2)
+
+    def anomalia(self, longitudes, latitudes):
+        dx = longitudes[:, None] - self.centros[:, 0]
+        dy = latitudes[:, None] - self.centros[:, 1]
+        fontes = np.exp(-(dx ** 2 + dy ** 2) / (2 * self.larguras ** 2)) @ self.amplitudes
+        tendencia = -0.8 * (longitudes - LON_MIN)  # anomalias mais negativas para o interior
+        return fontes + tendencia
+
+    def altitude(self, longitudes, latitudes):
+        relevo = (
+            450
+            + 350 * np.sin(np.radians(longitudes) * 9 + self.fase[0]) * np.cos(np.radians(latitudes) * 7 + self.fase[1])
+            + 250 * np.sin(np.radians(latitudes) * 23 + self.fase[1])
+        )
+        return np.clip(relevo, 0, None)
+
+
+class Command(BaseCommand):
+    help = 'Gera estações gravimétricas sintéticas em lote (bulk_create) para testes de carga e escala'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quantidade', type=int, help='Número de estações a gerar')
+        parser.add_argument('--batch-size', type=int, default=TAMANHO_LOTE_PADRAO, help='Estações por lote')
+        parser.add_argument('--seed', type=int, default=0, help='Semente do gerador (mesma semente, mesmos dados)')
+        parser.add_argument('--prefixo', default='SYN', help='Prefixo dos códigos de estação e dos usuários')
+        parser.add_argument('--ruido', type=float, default=0.05, help='Desvio-padrão do ruído da gravidade (mGal)')
+        parser.add_argument('--usuarios', type=int, default=0, help='Usuários operadores fictícios para atribuir as estações')
+        parser.add_argument('--imagens', type=int, default=0, help='Fotos e croquis fictícios, reaproveitados entre as estações')
+
+    def handle(self, *args, **options):
+        quantidade, tamanho_lote = options['quantidade'], options['batch_size']
+        if quantidade < 1 or tamanho_lote < 1:
+            raise CommandError('quantidade e --batch-size devem ser positivos')
+        if options['usuarios'] < 0 or options['imagens'] < 0 or options['ruido'] < 0:
+            raise CommandError('--usuarios, --imagens e --ruido não podem ser negativos')
+
+        prefixo = options['prefixo']
+        rng = np.random.default_rng(options['seed'])
+        campo = CampoSintetico(rng)
+        usuarios = self.criar_usuarios(prefixo, options['usuarios'])
+        imagens = self.criar_imagens(prefixo, options['imagens'], rng)
+        inicio_codigo = self.ultimo_numero(prefixo)
+
+        inicio = time.perf_counter()
+        geradas = 0
+        try:
+            while geradas < quantidade:
+                tamanho = min(tamanho_lote, quantidade - geradas)
+                estacoes = self.gerar_lote(
+                    rng, campo, inicio_codigo + geradas, tamanho, prefixo, options['ruido'], usuarios, imagens,
+                )
+                with transaction.atomic():
+                    self.gravar_lote(estacoes)
+                geradas += tamanho
+                self.stdout.write(f'{geradas}/{quantidade} estações ({geradas / (time.perf_counter() - inicio):.0f}/s)')
+        finally:
+            if geradas:
+                cache_dados.invalidar()
+                espacial.invalidar_indice()
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {geradas} estações geradas em {segundos:.1f}s ({geradas / segundos:.0f} estações/s)'
+        ))
+
+    def ultimo_numero(self, prefixo):
+        """Maior número já usado com o prefixo, para continuar a numeração de execuções anteriores"""
+        # Contar não serve: depois de excluir uma estação a contagem repetiria um código existente
+        ultimo = (
+            MedicaoGravimetrica.objects
+            .filter(codigo_estacao__startswith=f'{prefixo}-', codigo_estacao__regex=rf'^{re.escape(prefixo)}-[0-9]+$')
+            .annotate(tamanho=Length('codigo_estacao'))
+            .order_by('-tamanho', '-codigo_estacao')
+            .values_list('codigo_estacao', flat=True)
+            .first()
+        )
+        return int(ultimo[len(prefixo) + 1:]) if ultimo else 0
+
+    def criar_usuarios(self, prefixo, quantidade):
+        if not quantidade:
+            return []
+        nomes = [f'{prefixo.lower()}-operador-{i}' for i in range(1, quantidade + 1)]
+        existentes = set(User.objects.filter(username__in=nomes).values_list('username', flat=True))
+        senha = make_password(None)  # senha inutilizável: as contas não permitem login
+        User.objects.bulk_create([
+            User(
+                username=nome, email=f'{nome}@sintetico.invalid', password=senha,
+                user_type='operator', first_name='Operador', last_name=nome.rsplit('-', 1)[1],
+            )
+            for nome in nomes if nome not in existentes
+        ])
+        cache_dados.invalidar(cache_dados.USUARIOS)
+        return list(User.objects.filter(username__in=nomes).order_by('pk'))
+
+    def criar_imagens(self, prefixo, quantidade, rng):
+        """Pares (foto, croqui) salvos uma vez no storage e repetidos entre as estações"""
+        from PIL import Image
+
+        pares = []
+        for i in range(quantidade):
+            arquivos = []
+            for pasta in ('estacoes/sinteticas', 'croquis/sinteticos'):
+                pixels = rng.integers(0, 256, (48, 64, 3), dtype=np.uint8)
+                conteudo = io.BytesIO()
+                Image.fromarray(pixels).save(conteudo, format='PNG')
+                arquivos.append(default_storage.save(f'{pasta}/{prefixo.lower()}-{i}.png', ContentFile(conteudo.getvalue())))
+            pares.append(tuple(arquivos))
+        return pares
+
+    def sortear_posicoes(self, rng, quantidade):
+        longitudes, latitudes = np.empty(0), np.empty(0)
+        while longitudes.size < quantidade:
+            lon = rng.uniform(LON_MIN, LON_MAX, 2 * quantidade)
+            lat = rng.uniform(LAT_MIN, LAT_MAX, 2 * quantidade)
+            dentro = dentro_do_contorno(lon, lat)
+            longitudes = np.concatenate([longitudes, lon[dentro]])
+            latitudes = np.concatenate([latitudes, lat[dentro]])
+        # Arredondadas como nos campos do modelo, para o geohash bater com o de save()
+        return np.round(longitudes[:quantidade], 7), np.round(latitudes[:quantidade], 6)
+
+    def gerar_lote(self, rng, campo, primeiro, quantidade, prefixo, ruido, usuarios, imagens):
+        longitudes, latitudes = self.sortear_posicoes(rng, quantidade)
+        # Altitude mínima de 1 m: com altitude zero o modelo não calcula a anomalia
+        altitudes = np.round(np.clip(campo.altitude(longitudes, latitudes) + rng.normal(0, 15, quantidade), 1, None), 2)
+        densidade = float(MedicaoGravimetrica._meta.get_field('densidade_referencia').default)
+        gravidades = (
+            anomalias.gravidade_normal(latitudes, settings.GRAVIDADE_NORMAL_FORMULA)
+            - (anomalias.GRADIENTE_AR_LIVRE - anomalias.FATOR_BOUGUER * densidade) * altitudes
+            + campo.anomalia(longitudes, latitudes)
+            + rng.normal(0, ruido, quantidade)
+        )
+        gravidades = np.round(np.clip(gravidades, 977000, 982000), 5)
+        incertezas = np.round(rng.uniform(0.005, 0.05, quantidade), 5)
+        bouguer = anomalias.anomalias_bouguer(
+            latitudes, altitudes, gravidades, densidade, settings.GRAVIDADE_NORMAL_FORMULA,
+        )
+        geohashes = espacial.geohashes(latitudes, longitudes)
+        datas = rng.integers(DATA_INICIAL, date.today().toordinal() + 1, quantidade)
+        instrumentos = rng.integers(0, len(INSTRUMENTOS), quantidade)
+
+        estacoes = []
+        for i in range(quantidade):
+            numero = primeiro + i + 1
+            usuario = usuarios[numero % len(usuarios)] if usuarios else None
+            foto, croqui = imagens[numero % len(imagens)] if imagens else (None, None)
+            estacoes.append(MedicaoGravimetrica(
+                usuario=usuario,
+                nome_estacao=f'Estação sintética {numero}',
+                codigo_estacao=f'{prefixo}-{numero:07d}',
+                latitude=_decimal(latitudes[i]),
+                longitude=_decimal(longitudes[i]),
+                altitude=_decimal(altitudes[i]),
+                geohash=geohashes[i],
+                valor_gravidade=_decimal(gravidades[i]),
+                incerteza=_decimal(incertezas[i]),
+                anomalia_bouguer=bouguer[i],
+                data_medicao=date.fromordinal(int(datas[i])),
+                operador=usuario.get_full_name() if usuario else 'Equipe sintética',
+                instrumento=INSTRUMENTOS[instrumentos[i]],
+                foto_estacao=foto,
+                croqui=croqui,
+            ))
+        return estacoes
+
+    def gravar_lote(self, estacoes):
+        MedicaoGravimetrica.objects.bulk_create(estacoes)
+        if any(estacao.pk is None for estacao in estacoes):
+            # Bancos sem RETURNING no INSERT em lote: recupera as chaves pelo código
+            pks = dict(MedicaoGravimetrica.objects.filter(
+                codigo_estacao__in=[e.codigo_estacao for e in estacoes]
+            ).values_list('codigo_estacao', 'pk'))
+            for estacao in estacoes:
+                estacao.pk = pks[estacao.codigo_estacao]
+        ObservacaoGravimetrica.objects.bulk_create([
+            ObservacaoGravimetrica(
+                estacao_id=estacao.pk, usuario=estacao.usuario,
+                **{campo: getattr(estacao, campo) for campo in CAMPOS_OBSERVACAO},
+            )
+            for estacao in estacoes
+        ])
+
+
+def _decimal(valor):
+    return Decimal(repr(float(valor)))
@@ -0,0 +1,49 @@
+"""
+Management command que envia os emails da fila de saída
+Uso: python manage.py send_queued_emails [--lote 50] [--continuo] [--intervalo 5]
+
+Sem --continuo, esvazia os emails vencidos e termina (bom para um cron de
+minuto em minuto); com --continuo, fica rodando como worker e dorme
+``--intervalo`` segundos quando a fila está vazia.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medicoes import fila_email
+
+
+class Command(BaseCommand):
+    help = 'Envia os emails enfileirados em lotes, repetindo as falhas com espera exponencial'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=None, help='Emails por conexão (padrão: EMAIL_FILA_LOTE)')
+        parser.add_argument('--continuo', action='store_true', help='Continuar rodando e aguardar novos emails')
+        parser.add_argument('--intervalo', type=float, default=5.0, help='Segundos entre consultas com a fila vazia')
+
+    def handle(self, *args, **options):
+        if options['lote'] is not None and options['lote'] < 1:
+            raise CommandError('--lote deve ser positivo')
+
+        totais = {'enviados': 0, 'adiados': 0, 'desistidos': 0}
+        try:
+            while True:
+                resultado = fila_email.enviar_lote(options['lote'])
+                for chave, valor in resultado.items():
+                    totais[chave] += valor
+                if any(resultado.values()):
+                    self.stdout.write(
+                        f"{resultado['enviados']} enviados, {resultado['adiados']} adiados, "
+                        f"{resultado['desistidos']} desistidos"
+                    )
+                    continue
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {totais['enviados']} emails enviados, {totais['adiados']} adiados, {totais['desistidos']} desistidos"
+        ))
@@ -0,0 +1,76 @@
+"""
+Management command para calcular a correção de terreno das estações a partir de um MDE local
+Uso: python manage.py terrain_correction --dem /dados/srtm.asc [--raio-externo 20000]
+"""
+
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from medicoes.anomalias import quantizar
+from medicoes.models import MedicaoGravimetrica
+from medicoes.recalculo import atualizacao_em_lote
+from medicoes.terreno import carregar_mde, calcular_correcao_terreno, RAIO_INTERNO_PADRAO, RAIO_EXTERNO_PADRAO
+
+
+class Command(BaseCommand):
+    help = 'Calcula a correção de terreno de todas as estações em uma única passada sobre o MDE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dem', default=settings.MDE_PATH, help='Arquivo do MDE (.asc ou .tif); padrão: MDE_PATH')
+        parser.add_argument('--raio-interno', type=float, default=RAIO_INTERNO_PADRAO, help='Raio da zona interna em metros (prismas)')
+        parser.add_argument('--raio-externo', type=float, default=RAIO_EXTERNO_PADRAO, help='Raio da zona externa em metros (FFT)')
+        parser.add_argument('--ativos', action='store_true', help='Apenas medições ativas')
+        parser.add_argument('--codigo', nargs='+', help='Códigos de estação')
+
+    def handle(self, *args, **options):
+        if not options['dem']:
+            raise CommandError('Informe o MDE com --dem ou defina MDE_PATH')
+        if not 0 < options['raio_interno'] < options['raio_externo']:
+            raise CommandError('Os raios devem satisfazer 0 < raio interno < raio externo')
+
+        try:
+            mde = carregar_mde(options['dem'])
+        except (OSError, ValueError, KeyError, ImportError) as e:
+            raise CommandError(f'Não foi possível abrir o MDE: {e}')
+
+        queryset = MedicaoGravimetrica.objects.all()
+        if options['ativos']:
+            queryset = queryset.filter(ativo=True)
+        if options['codigo']:
+            queryset = queryset.filter(codigo_estacao__in=options['codigo'])
+
+        linhas = list(queryset.order_by('pk').values_list(
+            'pk', 'longitude', 'latitude', 'altitude', 'densidade_referencia'
+        ))
+        if not linhas:
+            self.stdout.write(self.style.WARNING('Nenhuma estação encontrada.'))
+            return
+
+        inicio = time.perf_counter()
+        pks, lons, lats, alts, densidades = zip(*linhas)
+        correcoes = calcular_correcao_terreno(
+            mde,
+            np.array(lons, dtype=np.float64),
+            np.array(lats, dtype=np.float64),
+            np.array([np.nan if a is None else float(a) for a in alts]),
+            np.array(densidades, dtype=np.float64),
+            raio_interno=options['raio_interno'],
+            raio_externo=options['raio_externo'],
+        )
+
+        agora = timezone.now()
+        valores = [
+            (valor, agora, pk)
+            for pk, valor in zip(pks, quantizar(correcoes))
+            if valor is not None
+        ]
+        atualizacao_em_lote(['correcao_terreno', 'data_atualizacao'])(valores)
+        segundos = time.perf_counter() - inicio
+
+        fora = len(linhas) - len(valores)
+        self.stdout.write(f'Estações: {len(linhas)} | Corrigidas: {len(valores)} | Fora do MDE: {fora}')
+        self.stdout.write(self.style.SUCCESS(f'✓ Correção de terreno concluída em {segundos:.2f}s'))
@@ -0,0 +1,266 @@
+"""Métricas da aplicação no formato texto do Prometheus
+
+Contadores e histogramas ficam em memória no processo (um lock e uma soma
+por atualização). Com ``settings.METRICAS_DIR`` (um diretório compartilhado
+pelos workers do gunicorn, limpo a cada deploy) cada processo grava seu
+retrato em ``metricas-<pid>.json`` no máximo a cada
+``METRICAS_INTERVALO_GRAVACAO`` segundos, e o endpoint ``/metrics`` soma os
+arquivos de todos os processos. Sem o diretório, o endpoint mostra só o
+processo que atendeu a requisição.
+
+Medidores calculados no banco (logins bloqueados) são lidos na hora da coleta.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+FAIXAS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAIXAS_PDF = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0)
+
+
+class Registro:
+    """Conjunto de métricas de um processo"""
+
+    def __init__(self):
+        self.metricas = {}
+        self.medidores = {}
+        self.lock = threading.Lock()
+        self._proxima_gravacao = 0.0
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador(self, nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), faixas=FAIXAS_PADRAO):
+        return self._registrar(Histograma(self, nome, ajuda, rotulos, faixas))
+
+    def medidor(self, nome, ajuda):
+        """Decorator de função sem argumentos cujo valor é lido a cada coleta"""
+        def registrar(funcao):
+            self.medidores[nome] = (ajuda, funcao)
+            return funcao
+        return registrar
+
+    def _registrar(self, metrica):
+        self.metricas[metrica.nome] = metrica
+        return metrica
+
+    # Multiprocesso ---------------------------------------------------------
+
+    def retrato(self):
+        with self.lock:
+            return {
+                nome: [[list(chave), metrica.serializar(valor)] for chave, valor in metrica.valores.items()]
+                for nome, metrica in self.metricas.items()
+            }
+
+    def talvez_gravar(self):
+        diretorio = settings.METRICAS_DIR
+        if diretorio and time.monotonic() >= self._proxima_gravacao:
+            self._proxima_gravacao = time.monotonic() + settings.METRICAS_INTERVALO_GRAVACAO
+            try:
+                self.gravar(diretorio)
+            except OSError:
+                pass  # métricas nunca derrubam uma requisição; tenta de novo no próximo intervalo
+
+    def gravar(self, diretorio):
+        diretorio = Path(diretorio)
+        diretorio.mkdir(parents=True, exist_ok=True)
+        temporario = diretorio / f'.metricas-{os.getpid()}-{threading.get_ident()}.tmp'
+        temporario.write_text(json.dumps(self.retrato()))
+        os.replace(temporario, diretorio / f'metricas-{os.getpid()}.json')
+
+    def coletar(self):
+        """Valores somados de todos os processos (ou só deste, sem METRICAS_DIR)"""
+        diretorio = settings.METRICAS_DIR
+        if not diretorio:
+            return self.retrato()
+        self.gravar(diretorio)
+        total = {}
+        for arquivo in Path(diretorio).glob('metricas-*.json'):
+            try:
+                dados = json.loads(arquivo.read_text())
+            except (OSError, ValueError):
+                continue  # processo gravando ou arquivo removido no meio da leitura
+            for nome, series in dados.items():
+                metrica = self.metricas.get(nome)
+                if metrica is None:
+                    continue
+                somadas = total.setdefault(nome, {})
+                for chave, valor in series:
+                    chave = tuple(chave)
+                    somadas[chave] = metrica.somar(somadas.get(chave), valor)
+        return {nome: [[list(chave), valor] for chave, valor in series.items()] for nome, series in total.items()}
+
+    # Exposição ---------------------------------------------------------------
+
+    def exposicao(self):
+        linhas = []
+        coletado = self.coletar()
+        for nome, metrica in self.metricas.items():
+            linhas += [f'# HELP {nome} {metrica.ajuda}', f'# TYPE {nome} {metrica.tipo}']
+            for chave, valor in sorted(coletado.get(nome, []), key=lambda s: s[0]):
+                linhas += metrica.linhas(dict(zip(metrica.rotulos, chave)), valor)
+        for nome, (ajuda, funcao) in self.medidores.items():
+            linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} gauge', f'{nome} {_numero(funcao())}']
+        return '\n'.join(linhas) + '\n'
+
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, registro, nome, ajuda, rotulos):
+        self.registro, self.nome, self.ajuda, self.rotulos = registro, nome, ajuda, tuple(rotulos)
+        self.valores = {}
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(str(rotulos[r]) for r in self.rotulos)
+        with self.registro.lock:
+            self.valores[chave] = self.valores.get(chave, 0) + valor
+        self.registro.talvez_gravar()
+
+    def serializar(self, valor):
+        return valor
+
+    def somar(self, acumulado, valor):
+        return (acumulado or 0) + valor
+
+    def linhas(self, rotulos, valor):
+        return [f'{self.nome}{_rotulos(rotulos)} {_numero(valor)}']
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, registro, nome, ajuda, rotulos, faixas):
+        self.registro, self.nome, self.ajuda, self.rotulos = registro, nome, ajuda, tuple(rotulos)
+        self.faixas = tuple(faixas)
+        self.valores = {}
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(str(rotulos[r]) for r in self.rotulos)
+        indice = bisect_left(self.faixas, valor)  # primeira faixa com le >= valor
+        with self.registro.lock:
+            dados = self.valores.get(chave)
+            if dados is None:
+                dados = self.valores[chave] = [[0] * (len(self.faixas) + 1), 0.0, 0]
+            dados[0][indice] += 1
+            dados[1] += valor
+            dados[2] += 1
+        self.registro.talvez_gravar()
+
+    @contextmanager
+    def medir(self, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def cronometrar(self, **rotulos):
+        """Decorator que observa a duração de cada chamada"""
+        def decorar(funcao):
+            @wraps(funcao)
+            def _funcao(*args, **kwargs):
+                with self.medir(**rotulos):
+                    return funcao(*args, **kwargs)
+            return _funcao
+        return decorar
+
+    def serializar(self, valor):
+        contagens, soma, total = valor
+        return [list(contagens), soma, total]
+
+    def somar(self, acumulado, valor):
+        if acumulado is None:
+            return [list(valor[0]), valor[1], valor[2]]
+        return [[a + b for a, b in zip(acumulado[0], valor[0])], acumulado[1] + valor[1], acumulado[2] + valor[2]]
+
+    def linhas(self, rotulos, valor):
+        contagens, soma, total = valor
+        linhas, acumulado = [], 0
+        for faixa, contagem in zip([*self.faixas, math.inf], contagens):
+            acumulado += contagem
+            le = '+Inf' if faixa == math.inf else _numero(faixa)
+            linhas.append(f'{self.nome}_bucket{_rotulos({**rotulos, "le": le})} {acumulado}')
+        linhas.append(f'{self.nome}_sum{_rotulos(rotulos)} {_numero(soma)}')
+        linhas.append(f'{self.nome}_count{_rotulos(rotulos)} {total}')
+        return linhas
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos.items()) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+# ============================================================================
+# Métricas da aplicação
+# ============================================================================
+
+REGISTRO = Registro()
+
+REQUISICAO_SEGUNDOS = REGISTRO.histograma(
+    'gravimeasure_http_requisicao_segundos', 'Latência das requisições por rota', ('view', 'metodo'),
+)
+REQUISICOES = REGISTRO.contador(
+    'gravimeasure_http_requisicoes_total', 'Requisições atendidas por rota e status', ('view', 'metodo', 'status'),
+)
+PDF_SEGUNDOS = REGISTRO.histograma(
+    'gravimeasure_pdf_segundos', 'Tempo de geração dos PDFs (mapa + renderização)', ('tipo',), FAIXAS_PDF,
+)
+IMPORTACAO_LINHAS = REGISTRO.contador(
+    'gravimeasure_importacao_linhas_total', 'Linhas de planilha importadas por resultado', ('resultado',),
+)
+IMPORTACAO_SEGUNDOS = REGISTRO.contador(
+    'gravimeasure_importacao_segundos_total', 'Tempo gasto importando planilhas (linhas/s = razão dos rates)',
+)
+LOGIN_BLOQUEIOS = REGISTRO.contador(
+    'gravimeasure_login_bloqueios_total', 'Contas bloqueadas por excesso de tentativas de login',
+)
+CACHE_CONSULTAS = REGISTRO.contador(
+    'gravimeasure_cache_consultas_total', 'Consultas ao cache de dados por nome e resultado', ('nome', 'resultado'),
+)
+
+
+@REGISTRO.medidor('gravimeasure_login_bloqueados', 'Identificadores com login bloqueado agora')
+def _logins_bloqueados():
+    from .models import LoginAttempt
+
+    return LoginAttempt.objects.filter(blocked_until__gt=timezone.now()).count()
+
+
+class MetricasMiddleware:
+    """Mede latência e status de cada requisição por nome de rota"""
+
+    def __init__(self, get_response):
+        if not settings.METRICAS_ATIVAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'sem_rota'
+        REQUISICAO_SEGUNDOS.observar(time.perf_counter() - inicio, view=view, metodo=request.method)
+        REQUISICOES.inc(view=view, metodo=request.method, status=response.status_code)
+        return response
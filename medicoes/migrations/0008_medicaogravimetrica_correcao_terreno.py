@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0007_loginattempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicaogravimetrica',
+            name='correcao_terreno',
+            field=models.DecimalField(blank=True, decimal_places=5, help_text='Correção de terreno calculada a partir do MDE (comando terrain_correction)', max_digits=10, null=True, verbose_name='Correção de Terreno (mGal)'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import medicoes.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0008_medicaogravimetrica_correcao_terreno'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObservacaoGravimetrica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_medicao', models.DateField(verbose_name='Data da Medição')),
+                ('valor_gravidade', models.DecimalField(decimal_places=5, max_digits=12, validators=[medicoes.models.validar_gravidade_range], verbose_name='Valor da Gravidade (mGal)')),
+                ('incerteza', models.DecimalField(blank=True, decimal_places=5, max_digits=8, null=True, verbose_name='Incerteza (mGal)')),
+                ('altitude', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True, verbose_name='Altitude (m)')),
+                ('anomalia_bouguer', models.DecimalField(blank=True, decimal_places=5, max_digits=12, null=True, verbose_name='Anomalia de Bouguer (mGal)')),
+                ('operador', models.CharField(blank=True, max_length=100, null=True, verbose_name='Operador')),
+                ('instrumento', models.CharField(blank=True, max_length=100, null=True, verbose_name='Instrumento')),
+                ('data_cadastro', models.DateTimeField(auto_now_add=True)),
+                ('estacao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico', to='medicoes.medicaogravimetrica', verbose_name='Estação')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Observação Gravimétrica',
+                'verbose_name_plural': 'Observações Gravimétricas',
+                'ordering': ['-data_medicao', '-id'],
+                'indexes': [models.Index(fields=['estacao', 'data_medicao'], name='medicoes_ob_estacao_f09358_idx')],
+            },
+        ),
+    ]
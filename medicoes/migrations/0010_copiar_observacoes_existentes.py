@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:00
+
+from django.db import migrations
+
+CAMPOS_OBSERVACAO = (
+    'data_medicao',
+    'valor_gravidade',
+    'incerteza',
+    'altitude',
+    'anomalia_bouguer',
+    'operador',
+    'instrumento',
+)
+
+
+def copiar_observacoes(apps, schema_editor):
+    """Cria a observação inicial de cada estação a partir dos dados atuais"""
+    MedicaoGravimetrica = apps.get_model('medicoes', 'MedicaoGravimetrica')
+    ObservacaoGravimetrica = apps.get_model('medicoes', 'ObservacaoGravimetrica')
+    db_alias = schema_editor.connection.alias
+
+    lote = []
+    linhas = MedicaoGravimetrica.objects.using(db_alias).values('pk', 'usuario_id', *CAMPOS_OBSERVACAO)
+    for linha in linhas.iterator(chunk_size=2000):
+        lote.append(ObservacaoGravimetrica(
+            estacao_id=linha.pop('pk'),
+            usuario_id=linha.pop('usuario_id'),
+            **linha
+        ))
+        if len(lote) >= 2000:
+            ObservacaoGravimetrica.objects.using(db_alias).bulk_create(lote)
+            lote = []
+    if lote:
+        ObservacaoGravimetrica.objects.using(db_alias).bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0009_observacaogravimetrica'),
+    ]
+
+    operations = [
+        migrations.RunPython(copiar_observacoes, migrations.RunPython.noop),
+    ]
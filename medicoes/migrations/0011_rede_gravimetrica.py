@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0010_copiar_observacoes_existentes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicaogravimetrica',
+            name='estacao_referencia',
+            field=models.BooleanField(default=False, help_text='Estação absoluta mantida fixa no ajustamento da rede', verbose_name='Estação de Referência'),
+        ),
+        migrations.AddField(
+            model_name='medicaogravimetrica',
+            name='gravidade_ajustada',
+            field=models.DecimalField(blank=True, decimal_places=5, help_text='Valor da gravidade após o ajustamento da rede por mínimos quadrados', max_digits=12, null=True, verbose_name='Gravidade Ajustada (mGal)'),
+        ),
+        migrations.AddField(
+            model_name='medicaogravimetrica',
+            name='incerteza_ajustada',
+            field=models.DecimalField(blank=True, decimal_places=5, help_text='Desvio-padrão a posteriori do valor ajustado', max_digits=8, null=True, verbose_name='Incerteza Ajustada (mGal)'),
+        ),
+        migrations.CreateModel(
+            name='LigacaoGravimetrica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('diferenca', models.DecimalField(decimal_places=5, help_text='Gravidade no destino menos gravidade na origem', max_digits=12, verbose_name='Diferença de Gravidade (mGal)')),
+                ('incerteza', models.DecimalField(blank=True, decimal_places=5, help_text='Sem valor, usa a combinação das incertezas das estações', max_digits=8, null=True, verbose_name='Incerteza (mGal)')),
+                ('data_medicao', models.DateField(blank=True, null=True, verbose_name='Data da Medição')),
+                ('instrumento', models.CharField(blank=True, max_length=100, null=True, verbose_name='Instrumento')),
+                ('ativo', models.BooleanField(default=True)),
+                ('estacao_destino', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ligacoes_chegada', to='medicoes.medicaogravimetrica', verbose_name='Estação de Destino')),
+                ('estacao_origem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ligacoes_saida', to='medicoes.medicaogravimetrica', verbose_name='Estação de Origem')),
+            ],
+            options={
+                'verbose_name': 'Ligação Gravimétrica',
+                'verbose_name_plural': 'Ligações Gravimétricas',
+                'ordering': ['estacao_origem', 'estacao_destino'],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+TABELA = 'medicoes_medicaogravimetrica'
+COLUNAS = ('nome_estacao', 'codigo_estacao', 'operador')
+
+SQLITE_CRIAR = [
+    f"""CREATE VIRTUAL TABLE medicoes_busca USING fts5(
+        {', '.join(COLUNAS)}, content='{TABELA}', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER medicoes_busca_ai AFTER INSERT ON {TABELA} BEGIN
+        INSERT INTO medicoes_busca(rowid, {', '.join(COLUNAS)})
+        VALUES (new.id, {', '.join('new.' + c for c in COLUNAS)});
+    END""",
+    f"""CREATE TRIGGER medicoes_busca_ad AFTER DELETE ON {TABELA} BEGIN
+        INSERT INTO medicoes_busca(medicoes_busca, rowid, {', '.join(COLUNAS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in COLUNAS)});
+    END""",
+    f"""CREATE TRIGGER medicoes_busca_au AFTER UPDATE OF {', '.join(COLUNAS)} ON {TABELA} BEGIN
+        INSERT INTO medicoes_busca(medicoes_busca, rowid, {', '.join(COLUNAS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in COLUNAS)});
+        INSERT INTO medicoes_busca(rowid, {', '.join(COLUNAS)})
+        VALUES (new.id, {', '.join('new.' + c for c in COLUNAS)});
+    END""",
+    "INSERT INTO medicoes_busca(medicoes_busca) VALUES ('rebuild')",
+]
+SQLITE_REMOVER = [
+    'DROP TRIGGER IF EXISTS medicoes_busca_ai',
+    'DROP TRIGGER IF EXISTS medicoes_busca_ad',
+    'DROP TRIGGER IF EXISTS medicoes_busca_au',
+    'DROP TABLE IF EXISTS medicoes_busca',
+]
+
+# No PostgreSQL o icontains vira UPPER(col) LIKE UPPER(%s): índices GIN trigram nessa expressão
+POSTGRES_CRIAR = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+    f'CREATE INDEX IF NOT EXISTS medicoes_busca_{c}_trgm ON {TABELA} USING gin (UPPER({c}::text) gin_trgm_ops)'
+    for c in COLUNAS
+]
+POSTGRES_REMOVER = [f'DROP INDEX IF EXISTS medicoes_busca_{c}_trgm' for c in COLUNAS]
+
+
+def executar(comandos):
+    def operacao(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in comandos.get(vendor, []):
+            schema_editor.execute(sql)
+    return operacao
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0011_rede_gravimetrica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBuscaEstacao',
+            fields=[
+                ('estacao', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='indice_busca', serialize=False, to='medicoes.medicaogravimetrica')),
+                ('documento', models.TextField(db_column='medicoes_busca')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'medicoes_busca',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(
+            executar({'sqlite': SQLITE_CRIAR, 'postgresql': POSTGRES_CRIAR}),
+            executar({'sqlite': SQLITE_REMOVER, 'postgresql': POSTGRES_REMOVER}),
+        ),
+    ]
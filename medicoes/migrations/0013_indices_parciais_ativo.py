@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0012_indice_busca_estacoes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicaogravimetrica',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['data_medicao', 'id'], name='medicao_ativo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicaogravimetrica',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['anomalia_bouguer'], name='medicao_ativo_anomalia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicaogravimetrica',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['valor_gravidade'], name='medicao_ativo_gravidade_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:14
+
+import numpy as np
+
+from django.db import migrations, models
+
+# Cópia congelada de medicoes.espacial.geohashes (precisão 9): a migração não depende do código atual
+ALFABETO_GEOHASH = np.frombuffer(b'0123456789bcdefghjkmnpqrstuvwxyz', dtype=np.uint8)
+PRECISAO = 9
+
+
+def geohashes(latitudes, longitudes):
+    total = 5 * PRECISAO
+    bits_lon, bits_lat = (total + 1) // 2, total // 2
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    ix = np.clip(np.floor((lon + 180) / 360 * (1 << bits_lon)), 0, (1 << bits_lon) - 1).astype(np.int64)
+    iy = np.clip(np.floor((lat + 90) / 180 * (1 << bits_lat)), 0, (1 << bits_lat) - 1).astype(np.int64)
+    codigo = np.zeros(np.shape(ix), dtype=np.int64)
+    for posicao in range(total):
+        if posicao % 2 == 0:
+            bit = (ix >> (bits_lon - 1 - posicao // 2)) & 1
+        else:
+            bit = (iy >> (bits_lat - 1 - posicao // 2)) & 1
+        codigo = (codigo << 1) | bit
+    deslocamentos = 5 * np.arange(PRECISAO - 1, -1, -1, dtype=np.int64)
+    indices = (codigo[:, None] >> deslocamentos) & 31
+    return [s.decode() for s in ALFABETO_GEOHASH[indices].view(f'S{PRECISAO}').ravel()]
+
+
+def preencher_geohash(apps, schema_editor):
+    """Calcula o geohash das estações existentes em lotes vetorizados"""
+    MedicaoGravimetrica = apps.get_model('medicoes', 'MedicaoGravimetrica')
+    connection = schema_editor.connection
+    tabela = connection.ops.quote_name(MedicaoGravimetrica._meta.db_table)
+    sql = f'UPDATE {tabela} SET geohash = %s WHERE id = %s'
+
+    linhas = list(
+        MedicaoGravimetrica.objects.using(connection.alias).values_list('pk', 'latitude', 'longitude').iterator(chunk_size=5000)
+    )
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(linhas), 5000):
+            pks, lats, lons = zip(*linhas[inicio:inicio + 5000])
+            codigos = geohashes([float(v) for v in lats], [float(v) for v in lons])
+            cursor.executemany(sql, list(zip(codigos, pks)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0013_indices_parciais_ativo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicaogravimetrica',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Célula geohash da posição, usada nas consultas espaciais', max_length=12, verbose_name='Geohash'),
+        ),
+        migrations.RunPython(preencher_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Coluna geométrica opcional, só criada quando o projeto roda com PostGIS.
+# Fica fora do estado das migrações (e do modelo): o estado é o mesmo com ou
+# sem PostGIS, e as consultas de medicoes.espacial a usam por SQL. Bancos
+# migrados antes de ligar o PostGIS a recebem de espacial.garantir_ponto_postgis
+# (post_migrate).
+
+from django.conf import settings
+from django.db import migrations
+
+CRIAR_PONTO = """
+ALTER TABLE medicoes_medicaogravimetrica ADD COLUMN IF NOT EXISTS ponto geometry(Point, 4326) NULL;
+CREATE INDEX IF NOT EXISTS medicoes_medicaogravimetrica_ponto_id
+    ON medicoes_medicaogravimetrica USING GIST (ponto);
+
+CREATE OR REPLACE FUNCTION medicoes_sincronizar_ponto() RETURNS trigger AS $$
+BEGIN
+    NEW.ponto := ST_SetSRID(ST_MakePoint(NEW.longitude::float8, NEW.latitude::float8), 4326);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS medicoes_ponto_sincronizado ON medicoes_medicaogravimetrica;
+CREATE TRIGGER medicoes_ponto_sincronizado
+    BEFORE INSERT OR UPDATE OF latitude, longitude ON medicoes_medicaogravimetrica
+    FOR EACH ROW EXECUTE FUNCTION medicoes_sincronizar_ponto();
+
+UPDATE medicoes_medicaogravimetrica
+    SET ponto = ST_SetSRID(ST_MakePoint(longitude::float8, latitude::float8), 4326);
+"""
+
+REMOVER_PONTO = """
+DROP TRIGGER IF EXISTS medicoes_ponto_sincronizado ON medicoes_medicaogravimetrica;
+DROP FUNCTION IF EXISTS medicoes_sincronizar_ponto();
+ALTER TABLE medicoes_medicaogravimetrica DROP COLUMN IF EXISTS ponto;
+"""
+
+
+def _usa_postgis(schema_editor):
+    return settings.USA_POSTGIS and schema_editor.connection.vendor == 'postgresql'
+
+
+def criar_ponto(apps, schema_editor):
+    if _usa_postgis(schema_editor):
+        schema_editor.execute(CRIAR_PONTO)
+
+
+def remover_ponto(apps, schema_editor):
+    if _usa_postgis(schema_editor):
+        schema_editor.execute(REMOVER_PONTO)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0014_geohash_estacoes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(criar_ponto, remover_ponto)],
+            state_operations=[],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0015_ponto_postgis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailEnfileirado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assunto', models.CharField(max_length=255, verbose_name='Assunto')),
+                ('corpo', models.TextField(verbose_name='Corpo (texto)')),
+                ('corpo_html', models.TextField(blank=True, default='', verbose_name='Corpo (HTML)')),
+                ('remetente', models.CharField(max_length=254, verbose_name='Remetente')),
+                ('destinatarios', models.JSONField(verbose_name='Destinatários')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('enviado', 'Enviado'), ('falhou', 'Falhou')], default='pendente', max_length=10, verbose_name='Status')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('proxima_tentativa', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próxima tentativa')),
+                ('ultimo_erro', models.TextField(blank=True, default='', verbose_name='Último erro')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('enviado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Email na Fila',
+                'verbose_name_plural': 'Emails na Fila',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(condition=models.Q(('status', 'pendente')), fields=['proxima_tentativa', 'id'], name='email_pendente_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0016_fila_email'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pendingregistration',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='emailenfileirado',
+            index=models.Index(condition=models.Q(('status', 'enviado')), fields=['enviado_em'], name='email_enviado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['last_attempt'], name='medicoes_lo_last_at_8b03fd_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# SQL congelado dos triggers da 0012: a 0014 (AddField geohash) recria a tabela de
+# estações no SQLite e os triggers do índice FTS5 se perdem junto com a tabela antiga
+TABELA = 'medicoes_medicaogravimetrica'
+COLUNAS = ('nome_estacao', 'codigo_estacao', 'operador')
+
+SQLITE_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS medicoes_busca_ai AFTER INSERT ON {TABELA} BEGIN
+        INSERT INTO medicoes_busca(rowid, {', '.join(COLUNAS)})
+        VALUES (new.id, {', '.join('new.' + c for c in COLUNAS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS medicoes_busca_ad AFTER DELETE ON {TABELA} BEGIN
+        INSERT INTO medicoes_busca(medicoes_busca, rowid, {', '.join(COLUNAS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in COLUNAS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS medicoes_busca_au AFTER UPDATE OF {', '.join(COLUNAS)} ON {TABELA} BEGIN
+        INSERT INTO medicoes_busca(medicoes_busca, rowid, {', '.join(COLUNAS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in COLUNAS)});
+        INSERT INTO medicoes_busca(rowid, {', '.join(COLUNAS)})
+        VALUES (new.id, {', '.join('new.' + c for c in COLUNAS)});
+    END""",
+    "INSERT INTO medicoes_busca(medicoes_busca) VALUES ('rebuild')",
+]
+
+
+def recriar_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'medicoes_busca'")
+        if cursor.fetchone() is None:
+            return
+    for sql in SQLITE_TRIGGERS:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicoes', '0017_indices_limpeza'),
+    ]
+
+    operations = [
+        migrations.RunPython(recriar_triggers, migrations.RunPython.noop),
+    ]
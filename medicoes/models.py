@@ -1,11 +1,13 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator, FileExtensionValidator
 from django.core.exceptions import ValidationError
-from decimal import Decimal, ROUND_HALF_UP
-import math
-from datetime import datetime
+from django.utils import timezone
 from decimal import Decimal
+from datetime import datetime
+
+from . import anomalias, espacial
 
 # Opções de ícone para marcadores no mapa
 MARKER_ICON_CHOICES = (
@@ -135,7 +137,7 @@ class PendingRegistration(models.Model):
     email = models.EmailField(max_length=254, unique=True)
     token = models.CharField(max_length=128, unique=True)
     data = models.JSONField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         verbose_name = 'Registro Pendente'
@@ -157,12 +159,50 @@ class LoginAttempt(models.Model):
         verbose_name_plural = 'Tentativas de Login'
         indexes = [
             models.Index(fields=['identifier']),
+            models.Index(fields=['last_attempt']),
         ]
 
     def __str__(self):
         return f"LoginAttempt for {self.identifier}"
 
 
+class EmailEnfileirado(models.Model):
+    """Email na fila de saída, enviado pelo comando send_queued_emails"""
+
+    PENDENTE = 'pendente'
+    ENVIADO = 'enviado'
+    FALHOU = 'falhou'
+    STATUS_CHOICES = (
+        (PENDENTE, 'Pendente'),
+        (ENVIADO, 'Enviado'),
+        (FALHOU, 'Falhou'),
+    )
+
+    assunto = models.CharField(max_length=255, verbose_name='Assunto')
+    corpo = models.TextField(verbose_name='Corpo (texto)')
+    corpo_html = models.TextField(blank=True, default='', verbose_name='Corpo (HTML)')
+    remetente = models.CharField(max_length=254, verbose_name='Remetente')
+    destinatarios = models.JSONField(verbose_name='Destinatários')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDENTE, verbose_name='Status')
+    tentativas = models.PositiveIntegerField(default=0, verbose_name='Tentativas')
+    proxima_tentativa = models.DateTimeField(default=timezone.now, verbose_name='Próxima tentativa')
+    ultimo_erro = models.TextField(blank=True, default='', verbose_name='Último erro')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Email na Fila'
+        verbose_name_plural = 'Emails na Fila'
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['proxima_tentativa', 'id'], condition=models.Q(status='pendente'), name='email_pendente_idx'),
+            models.Index(fields=['enviado_em'], condition=models.Q(status='enviado'), name='email_enviado_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.assunto} → {', '.join(self.destinatarios)} ({self.get_status_display()})"
+
+
 # Validadores para MedicaoGravimetrica
 def validar_imagem_tamanho(file):
     """Validador para tamanho máximo de arquivo (5MB) e tipo MIME."""
@@ -194,8 +234,26 @@ def validar_gravidade_range(valor):
         raise ValidationError('Valor de gravidade deve estar entre 977000 e 982000 mGal.')
 
 
+# Campos da observação mais recente espelhados na própria estação (MedicaoGravimetrica)
+CAMPOS_OBSERVACAO = (
+    'data_medicao',
+    'valor_gravidade',
+    'incerteza',
+    'altitude',
+    'anomalia_bouguer',
+    'operador',
+    'instrumento',
+)
+
+
 class MedicaoGravimetrica(models.Model):
-    """Modelo para armazenar medições gravimétricas"""
+    """
+    Modelo para armazenar medições gravimétricas.
+
+    Cada registro representa uma estação (``codigo_estacao`` único) e guarda
+    materializados os dados da sua observação mais recente; o histórico de
+    reocupações fica em ObservacaoGravimetrica.
+    """
     
     # Usuário responsável pela medição
     usuario = models.ForeignKey(
@@ -243,6 +301,15 @@ class MedicaoGravimetrica(models.Model):
         null=True,
         blank=True
     )
+    geohash = models.CharField(
+        max_length=12,
+        db_index=True,
+        editable=False,
+        blank=True,
+        default='',
+        verbose_name="Geohash",
+        help_text="Célula geohash da posição, usada nas consultas espaciais"
+    )
     
     # Dados da medição (mGal na Terra é ~980.000, logo precisa de 6 dígitos antes da vírgula)
     valor_gravidade = models.DecimalField(
@@ -268,6 +335,14 @@ class MedicaoGravimetrica(models.Model):
         null=True,
         blank=True
     )
+    correcao_terreno = models.DecimalField(
+        max_digits=10,
+        decimal_places=5,
+        verbose_name="Correção de Terreno (mGal)",
+        help_text="Correção de terreno calculada a partir do MDE (comando terrain_correction)",
+        null=True,
+        blank=True
+    )
     densidade_referencia = models.DecimalField(
     max_digits=6,
     decimal_places=3,
@@ -275,6 +350,29 @@ class MedicaoGravimetrica(models.Model):
     default=Decimal("2.670")
     )
 
+    # Ajustamento da rede (comando adjust_network)
+    estacao_referencia = models.BooleanField(
+        default=False,
+        verbose_name="Estação de Referência",
+        help_text="Estação absoluta mantida fixa no ajustamento da rede"
+    )
+    gravidade_ajustada = models.DecimalField(
+        max_digits=12,
+        decimal_places=5,
+        verbose_name="Gravidade Ajustada (mGal)",
+        help_text="Valor da gravidade após o ajustamento da rede por mínimos quadrados",
+        null=True,
+        blank=True
+    )
+    incerteza_ajustada = models.DecimalField(
+        max_digits=8,
+        decimal_places=5,
+        verbose_name="Incerteza Ajustada (mGal)",
+        help_text="Desvio-padrão a posteriori do valor ajustado",
+        null=True,
+        blank=True
+    )
+
     
     # Informações adicionais
     data_medicao = models.DateField(
@@ -349,59 +447,33 @@ class MedicaoGravimetrica(models.Model):
         indexes = [
             models.Index(fields=['codigo_estacao']),
             models.Index(fields=['data_medicao']),
+            # Filtros reais das telas: lista (ordem/cursor), mapa de contorno e faixas de gravidade.
+            # Parciais em ``ativo``: o ORM gera ``WHERE ativo`` (sem ``= 1``), que não usa
+            # índices com ativo na frente, mas casa com a condição destes.
+            models.Index(fields=['data_medicao', 'id'], condition=models.Q(ativo=True), name='medicao_ativo_data_idx'),
+            models.Index(fields=['anomalia_bouguer'], condition=models.Q(ativo=True), name='medicao_ativo_anomalia_idx'),
+            models.Index(fields=['valor_gravidade'], condition=models.Q(ativo=True), name='medicao_ativo_gravidade_idx'),
         ]
 
     def calcular_anomalia_bouguer(self, densidade_referencia=2.67):
         if not self.altitude or not self.latitude or not self.valor_gravidade:
             return None
-        
-        # Converte para float para cálculos trigonométricos
-        phi = math.radians(float(self.latitude))
-        
-        # Fórmula da Gravidade Normal (IAG 1967)
-        # g_normal ≈ 978031.8 * (1 + 0.0053024 * sin²(φ) - 0.0000058 * sin²(2φ))
-        sin_phi2 = math.sin(phi)**2
-        sin_2phi2 = math.sin(2*phi)**2
-        
-        g_normal = Decimal('978031.8') * (
-            Decimal('1') + 
-            Decimal('0.0053024') * Decimal(str(sin_phi2)) - 
-            Decimal('0.0000058') * Decimal(str(sin_2phi2))
-        )
-        
-        h = Decimal(str(self.altitude))
-        dens = Decimal(str(densidade_referencia))
-        
-        # Correções
-        correcao_ar_livre = Decimal('0.3086') * h
-        correcao_bouguer = Decimal('0.0419') * dens * h
-        
-        # Cálculo Final
-        g_obs = Decimal(str(self.valor_gravidade))
-        anomalia = g_obs - g_normal + correcao_ar_livre - correcao_bouguer
-        
-        return anomalia.quantize(Decimal('0.00001'), rounding=ROUND_HALF_UP)
+
+        # Cálculo delegado ao motor vetorizado (gravidade normal + correções de ar livre e Bouguer)
+        return anomalias.anomalias_bouguer(
+            [self.latitude], [self.altitude], [self.valor_gravidade], densidade_referencia,
+            formula=settings.GRAVIDADE_NORMAL_FORMULA,
+        )[0]
 
     def calcular_anomalia_ar_livre(self):
         """Calcula a anomalia free-air (sem correção de Bouguer)."""
         if not self.altitude or not self.latitude or not self.valor_gravidade:
             return None
 
-        phi = math.radians(float(self.latitude))
-        sin_phi2 = math.sin(phi)**2
-        sin_2phi2 = math.sin(2*phi)**2
-
-        g_normal = Decimal('978031.8') * (
-            Decimal('1') + 
-            Decimal('0.0053024') * Decimal(str(sin_phi2)) - 
-            Decimal('0.0000058') * Decimal(str(sin_2phi2))
-        )
-
-        h = Decimal(str(self.altitude))
-        correcao_ar_livre = Decimal('0.3086') * h
-        g_obs = Decimal(str(self.valor_gravidade))
-        anomalia_free_air = g_obs - g_normal + correcao_ar_livre
-        return anomalia_free_air.quantize(Decimal('0.00001'), rounding=ROUND_HALF_UP)
+        return anomalias.anomalias_ar_livre(
+            [self.latitude], [self.altitude], [self.valor_gravidade],
+            formula=settings.GRAVIDADE_NORMAL_FORMULA,
+        )[0]
 
     def calcular_gradiente_vertical(self):
         return Decimal('-0.3086')
@@ -409,13 +481,244 @@ class MedicaoGravimetrica(models.Model):
     def save(self, *args, **kwargs):
         if self.anomalia_bouguer is None and self.altitude and self.valor_gravidade:
             self.anomalia_bouguer = self.calcular_anomalia_bouguer(self.densidade_referencia)
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = espacial.geohash(self.latitude, self.longitude)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+                kwargs['update_fields'] = {*update_fields, 'geohash'}
+        criada = self._state.adding
         super().save(*args, **kwargs)
+        if not getattr(self, '_sincronizando', False):
+            self._sincronizar_observacao(criada)
+
+    def _sincronizar_observacao(self, criada):
+        """Espelha os dados da estação na sua observação mais recente (ou cria a primeira)."""
+        valores = {campo: getattr(self, campo) for campo in CAMPOS_OBSERVACAO}
+        if not criada:
+            ultima = self.historico.ordem_cronologica_inversa().values_list('pk', flat=True).first()
+            if ultima is not None:
+                ObservacaoGravimetrica.objects.filter(pk=ultima).update(**valores)
+                return
+        # bulk_create não chama ObservacaoGravimetrica.save(), evitando recursão
+        ObservacaoGravimetrica.objects.bulk_create([
+            ObservacaoGravimetrica(estacao=self, usuario=self.usuario, **valores)
+        ])
+
+    def registrar_observacao(self, **dados):
+        """Registra uma reocupação da estação; se for a mais recente, passa a ser a exibida."""
+        return ObservacaoGravimetrica.objects.create(estacao=self, **dados)
+
+    def atualizar_ultima_observacao(self):
+        """Recarrega na estação os dados da observação mais recente."""
+        ultima = self.historico.ordem_cronologica_inversa().first()
+        if ultima is None:
+            return
+        if all(getattr(self, campo) == getattr(ultima, campo) for campo in CAMPOS_OBSERVACAO):
+            return
+        for campo in CAMPOS_OBSERVACAO:
+            setattr(self, campo, getattr(ultima, campo))
+        self._sincronizando = True
+        try:
+            self.save(update_fields=[*CAMPOS_OBSERVACAO, 'data_atualizacao'])
+        finally:
+            self._sincronizando = False
+
+    def variacao_gravidade(self, data_inicial, data_final):
+        """Variação da gravidade (mGal) entre as observações vigentes em duas épocas."""
+        inicial = self.historico.vigente_em(data_inicial)
+        final = self.historico.vigente_em(data_final)
+        if inicial is None or final is None:
+            return None
+        return final.valor_gravidade - inicial.valor_gravidade
 
     def __str__(self):
         return f"{self.codigo_estacao} - {self.nome_estacao} ({self.data_medicao})"
     
+    @property
+    def anomalia_bouguer_completa(self):
+        """Anomalia de Bouguer simples somada à correção de terreno."""
+        if self.anomalia_bouguer is None or self.correcao_terreno is None:
+            return None
+        return self.anomalia_bouguer + self.correcao_terreno
+
     @property
     def gravidade_m_s2(self):
         if self.valor_gravidade is not None:
             return float(self.valor_gravidade) * 0.00001
-        return None
\ No newline at end of file
+        return None
+
+
+class ObservacaoQuerySet(models.QuerySet):
+    """Consultas de série temporal servidas pelo índice (estacao, data_medicao)"""
+
+    def ordem_cronologica_inversa(self):
+        return self.order_by('-data_medicao', '-id')
+
+    def vigente_em(self, data):
+        """Observação vigente em uma data: a última realizada até ela."""
+        return self.filter(data_medicao__lte=data).ordem_cronologica_inversa().first()
+
+    def gravidade_em(self, data):
+        """
+        Subquery com a gravidade vigente em ``data`` para anotar estações, ex.:
+        MedicaoGravimetrica.objects.annotate(g0=ObservacaoGravimetrica.objects.gravidade_em(d0))
+        """
+        return models.Subquery(
+            self.filter(estacao=models.OuterRef('pk'), data_medicao__lte=data)
+            .ordem_cronologica_inversa()
+            .values('valor_gravidade')[:1]
+        )
+
+
+class ObservacaoGravimetrica(models.Model):
+    """Observação (ocupação) de uma estação gravimétrica em uma data"""
+
+    estacao = models.ForeignKey(
+        MedicaoGravimetrica,
+        on_delete=models.CASCADE,
+        related_name='historico',
+        verbose_name="Estação"
+    )
+    usuario = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        verbose_name="Usuário",
+        null=True,
+        blank=True
+    )
+    data_medicao = models.DateField(verbose_name="Data da Medição")
+    valor_gravidade = models.DecimalField(
+        max_digits=12,
+        decimal_places=5,
+        verbose_name="Valor da Gravidade (mGal)",
+        validators=[validar_gravidade_range]
+    )
+    incerteza = models.DecimalField(
+        max_digits=8,
+        decimal_places=5,
+        verbose_name="Incerteza (mGal)",
+        null=True,
+        blank=True
+    )
+    altitude = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        verbose_name="Altitude (m)",
+        null=True,
+        blank=True
+    )
+    anomalia_bouguer = models.DecimalField(
+        max_digits=12,
+        decimal_places=5,
+        verbose_name="Anomalia de Bouguer (mGal)",
+        null=True,
+        blank=True
+    )
+    operador = models.CharField(max_length=100, verbose_name="Operador", null=True, blank=True)
+    instrumento = models.CharField(max_length=100, verbose_name="Instrumento", null=True, blank=True)
+    data_cadastro = models.DateTimeField(auto_now_add=True)
+
+    objects = ObservacaoQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Observação Gravimétrica"
+        verbose_name_plural = "Observações Gravimétricas"
+        ordering = ['-data_medicao', '-id']
+        indexes = [
+            models.Index(fields=['estacao', 'data_medicao']),
+        ]
+
+    def __str__(self):
+        return f"{self.estacao.codigo_estacao} ({self.data_medicao})"
+
+    def save(self, *args, **kwargs):
+        if self.anomalia_bouguer is None and self.altitude and self.valor_gravidade:
+            self.anomalia_bouguer = anomalias.anomalias_bouguer(
+                [self.estacao.latitude], [self.altitude], [self.valor_gravidade],
+                self.estacao.densidade_referencia, formula=settings.GRAVIDADE_NORMAL_FORMULA,
+            )[0]
+        super().save(*args, **kwargs)
+        self.estacao.atualizar_ultima_observacao()
+
+    def delete(self, *args, **kwargs):
+        estacao = self.estacao
+        resultado = super().delete(*args, **kwargs)
+        estacao.atualizar_ultima_observacao()
+        return resultado
+
+
+class LigacaoGravimetrica(models.Model):
+    """Ligação relativa medida entre duas estações (diferença g_destino - g_origem)"""
+
+    estacao_origem = models.ForeignKey(
+        MedicaoGravimetrica,
+        on_delete=models.CASCADE,
+        related_name='ligacoes_saida',
+        verbose_name="Estação de Origem"
+    )
+    estacao_destino = models.ForeignKey(
+        MedicaoGravimetrica,
+        on_delete=models.CASCADE,
+        related_name='ligacoes_chegada',
+        verbose_name="Estação de Destino"
+    )
+    diferenca = models.DecimalField(
+        max_digits=12,
+        decimal_places=5,
+        verbose_name="Diferença de Gravidade (mGal)",
+        help_text="Gravidade no destino menos gravidade na origem"
+    )
+    incerteza = models.DecimalField(
+        max_digits=8,
+        decimal_places=5,
+        verbose_name="Incerteza (mGal)",
+        help_text="Sem valor, usa a combinação das incertezas das estações",
+        null=True,
+        blank=True
+    )
+    data_medicao = models.DateField(verbose_name="Data da Medição", null=True, blank=True)
+    instrumento = models.CharField(max_length=100, verbose_name="Instrumento", null=True, blank=True)
+    ativo = models.BooleanField(default=True)
+
+    class Meta:
+        verbose_name = "Ligação Gravimétrica"
+        verbose_name_plural = "Ligações Gravimétricas"
+        ordering = ['estacao_origem', 'estacao_destino']
+
+    def __str__(self):
+        return f"{self.estacao_origem.codigo_estacao} → {self.estacao_destino.codigo_estacao}"
+
+
+class Match(models.Lookup):
+    """Operador MATCH do SQLite FTS5 (``campo__match='termo'``)"""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class IndiceBuscaEstacao(models.Model):
+    """
+    Tabela virtual FTS5 (tokenizador trigram) sobre nome, código e operador
+    das estações, mantida por triggers (migração 0012). Só existe no SQLite.
+    """
+
+    estacao = models.OneToOneField(
+        MedicaoGravimetrica,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='indice_busca',
+    )
+    # Coluna oculta com o nome da tabela: MATCH nela busca em todas as colunas
+    documento = models.TextField(db_column='medicoes_busca')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'medicoes_busca'
+
+
+IndiceBuscaEstacao._meta.get_field('documento').register_lookup(Match)
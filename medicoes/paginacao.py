@@ -0,0 +1,112 @@
+"""Paginação da listagem de medições
+
+Dois modos, escolhidos por ``settings.LISTA_PAGINACAO``:
+
+* ``offset`` (padrão): o Paginator do Django, com a contagem guardada em cache;
+* ``cursor`` (opcional): paginação por chave (keyset) sobre (data_medicao, id), sem
+  OFFSET e sem COUNT(*) a cada requisição. O cursor codifica a última (ou
+  primeira) linha exibida e a página seguinte começa estritamente depois dela.
+"""
+
+import base64
+from datetime import date
+
+from django.core.paginator import Paginator
+from django.db import models
+from django.utils.functional import cached_property
+
+from .cache_dados import em_cache
+
+CONTAGEM_CACHE_SEGUNDOS = 60
+ORDEM_CURSOR = ('-data_medicao', '-id')
+
+
+def contagem_em_cache(queryset):
+    """COUNT(*) do queryset guardado em cache por CONTAGEM_CACHE_SEGUNDOS (ou até a próxima gravação)."""
+    sql, params = queryset.query.sql_with_params()
+    return em_cache(
+        'contagem', queryset.db, sql, params, calcular=queryset.count, timeout=CONTAGEM_CACHE_SEGUNDOS, por_banco=True
+    )
+
+
+class PaginadorContagemCache(Paginator):
+    """Paginator que reaproveita a contagem em cache entre requisições"""
+
+    @cached_property
+    def count(self):
+        return contagem_em_cache(self.object_list)
+
+
+def codificar_cursor(medicao):
+    bruto = f'{medicao.data_medicao.isoformat()}|{medicao.pk}'
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devolve (data_medicao, id) ou None para cursores inválidos."""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        data, pk = bruto.split('|')
+        return date.fromisoformat(data), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class PaginaCursor:
+    """Página da paginação por cursor, com interface próxima à do Page do Django"""
+
+    def __init__(self, object_list, has_next, has_previous, count):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.count = count
+        self.next_cursor = codificar_cursor(object_list[-1]) if has_next else None
+        self.previous_cursor = codificar_cursor(object_list[0]) if has_previous else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+def paginar_por_cursor(queryset, por_pagina, apos=None, antes=None):
+    """
+    Página de ``por_pagina`` medições em ordem (-data_medicao, -id).
+
+    ``apos`` avança a partir do cursor (páginas mais antigas) e ``antes``
+    volta (mais recentes). Sem cursor válido devolve a primeira página.
+    """
+    chave_apos = decodificar_cursor(apos) if apos else None
+    chave_antes = decodificar_cursor(antes) if antes and not chave_apos else None
+
+    if chave_antes:
+        data, pk = chave_antes
+        linhas = list(
+            queryset.filter(data_medicao__gte=data)
+            .filter(models.Q(data_medicao__gt=data) | models.Q(pk__gt=pk))
+            .order_by('data_medicao', 'id')[:por_pagina + 1]
+        )
+        if len(linhas) > por_pagina:
+            return PaginaCursor(linhas[:por_pagina][::-1], True, True, contagem_em_cache(queryset.order_by()))
+        # Voltou até o início: devolve a primeira página completa
+
+    pagina = queryset.order_by(*ORDEM_CURSOR)
+    if chave_apos:
+        data, pk = chave_apos
+        # O termo redundante data_medicao <= data deixa o banco começar a varredura no cursor
+        pagina = pagina.filter(data_medicao__lte=data).filter(models.Q(data_medicao__lt=data) | models.Q(pk__lt=pk))
+    linhas = list(pagina[:por_pagina + 1])
+    has_next = len(linhas) > por_pagina
+    has_previous = chave_apos is not None and bool(linhas)
+
+    return PaginaCursor(linhas[:por_pagina], has_next, has_previous, contagem_em_cache(queryset.order_by()))
@@ -0,0 +1,262 @@
+"""Cadastro em lote de usuários de instituições parceiras, com convite por email
+
+Lê um CSV (colunas de ``COLUNAS``; só ``email`` é obrigatória), valida tudo
+antes de gravar e cria os usuários de uma vez: os usernames do lote inteiro
+são alocados com uma consulta por bloco de ``BLOCO`` prefixos, e usuários e
+áreas entram com ``bulk_create``. Cada novo usuário recebe, pela fila de
+emails, um convite com link para definir a senha (``TokenConvite``, válido
+por CONVITE_DIAS); até lá a conta tem senha inutilizável.
+
+Emails já cadastrados (sem diferenciar maiúsculas), inclusive os de
+pré-cadastros ainda não ativados, são ignorados e listados no resultado, para
+que o mesmo arquivo possa ser reenviado depois de corrigir as linhas com erro.
+"""
+
+import csv
+import io
+import re
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.encoding import force_bytes
+from django.utils.http import base36_to_int, urlsafe_base64_encode
+
+from . import cache_dados, fila_email
+from .models import AreaOfExpertise, CustomUser, PendingRegistration
+
+COLUNAS = ('email', 'first_name', 'last_name', 'role_category', 'user_type', 'areas', 'phone', 'organization')
+# Prefixos de username por consulta (cada um vira um LIKE no OR)
+BLOCO = 300
+ASSUNTO_CONVITE = 'Convite para o Gravimeasure'
+
+
+class TokenConvite(PasswordResetTokenGenerator):
+    """Token do link de convite; deixa de valer quando a senha é definida"""
+
+    key_salt = 'medicoes.provisionamento.TokenConvite'
+
+    def check_token(self, user, token):
+        if not (user and token):
+            return False
+        try:
+            ts = base36_to_int(token.split('-')[0])
+        except ValueError:
+            return False
+        if not any(
+            constant_time_compare(self._make_token_with_timestamp(user, ts, segredo), token)
+            for segredo in (self.secret, *self.secret_fallbacks)
+        ):
+            return False
+        return self._num_seconds(self._now()) - ts <= settings.CONVITE_DIAS * 86400
+
+
+token_convite = TokenConvite()
+
+
+def _opcoes(choices):
+    """Aceita a chave ou o rótulo (sem diferenciar maiúsculas)"""
+    opcoes = {}
+    for chave, rotulo in choices:
+        opcoes[chave.lower()] = chave
+        opcoes[rotulo.lower()] = chave
+    return opcoes
+
+
+def ler_csv(arquivo):
+    """
+    Valida o CSV e devolve ``(linhas, erros)``.
+
+    ``arquivo`` pode ser texto ou bytes (UTF-8, com ou sem BOM; vírgula ou
+    ponto e vírgula). ``linhas`` são dicionários prontos para ``provisionar``
+    e ``erros`` uma lista de ``(número da linha, mensagem)``.
+    """
+    conteudo = arquivo.read()
+    if isinstance(conteudo, bytes):
+        conteudo = conteudo.decode('utf-8-sig')
+    try:
+        dialeto = csv.Sniffer().sniff(conteudo[:4096], delimiters=',;')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(io.StringIO(conteudo), dialect=dialeto)
+    cabecalho = [c.strip().lower() for c in leitor.fieldnames or []]
+    if 'email' not in cabecalho:
+        return [], [(1, 'Coluna "email" ausente no cabeçalho')]
+    leitor.fieldnames = cabecalho
+
+    papeis = _opcoes(CustomUser.ROLE_CATEGORY_CHOICES)
+    tipos = _opcoes(CustomUser.USER_TYPE_CHOICES)
+    areas = {}
+    for pk, chave, rotulo in AreaOfExpertise.objects.values_list('pk', 'key', 'label'):
+        areas[chave.lower()] = pk
+        areas[rotulo.lower()] = pk
+
+    linhas, erros, vistos = [], [], set()
+    for numero, registro in enumerate(leitor, start=2):
+        registro = {coluna: (registro.get(coluna) or '').strip() for coluna in COLUNAS}
+        if not any(registro.values()):
+            continue
+        problemas = []
+
+        email = CustomUser.objects.normalize_email(registro['email'])
+        try:
+            validate_email(email)
+        except ValidationError:
+            problemas.append(f'email inválido "{registro["email"]}"')
+        if email.lower() in vistos:
+            problemas.append(f'email repetido no arquivo "{email}"')
+        vistos.add(email.lower())
+
+        papel = papeis.get(registro['role_category'].lower() or 'professional')
+        if papel is None:
+            problemas.append(f'categoria desconhecida "{registro["role_category"]}"')
+        tipo = tipos.get(registro['user_type'].lower() or 'viewer')
+        if tipo is None:
+            problemas.append(f'tipo de usuário desconhecido "{registro["user_type"]}"')
+
+        nomes_areas = [a.strip() for a in re.split(r'[;|]', registro['areas']) if a.strip()]
+        desconhecidas = [a for a in nomes_areas if a.lower() not in areas]
+        if desconhecidas:
+            problemas.append('áreas desconhecidas: ' + ', '.join(desconhecidas))
+
+        if problemas:
+            erros.extend((numero, p) for p in problemas)
+            continue
+        linhas.append({
+            'email': email,
+            'first_name': registro['first_name'][:150],
+            'last_name': registro['last_name'][:150],
+            'role_category': papel,
+            'user_type': tipo,
+            'areas': sorted({areas[a.lower()] for a in nomes_areas}),
+            'phone': registro['phone'][:20] or None,
+            'organization': registro['organization'][:200] or None,
+        })
+    return linhas, erros
+
+
+def _base_username(email):
+    base = re.sub(r'[^\w.@+-]', '', email.split('@')[0]) or 'usuario'
+    # Sobra espaço para o sufixo numérico dentro dos 150 caracteres
+    return base[:140]
+
+
+def alocar_usernames(emails):
+    """
+    Usernames livres para ``emails``, na mesma regra do cadastro (parte antes do @, depois base1, base2...).
+
+    Lê de uma vez os usernames que começam com cada base e resolve as colisões
+    (com o banco e dentro do lote) em memória.
+    """
+    bases = [_base_username(email) for email in emails]
+    ocupados = set()
+    unicas = sorted(set(bases))
+    for inicio in range(0, len(unicas), BLOCO):
+        filtro = Q()
+        for base in unicas[inicio:inicio + BLOCO]:
+            filtro |= Q(username__startswith=base)
+        ocupados.update(CustomUser.objects.filter(filtro).values_list('username', flat=True))
+
+    usernames = []
+    for base in bases:
+        username, contador = base, 1
+        while username in ocupados:
+            username = f'{base}{contador}'
+            contador += 1
+        ocupados.add(username)
+        usernames.append(username)
+    return usernames
+
+
+def _existentes(emails):
+    """Emails (em minúsculas) que já têm conta ou pré-cadastro aguardando ativação"""
+    minusculos = sorted({email.lower() for email in emails})
+    existentes = set()
+    for modelo in (CustomUser, PendingRegistration):
+        comparavel = modelo.objects.annotate(email_minusculo=Lower('email'))
+        for inicio in range(0, len(minusculos), 900):
+            existentes.update(
+                comparavel.filter(email_minusculo__in=minusculos[inicio:inicio + 900])
+                .values_list('email_minusculo', flat=True)
+            )
+    return existentes
+
+
+def link_convite(usuario, base_url):
+    uid = urlsafe_base64_encode(force_bytes(usuario.pk))
+    caminho = reverse('medicoes:aceitar_convite', kwargs={'uidb64': uid, 'token': token_convite.make_token(usuario)})
+    return base_url.rstrip('/') + caminho
+
+
+def _convite(usuario, base_url):
+    html = render_to_string('medicoes/convite_email.html', {
+        'user': usuario,
+        'invite_link': link_convite(usuario, base_url),
+        'dias': settings.CONVITE_DIAS,
+    })
+    return ASSUNTO_CONVITE, fila_email.texto_simples(html), [usuario.email], html
+
+
+def provisionar(linhas, base_url, convidar=True, lote=500):
+    """
+    Cria os usuários de ``linhas`` (saída de ``ler_csv``) e enfileira os convites.
+
+    Retorna um dicionário com ``criados`` (lista de usuários), ``existentes``
+    (emails ignorados) e ``convites`` (emails enfileirados). Tudo numa
+    transação: se um INSERT falhar, nada fica gravado.
+    """
+    existentes = _existentes([linha['email'] for linha in linhas])
+    novas = [linha for linha in linhas if linha['email'].lower() not in existentes]
+    ignoradas = [linha['email'] for linha in linhas if linha['email'].lower() in existentes]
+    usernames = alocar_usernames([linha['email'] for linha in novas])
+
+    usuarios = [
+        CustomUser(
+            username=username,
+            email=linha['email'],
+            first_name=linha['first_name'],
+            last_name=linha['last_name'],
+            role_category=linha['role_category'],
+            user_type=linha['user_type'],
+            phone=linha['phone'],
+            organization=linha['organization'],
+            # Sem hash de verdade: a senha é definida no link do convite
+            password=make_password(None),
+            is_active=True,
+        )
+        for username, linha in zip(usernames, novas)
+    ]
+
+    with transaction.atomic():
+        CustomUser.objects.bulk_create(usuarios, batch_size=lote)
+        if any(u.pk is None for u in usuarios):
+            # Bancos sem RETURNING no INSERT em lote
+            pks = dict(CustomUser.objects.filter(username__in=usernames).values_list('username', 'pk'))
+            for usuario in usuarios:
+                usuario.pk = pks[usuario.username]
+
+        Ligacao = CustomUser.areas.through
+        Ligacao.objects.bulk_create(
+            [
+                Ligacao(customuser_id=usuario.pk, areaofexpertise_id=area)
+                for usuario, linha in zip(usuarios, novas)
+                for area in linha['areas']
+            ],
+            batch_size=lote,
+        )
+
+        convites = 0
+        if convidar:
+            convites = fila_email.enfileirar_lote((_convite(u, base_url) for u in usuarios), tamanho=lote)
+        # bulk_create não dispara os signals que invalidam o cache de usuários
+        cache_dados.invalidar(cache_dados.USUARIOS)
+
+    return {'criados': usuarios, 'existentes': sorted(ignoradas), 'convites': convites}
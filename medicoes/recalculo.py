@@ -0,0 +1,141 @@
+"""Recálculo em lote das anomalias de Bouguer armazenadas"""
+
+import time
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import anomalias, cache_dados
+from .models import MedicaoGravimetrica, ObservacaoGravimetrica
+
+TAMANHO_LOTE_PADRAO = 2000
+
+
+def recalcular_anomalias(queryset=None, formula=None, densidade=None, batch_size=TAMANHO_LOTE_PADRAO):
+    """
+    Recalcula ``anomalia_bouguer`` das estações do queryset em lotes.
+
+    Os lotes são lidos por chave primária (sem OFFSET), calculados de uma vez
+    pelo motor vetorizado e gravados com um UPDATE parametrizado via
+    ``executemany`` (o ``bulk_update`` do ORM monta um CASE por linha e fica
+    ordens de grandeza mais lento); linhas cujo valor não muda não são
+    regravadas. Com ``densidade`` informada, ela substitui a densidade de
+    referência das estações. Estações sem altitude, latitude ou gravidade
+    mantêm o valor atual.
+
+    As observações das estações do lote são recalculadas na mesma transação,
+    com a mesma fórmula e densidade: a estação espelha a observação mais
+    recente, e ``atualizar_ultima_observacao`` regravaria o valor antigo.
+
+    Retorna um dicionário com total processado, atualizadas, ignoradas,
+    tempo decorrido e taxa (estações/s).
+    """
+    if queryset is None:
+        queryset = MedicaoGravimetrica.objects.all()
+    formula = formula or settings.GRAVIDADE_NORMAL_FORMULA
+    if formula not in dict(anomalias.FORMULA_CHOICES):
+        raise ValueError(f"Fórmula de gravidade normal inválida: {formula}")
+
+    campos = ['anomalia_bouguer', 'data_atualizacao']
+    if densidade is not None:
+        campos.append('densidade_referencia')
+    atualizar_lote = atualizacao_em_lote(campos)
+    atualizar_observacoes = atualizacao_em_lote(['anomalia_bouguer'], modelo=ObservacaoGravimetrica)
+    alias = router.db_for_write(MedicaoGravimetrica)
+
+    linhas = queryset.order_by('pk').values_list(
+        'pk', 'latitude', 'altitude', 'valor_gravidade', 'densidade_referencia', 'anomalia_bouguer'
+    )
+
+    inicio = time.perf_counter()
+    total = atualizadas = ignoradas = 0
+    ultimo_pk = None
+
+    while True:
+        lote = linhas if ultimo_pk is None else linhas.filter(pk__gt=ultimo_pk)
+        lote = list(lote[:batch_size])
+        if not lote:
+            break
+        ultimo_pk = lote[-1][0]
+        total += len(lote)
+
+        pks, lats, alts, gravs, densidades, atuais = zip(*lote)
+        novos = anomalias.anomalias_bouguer(
+            lats, alts, gravs, densidades if densidade is None else densidade, formula
+        )
+
+        agora = timezone.now()
+        alterados = []
+        for pk, novo, atual, dens in zip(pks, novos, atuais, densidades):
+            if novo is None:
+                ignoradas += 1
+                continue
+            if novo == atual and (densidade is None or dens == densidade):
+                continue
+            linha = (novo, agora) if densidade is None else (novo, agora, densidade)
+            alterados.append(linha + (pk,))
+
+        observacoes = _observacoes_recalculadas(lote, formula, densidade)
+        with transaction.atomic(using=alias):
+            if alterados:
+                atualizar_lote(alterados)
+                atualizadas += len(alterados)
+            if observacoes:
+                atualizar_observacoes(observacoes)
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'formula': formula,
+        'total': total,
+        'atualizadas': atualizadas,
+        'ignoradas': ignoradas,
+        'segundos': segundos,
+        'por_segundo': total / segundos if segundos > 0 else 0.0,
+    }
+
+
+def _observacoes_recalculadas(lote, formula, densidade):
+    """Tuplas ``(anomalia, pk)`` das observações do lote cujo valor muda"""
+    estacoes = {pk: (lat, dens if densidade is None else densidade) for pk, lat, _, _, dens, _ in lote}
+    linhas = list(
+        ObservacaoGravimetrica.objects.filter(estacao_id__in=estacoes)
+        .values_list('pk', 'estacao_id', 'altitude', 'valor_gravidade', 'anomalia_bouguer')
+    )
+    if not linhas:
+        return []
+    pks, ids_estacao, alts, gravs, atuais = zip(*linhas)
+    novos = anomalias.anomalias_bouguer(
+        [estacoes[e][0] for e in ids_estacao], alts, gravs, [estacoes[e][1] for e in ids_estacao], formula
+    )
+    return [(novo, pk) for pk, novo, atual in zip(pks, novos, atuais) if novo is not None and novo != atual]
+
+
+def atualizacao_em_lote(campos, alias=None, modelo=MedicaoGravimetrica):
+    """
+    Monta a função que grava em ``modelo`` um lote de tuplas
+    ``(valor_campo1, ..., valor_campoN, pk)`` numa única transação.
+
+    Não passa pelos signals, então invalida o cache das estações por conta própria.
+    """
+    alias = alias or router.db_for_write(modelo)
+    connection = connections[alias]
+    opts = modelo._meta
+    fields = [opts.get_field(nome) for nome in campos]
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(opts.db_table),
+        ', '.join(f'{quote(f.column)} = %s' for f in fields),
+        quote(opts.pk.column),
+    )
+
+    def atualizar(linhas):
+        params = [
+            [f.get_db_prep_save(valor, connection) for f, valor in zip(fields, linha)] + [linha[-1]]
+            for linha in linhas
+        ]
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+            cache_dados.invalidar()
+
+    return atualizar
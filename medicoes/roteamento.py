@@ -0,0 +1,87 @@
+"""Roteamento de leituras para a réplica do banco
+
+Só o tráfego marcado explicitamente vai para a réplica (alias
+``ALIAS_REPLICA``): views decoradas com ``leitura_replica`` (relatórios,
+PDFs, API do mapa) e trechos de comandos dentro de ``leitura_na_replica()``.
+Todo o resto, inclusive qualquer escrita, fica no banco principal.
+
+Para o usuário que acabou de gravar não ver dados atrasados da réplica, o
+``AderenciaPrimarioMiddleware`` marca com um cookie, por
+``settings.REPLICA_ADERENCIA_SEGUNDOS``, o navegador que fez uma requisição
+de escrita; enquanto o cookie existir, as views de leitura usam o principal.
+"""
+
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+ALIAS_REPLICA = 'replica'
+COOKIE_ADERENCIA = 'gm_primario'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_usar_replica = contextvars.ContextVar('usar_replica', default=False)
+
+
+def replica_configurada():
+    return ALIAS_REPLICA in settings.DATABASES
+
+
+def lendo_da_replica():
+    """Se as leituras feitas agora vão para a réplica"""
+    return _usar_replica.get() and replica_configurada()
+
+
+@contextmanager
+def leitura_na_replica(ativa=True):
+    """Envia para a réplica as leituras feitas dentro do bloco"""
+    token = _usar_replica.set(ativa)
+    try:
+        yield
+    finally:
+        _usar_replica.reset(token)
+
+
+def leitura_replica(view):
+    """Decorator de views só de leitura, exceto para navegadores com gravação recente"""
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        with leitura_na_replica(COOKIE_ADERENCIA not in request.COOKIES):
+            return view(request, *args, **kwargs)
+    return _view
+
+
+class RoteadorReplica:
+    """Router de banco: leituras marcadas vão para a réplica, escritas sempre para o principal"""
+
+    def db_for_read(self, model, **hints):
+        if lendo_da_replica():
+            return ALIAS_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # A réplica tem os mesmos dados do principal
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # O esquema chega à réplica pela replicação, nunca por migrate
+        return db != ALIAS_REPLICA
+
+
+class AderenciaPrimarioMiddleware:
+    """Marca quem fez uma requisição de escrita para ler do principal por alguns segundos"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        segundos = settings.REPLICA_ADERENCIA_SEGUNDOS
+        if request.method not in METODOS_SEGUROS and segundos > 0:
+            response.set_cookie(COOKIE_ADERENCIA, '1', max_age=segundos, httponly=True, samesite='Strict')
+        return response
@@ -0,0 +1,350 @@
+"""Correção de terreno a partir de um Modelo Digital de Elevação (MDE) local
+
+O MDE (ESRI ASCII grid ou GeoTIFF) é acessado por memory map, de modo
+que apenas a janela em torno das estações é lida do disco (o ASCII grid
+passa antes por uma cópia binária em PASTA_CACHE_MDE). A correção é
+dividida em duas zonas:
+
+- zona interna: soma exata de prismas retangulares (Nagy/Plouff) das células
+  vizinhas de cada estação, calculada para todas as estações de uma vez;
+- zona externa: aproximação linear (Sideris, 1985)
+  c = Gρ/2 ∬ (h - hp)² / r³ dA, expandida em três convoluções
+  (h², h e 1 contra o núcleo 1/r³) resolvidas por FFT, bloco a bloco da
+  grade, cada bloco com o espaçamento leste-oeste da sua latitude.
+
+O MDE deve estar em coordenadas geográficas (graus, WGS84/SIRGAS2000) com
+alturas em metros.
+"""
+
+import hashlib
+import math
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+G = 6.674e-11  # Constante gravitacional (m³ kg⁻¹ s⁻²)
+SI_PARA_MGAL = 1e5
+METROS_POR_GRAU_LAT = 110574.0
+METROS_POR_GRAU_LON = 111320.0
+
+# .npy gerados a partir de MDEs em texto (nunca ao lado do arquivo original)
+PASTA_CACHE_MDE = Path(tempfile.gettempdir()) / 'gravimeasure-mde'
+
+RAIO_INTERNO_PADRAO = 1000.0   # m
+RAIO_EXTERNO_PADRAO = 20000.0  # m
+ESTACOES_POR_BLOCO = 1000
+# Blocos da grade processados um de cada vez: células por lado e altura máxima em graus
+BLOCO_GRADE = 1024
+FAIXA_LATITUDE = 0.25
+
+
+class ModeloDigitalElevacao:
+    """Grade regular de alturas com a borda superior esquerda em (x0, y0)."""
+
+    def __init__(self, dados, x0, y0, dx, dy, nodata=None):
+        self.dados = dados
+        self.x0 = float(x0)
+        self.y0 = float(y0)
+        self.dx = float(dx)
+        self.dy = float(dy)
+        self.nodata = nodata
+
+    @property
+    def shape(self):
+        return self.dados.shape
+
+    def indices(self, longitude, latitude):
+        """Linha e coluna (fracionárias, centro da célula = inteiro) das coordenadas."""
+        linhas = (self.y0 - np.asarray(latitude, dtype=np.float64)) / self.dy - 0.5
+        colunas = (np.asarray(longitude, dtype=np.float64) - self.x0) / self.dx - 0.5
+        return linhas, colunas
+
+    def janela(self, l0, l1, c0, c1):
+        """Lê do disco apenas a janela [l0:l1, c0:c1], com NODATA convertido em NaN."""
+        bloco = np.array(self.dados[l0:l1, c0:c1], dtype=np.float64)
+        if self.nodata is not None:
+            bloco[bloco == self.nodata] = np.nan
+        return bloco
+
+
+# ============================================================================
+# Leitura do MDE
+# ============================================================================
+
+def carregar_mde(caminho):
+    """Abre um MDE ESRI ASCII grid (.asc) ou GeoTIFF (.tif/.tiff) por memory map."""
+    caminho = Path(caminho)
+    sufixo = caminho.suffix.lower()
+    if sufixo == '.asc':
+        return _carregar_ascii_grid(caminho)
+    if sufixo in ('.tif', '.tiff'):
+        return _carregar_geotiff(caminho)
+    raise ValueError(f'Formato de MDE não suportado: {caminho.name} (use .asc ou .tif)')
+
+
+def _arquivo_cache(caminho):
+    """Caminho do .npy de um MDE em texto, pelo caminho absoluto, data de modificação e tamanho"""
+    info = caminho.stat()
+    chave = hashlib.sha1(str(caminho.resolve()).encode()).hexdigest()[:16]
+    return PASTA_CACHE_MDE / f'{chave}-{info.st_mtime_ns}-{info.st_size}.npy'
+
+
+def _gravar_cache(cache, dados):
+    """Grava o .npy e o devolve por memory map; sem permissão de escrita, segue com o array em memória"""
+    try:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        # Versões anteriores do mesmo arquivo
+        for antigo in cache.parent.glob(cache.name.split('-', 1)[0] + '-*.npy'):
+            antigo.unlink(missing_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache.parent, suffix='.tmp', delete=False) as arquivo:
+            np.save(arquivo, dados)
+        # Troca atômica: outro processo nunca lê um .npy pela metade
+        os.replace(arquivo.name, cache)
+    except OSError:
+        return dados
+    return np.load(cache, mmap_mode='r')
+
+
+def _carregar_ascii_grid(caminho):
+    cabecalho = {}
+    with open(caminho, 'r', encoding='ascii') as f:
+        for _ in range(6):
+            posicao = f.tell()
+            partes = f.readline().split()
+            if len(partes) != 2 or not partes[0][0].isalpha():
+                f.seek(posicao)
+                break
+            cabecalho[partes[0].lower()] = float(partes[1])
+
+    ncols, nrows = int(cabecalho['ncols']), int(cabecalho['nrows'])
+    tamanho = cabecalho['cellsize']
+    if 'xllcenter' in cabecalho:
+        xll, yll = cabecalho['xllcenter'] - tamanho / 2, cabecalho['yllcenter'] - tamanho / 2
+    else:
+        xll, yll = cabecalho['xllcorner'], cabecalho['yllcorner']
+
+    # O texto é convertido uma única vez para um .npy binário na pasta de
+    # cache; as leituras seguintes usam memory map sobre ele.
+    cache = _arquivo_cache(caminho)
+    if cache.exists():
+        dados = np.load(cache, mmap_mode='r')
+    else:
+        dados = np.loadtxt(caminho, skiprows=len(cabecalho), dtype=np.float32, ndmin=2)
+        if dados.shape != (nrows, ncols):
+            raise ValueError(f'MDE {caminho.name}: esperado {nrows}x{ncols}, lido {dados.shape[0]}x{dados.shape[1]}')
+        dados = _gravar_cache(cache, dados)
+
+    return ModeloDigitalElevacao(
+        dados,
+        x0=xll,
+        y0=yll + nrows * tamanho,
+        dx=tamanho,
+        dy=tamanho,
+        nodata=cabecalho.get('nodata_value'),
+    )
+
+
+def _carregar_geotiff(caminho):
+    try:
+        import tifffile
+    except ImportError:
+        raise ImportError('Leitura de GeoTIFF requer o pacote tifffile: pip install tifffile')
+
+    with tifffile.TiffFile(caminho) as tif:
+        pagina = tif.pages[0]
+        escala = pagina.tags['ModelPixelScaleTag'].value
+        tiepoint = pagina.tags['ModelTiepointTag'].value
+        nodata_tag = pagina.tags.get('GDAL_NODATA')
+        nodata = float(nodata_tag.value.strip('\x00')) if nodata_tag else None
+
+    try:
+        dados = tifffile.memmap(caminho, mode='r')
+    except ValueError:
+        # TIFF comprimido ou em blocos não pode ser mapeado diretamente
+        dados = tifffile.imread(caminho)
+
+    i, j, _, x, y, _ = tiepoint[:6]
+    return ModeloDigitalElevacao(
+        dados,
+        x0=x - i * escala[0],
+        y0=y + j * escala[1],
+        dx=escala[0],
+        dy=escala[1],
+        nodata=nodata,
+    )
+
+
+# ============================================================================
+# Cálculo
+# ============================================================================
+
+def atracao_prismas(x1, x2, y1, y2, z1, z2):
+    """
+    Atração vertical de prismas retangulares por unidade de Gρ (em metros).
+
+    As coordenadas são relativas à estação; arrays de mesmo formato são
+    avaliados elemento a elemento. Retorna o módulo, pois na correção de
+    terreno tanto massa acima quanto déficit abaixo contribuem positivamente.
+    """
+    total = 0.0
+    for x, sx in ((x1, -1), (x2, 1)):
+        for y, sy in ((y1, -1), (y2, 1)):
+            for z, sz in ((z1, -1), (z2, 1)):
+                r = np.sqrt(x * x + y * y + z * z)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    termo_z = np.where(z == 0, 0.0, z * np.arctan(x * y / (z * r)))
+                    termo_x = np.where(x == 0, 0.0, x * np.log(np.maximum(y + r, 1e-300)))
+                    termo_y = np.where(y == 0, 0.0, y * np.log(np.maximum(x + r, 1e-300)))
+                total = total + sx * sy * sz * (termo_z - termo_x - termo_y)
+    return np.abs(total)
+
+
+def calcular_correcao_terreno(
+    mde,
+    longitudes,
+    latitudes,
+    altitudes=None,
+    densidade=2.67,
+    raio_interno=RAIO_INTERNO_PADRAO,
+    raio_externo=RAIO_EXTERNO_PADRAO,
+):
+    """
+    Correção de terreno (mGal) para todas as estações em uma única passada.
+
+    A grade é dividida em blocos de até BLOCO_GRADE células (e até
+    FAIXA_LATITUDE graus de altura); só os blocos com estações são lidos,
+    cada um com margem do raio externo (overlap-save) e com o espaçamento
+    leste-oeste da latitude do seu centro.
+
+    Estações sem altitude (NaN) usam a altura do MDE na célula correspondente.
+    Estações fora do MDE recebem NaN.
+    """
+    lon = np.asarray(longitudes, dtype=np.float64)
+    lat = np.asarray(latitudes, dtype=np.float64)
+    resultado = np.full(lon.shape, np.nan)
+    if lon.size == 0:
+        return resultado
+
+    linhas_f, colunas_f = mde.indices(lon, lat)
+    nlin, ncol = mde.shape
+    dentro = (linhas_f > -0.5) & (linhas_f < nlin - 0.5) & (colunas_f > -0.5) & (colunas_f < ncol - 0.5)
+    if not dentro.any():
+        return resultado
+
+    linhas_f, colunas_f = linhas_f[dentro], colunas_f[dentro]
+    alt = np.full(linhas_f.shape, np.nan)
+    if altitudes is not None:
+        alt = np.asarray(altitudes, dtype=np.float64)[dentro]
+    rho = np.asarray(densidade, dtype=np.float64) * 1000.0
+    if rho.ndim:
+        rho = rho[dentro]
+
+    # Blocos da grade: estações agrupadas pelo bloco da célula em que caem
+    altura_bloco = max(1, min(BLOCO_GRADE, int(FAIXA_LATITUDE / mde.dy)))
+    bloco_l = np.rint(linhas_f).astype(int) // altura_bloco
+    bloco_c = np.rint(colunas_f).astype(int) // BLOCO_GRADE
+    chaves = bloco_l * (ncol // BLOCO_GRADE + 1) + bloco_c
+    ordem = np.argsort(chaves, kind='stable')
+    grupos = np.split(ordem, np.flatnonzero(np.diff(chaves[ordem])) + 1)
+
+    atracao = np.empty(linhas_f.shape)
+    for grupo in grupos:
+        l0 = bloco_l[grupo[0]] * altura_bloco
+        c0 = bloco_c[grupo[0]] * BLOCO_GRADE
+        atracao[grupo] = _correcao_bloco(
+            mde, l0, min(l0 + altura_bloco, nlin), c0, min(c0 + BLOCO_GRADE, ncol),
+            linhas_f[grupo], colunas_f[grupo], alt[grupo], raio_interno, raio_externo,
+        )
+
+    resultado[dentro] = G * rho * atracao * SI_PARA_MGAL
+    return resultado
+
+
+def _janela_com_margem(mde, l0, l1, c0, c1):
+    """Alturas de [l0:l1, c0:c1] (índices podem sair da grade) e máscara das células válidas."""
+    nlin, ncol = mde.shape
+    alturas = np.full((l1 - l0, c1 - c0), np.nan)
+    a0, a1, b0, b1 = max(l0, 0), min(l1, nlin), max(c0, 0), min(c1, ncol)
+    alturas[a0 - l0:a1 - l0, b0 - c0:b1 - c0] = mde.janela(a0, a1, b0, b1)
+    validas = np.isfinite(alturas)
+    return np.where(validas, alturas, 0.0), validas
+
+
+def _correcao_bloco(mde, l0, l1, c0, c1, linhas_f, colunas_f, alt, raio_interno, raio_externo):
+    """Atração (por Gρ) das estações do bloco [l0:l1, c0:c1] da grade."""
+    # Espaçamento métrico da grade na latitude do centro do bloco
+    latitude = mde.y0 - 0.5 * (l0 + l1) * mde.dy
+    dx = mde.dx * METROS_POR_GRAU_LON * math.cos(math.radians(latitude))
+    dy = mde.dy * METROS_POR_GRAU_LAT
+
+    ni, nj = int(math.ceil(raio_interno / dy)), int(math.ceil(raio_interno / dx))
+    no, nk = int(math.ceil(raio_externo / dy)), int(math.ceil(raio_externo / dx))
+
+    alturas, validas = _janela_com_margem(mde, l0 - no, l1 + no, c0 - nk, c1 + nk)
+    linhas_rel, colunas_rel = linhas_f - (l0 - no), colunas_f - (c0 - nk)
+    linhas, colunas = np.rint(linhas_rel).astype(int), np.rint(colunas_rel).astype(int)
+
+    hp = np.where(np.isfinite(alt), alt, alturas[linhas, colunas])
+
+    externa = _zona_externa(alturas, validas, linhas - no, colunas - nk, hp, dx, dy, ni, nj, no, nk, raio_externo)
+
+    # Zona interna em blocos de estações para limitar a memória (estações x vizinhos)
+    interna = np.empty_like(hp)
+    for i in range(0, hp.size, ESTACOES_POR_BLOCO):
+        bloco = slice(i, i + ESTACOES_POR_BLOCO)
+        interna[bloco] = _zona_interna(
+            alturas, validas, linhas[bloco], colunas[bloco],
+            linhas_rel[bloco], colunas_rel[bloco], hp[bloco], dx, dy, ni, nj,
+        )
+    return interna + externa
+
+
+def _zona_externa(alturas, validas, linhas, colunas, hp, dx, dy, ni, nj, no, nk, raio_externo):
+    a = np.arange(-no, no + 1)[:, None] * dy
+    b = np.arange(-nk, nk + 1)[None, :] * dx
+    r = np.sqrt(a * a + b * b)
+
+    with np.errstate(divide='ignore'):
+        nucleo = dx * dy / r ** 3
+    nucleo[no - ni:no + ni + 1, nk - nj:nk + nj + 1] = 0.0  # coberto pela zona interna
+    nucleo[r > raio_externo] = 0.0
+
+    # As três convoluções numa chamada (a FFT do núcleo é feita uma vez); o modo
+    # 'valid' descarta a margem e devolve só as células do bloco (overlap-save)
+    peso = validas.astype(np.float64)
+    c2, c1, c0 = fftconvolve(
+        np.stack([alturas * alturas * peso, alturas * peso, peso]), nucleo[None], mode='valid', axes=(1, 2),
+    )
+
+    pontos = (linhas, colunas)
+    valor = 0.5 * (c2[pontos] - 2 * hp * c1[pontos] + hp * hp * c0[pontos])
+    return np.maximum(valor, 0.0)
+
+
+def _zona_interna(alturas, validas, linhas, colunas, linhas_f, colunas_f, hp, dx, dy, ni, nj):
+    # Vizinhança (2ni+1) x (2nj+1) de cada estação, avaliada em bloco: (estações, vizinhos)
+    da, db = np.meshgrid(np.arange(-ni, ni + 1), np.arange(-nj, nj + 1), indexing='ij')
+    da, db = da.ravel()[None, :], db.ravel()[None, :]
+    li = linhas[:, None] + da
+    cj = colunas[:, None] + db
+
+    nlin, ncol = alturas.shape
+    na_grade = (li >= 0) & (li < nlin) & (cj >= 0) & (cj < ncol)
+    li_c, cj_c = np.clip(li, 0, nlin - 1), np.clip(cj, 0, ncol - 1)
+    h = alturas[li_c, cj_c]
+    usar = na_grade & validas[li_c, cj_c]
+
+    # Posição da célula relativa à posição exata da estação (x para leste, y para norte)
+    xc = (cj - colunas_f[:, None]) * dx
+    yc = (linhas_f[:, None] - li) * dy
+    z = h - hp[:, None]
+
+    atracao = atracao_prismas(
+        xc - dx / 2, xc + dx / 2,
+        yc - dy / 2, yc + dy / 2,
+        np.minimum(z, 0.0), np.maximum(z, 0.0),
+    )
+    return np.where(usar, atracao, 0.0).sum(axis=1)
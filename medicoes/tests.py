@@ -1,13 +1,61 @@
-"""Testes para categorização de usuários"""
+"""Testes para categorização de usuários e medições gravimétricas"""
 
-from django.test import TestCase
+import json
+import math
+import os
+import subprocess
+import sys
+import unittest
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, router
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.http import HttpResponse
+from django.test import Client, LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from medicoes.models import AreaOfExpertise
+from medicoes import (
+    anomalias, autenticacao, cache_dados, carga, db_signals, espacial, fila_email, instrumentacao, limite_login, limpeza,
+    metricas, provisionamento, roteamento, terreno,
+)
+from medicoes.ajustamento import ajustar_rede_gravimetrica
+from medicoes.busca import buscar_estacoes, garantir_indice_busca, ORDEM_RELEVANCIA
+from medicoes.paginacao import paginar_por_cursor
+from medicoes.views.mapacontornoview import gerar_mapa_contorno_medicao
+from medicoes.models import (
+    AreaOfExpertise, EmailEnfileirado, LigacaoGravimetrica, LoginAttempt, MedicaoGravimetrica, ObservacaoGravimetrica,
+    PendingRegistration,
+    validar_coordenadas_brasil, validar_gravidade_range,
+)
+from medicoes.recalculo import atualizacao_em_lote, recalcular_anomalias
 from medicoes.user_categories import UserCategoryManager
 
 User = get_user_model()
 
 
+def resolve_nome(nome, *args):
+    return resolve(reverse(f'medicoes:{nome}', args=args)).func
+
+
 class AreaOfExpertiseModelTest(TestCase):
     
     def setUp(self):
@@ -210,3 +258,1794 @@ class UserCategoryManagerTest(TestCase):
         """Testar erro com papel inválido"""
         with self.assertRaises(ValueError):
             UserCategoryManager.get_users_by_role('invalid_role')
+
+
+def anomalia_bouguer_referencia(latitude, altitude, gravidade, densidade):
+    """Cálculo escalar original do modelo, usado como referência"""
+    phi = math.radians(float(latitude))
+    g_normal = Decimal('978031.8') * (
+        Decimal('1') +
+        Decimal('0.0053024') * Decimal(str(math.sin(phi)**2)) -
+        Decimal('0.0000058') * Decimal(str(math.sin(2*phi)**2))
+    )
+    h = Decimal(str(altitude))
+    anomalia = (
+        Decimal(str(gravidade)) - g_normal + Decimal('0.3086') * h
+        - Decimal('0.0419') * Decimal(str(densidade)) * h
+    )
+    return anomalia.quantize(Decimal('0.00001'), rounding=ROUND_HALF_UP)
+
+
+class AnomaliaEngineTest(TestCase):
+    """Testes para o motor vetorizado de anomalias"""
+
+    def setUp(self):
+        rng = random.Random(42)
+        n = 5000
+        self.lats = [Decimal(rng.randint(-34000000, 6000000)) / Decimal(10**6) for _ in range(n)]
+        self.alts = [Decimal(rng.randint(1, 300000)) / Decimal(100) for _ in range(n)]
+        self.gravs = [Decimal(rng.randint(97700000000, 98200000000)) / Decimal(10**5) for _ in range(n)]
+
+    def test_bouguer_identico_ao_decimal(self):
+        """Testar que a quantização reproduz exatamente o cálculo Decimal"""
+        resultado = anomalias.anomalias_bouguer(self.lats, self.alts, self.gravs, Decimal('2.670'))
+        esperado = [
+            anomalia_bouguer_referencia(lat, alt, grav, Decimal('2.670'))
+            for lat, alt, grav in zip(self.lats, self.alts, self.gravs)
+        ]
+        self.assertEqual(resultado, esperado)
+
+    def test_fronteira_de_arredondamento(self):
+        """Testar que valores na fronteira de meia unidade arredondam como ROUND_HALF_UP"""
+        valores = [1.000005, -1.000005, 2.5e-6]
+        exatos = [Decimal('1.00001'), Decimal('-1.00001'), Decimal('0.00000')]
+        self.assertEqual(anomalias.quantizar(valores, lambda i: exatos[i]), exatos)
+        self.assertEqual(anomalias.quantizar([float('nan')]), [None])
+
+    def test_entradas_ausentes(self):
+        """Testar que altitude ausente ou zero não gera anomalia"""
+        resultado = anomalias.anomalias_ar_livre([-15.0, -15.0], [None, 0], [978000.0, 978000.0])
+        self.assertEqual(resultado, [None, None])
+
+    def test_wrappers_do_modelo(self):
+        """Testar que o modelo delega ao motor e salva o valor quantizado"""
+        medicao = MedicaoGravimetrica.objects.create(
+            nome_estacao='Brasília',
+            codigo_estacao='BSB-01',
+            latitude=Decimal('-15.793889'),
+            longitude=Decimal('-47.882778'),
+            altitude=Decimal('1172.00'),
+            valor_gravidade=Decimal('978035.12345'),
+            data_medicao=date(2025, 1, 10),
+        )
+        esperado = anomalia_bouguer_referencia(
+            medicao.latitude, medicao.altitude, medicao.valor_gravidade, medicao.densidade_referencia
+        )
+        self.assertEqual(medicao.anomalia_bouguer, esperado)
+        self.assertIsNone(MedicaoGravimetrica(latitude=Decimal('-15'), valor_gravidade=Decimal('978000')).calcular_anomalia_ar_livre())
+
+
+class RecalculoAnomaliasTest(TestCase):
+    """Testes para o recálculo em lote das anomalias"""
+
+    def setUp(self):
+        self.medicoes = [
+            MedicaoGravimetrica.objects.create(
+                nome_estacao=f'Estação {i}',
+                codigo_estacao=f'REC-{i:03d}',
+                latitude=Decimal('-15.5') - i,
+                longitude=Decimal('-47.5'),
+                altitude=Decimal('800.00') + i,
+                valor_gravidade=Decimal('978100.00000') + i,
+                data_medicao=date(2025, 1, 1),
+            )
+            for i in range(5)
+        ]
+
+    def test_atualiza_anomalias_desatualizadas(self):
+        """Testar que anomalias antigas são recalculadas com a nova densidade"""
+        MedicaoGravimetrica.objects.update(anomalia_bouguer=Decimal('0'))
+        stats = recalcular_anomalias(densidade=Decimal('2.200'), batch_size=2)
+
+        self.assertEqual(stats['total'], 5)
+        self.assertEqual(stats['atualizadas'], 5)
+        for medicao in MedicaoGravimetrica.objects.all():
+            self.assertEqual(medicao.densidade_referencia, Decimal('2.200'))
+            self.assertEqual(
+                medicao.anomalia_bouguer,
+                anomalia_bouguer_referencia(medicao.latitude, medicao.altitude, medicao.valor_gravidade, '2.2'),
+            )
+
+    def test_historico_acompanha_recalculo(self):
+        """Testar que o recálculo atualiza as observações e uma reocupação antiga não restaura o valor velho"""
+        estacao = self.medicoes[0]
+        antiga = estacao.anomalia_bouguer
+        recalcular_anomalias(densidade=Decimal('2.000'))
+        estacao.refresh_from_db()
+        self.assertNotEqual(estacao.anomalia_bouguer, antiga)
+        self.assertEqual(estacao.historico.get().anomalia_bouguer, estacao.anomalia_bouguer)
+
+        estacao.registrar_observacao(data_medicao=date(2020, 1, 1), valor_gravidade=Decimal('978099.00000'), altitude=Decimal('800.00'))
+        recalculada = estacao.anomalia_bouguer
+        estacao.refresh_from_db()
+        self.assertEqual((estacao.anomalia_bouguer, estacao.densidade_referencia), (recalculada, Decimal('2.000')))
+
+        # Com a observação mais recente excluída, a anterior também já está na densidade nova
+        estacao.historico.get(data_medicao=date(2025, 1, 1)).delete()
+        estacao.refresh_from_db()
+        self.assertEqual(
+            estacao.anomalia_bouguer,
+            anomalia_bouguer_referencia(estacao.latitude, Decimal('800.00'), Decimal('978099.00000'), '2.0'),
+        )
+
+    def test_formulas_de_gravidade_normal(self):
+        """Testar fórmulas GRS80/WGS84 contra valores conhecidos no equador e no polo"""
+        self.assertAlmostEqual(anomalias.gravidade_normal(0, 'grs80')[0], 978032.67715, places=4)
+        self.assertAlmostEqual(anomalias.gravidade_normal(90, 'grs80')[0], 983218.63685, places=2)
+        self.assertAlmostEqual(anomalias.gravidade_normal(0, 'wgs84')[0], 978032.53359, places=4)
+        with self.assertRaises(ValueError):
+            anomalias.gravidade_normal(0, 'invalida')
+
+    def test_comando_recompute_anomalies(self):
+        """Testar comando com filtro e troca de fórmula"""
+        out = StringIO()
+        call_command('recompute_anomalies', '--formula', 'grs80', '--codigo', 'REC-000', stdout=out)
+        self.assertIn('Atualizadas: 1', out.getvalue())
+
+        alterada, inalterada = (MedicaoGravimetrica.objects.get(pk=m.pk) for m in self.medicoes[:2])
+        self.assertNotEqual(alterada.anomalia_bouguer, self.medicoes[0].anomalia_bouguer)
+        self.assertEqual(inalterada.anomalia_bouguer, self.medicoes[1].anomalia_bouguer)
+
+
+class CorrecaoTerrenoTest(TestCase):
+    """Testes para a correção de terreno a partir do MDE"""
+
+    def setUp(self):
+        # Grade de 41x41 células de 0,001° com um morro gaussiano a nordeste da estação central
+        i, j = np.meshgrid(np.arange(41), np.arange(41), indexing='ij')
+        self.alturas = (500 + 80 * np.exp(-((i - 12) ** 2 + (j - 28) ** 2) / 30.0)).astype(np.float32)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.caminho = Path(self.tmpdir.name) / 'mde.asc'
+        with open(self.caminho, 'w') as f:
+            f.write('ncols 41\nnrows 41\nxllcorner -47.0\nyllcorner -15.041\ncellsize 0.001\nNODATA_value -9999\n')
+            np.savetxt(f, self.alturas, fmt='%.3f')
+        self.lon, self.lat = -47.0 + 0.0205, -15.0 - 0.0205
+        self.enterContext(mock.patch.object(terreno, 'PASTA_CACHE_MDE', Path(self.tmpdir.name) / 'cache'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_cache_binario_fora_da_pasta_do_mde(self):
+        """Testar que o .npy vai para a pasta de cache e que sem escrita o MDE é lido em memória"""
+        mde = terreno.carregar_mde(self.caminho)
+        self.assertFalse(self.caminho.with_suffix('.npy').exists())
+        self.assertEqual(len(list(terreno.PASTA_CACHE_MDE.glob('*.npy'))), 1)
+        self.assertIsInstance(terreno.carregar_mde(self.caminho).dados, np.memmap)
+        np.testing.assert_allclose(mde.dados, self.alturas, atol=1e-3)
+
+        # A pasta de cache não pode ser criada (o caminho passa por um arquivo)
+        with mock.patch.object(terreno, 'PASTA_CACHE_MDE', self.caminho / 'cache'):
+            mde = terreno.carregar_mde(self.caminho)
+        self.assertNotIsInstance(mde.dados, np.memmap)
+        np.testing.assert_allclose(mde.dados, self.alturas, atol=1e-3)
+
+    def test_terreno_plano_nao_gera_correcao(self):
+        """Testar que terreno plano na altura da estação tem correção nula"""
+        mde = terreno.ModeloDigitalElevacao(np.full((21, 21), 300.0), -47.0, -15.0, 0.001, 0.001)
+        resultado = terreno.calcular_correcao_terreno(mde, [-46.9895], [-15.0105], [300.0])
+        self.assertAlmostEqual(resultado[0], 0.0, places=9)
+
+    def test_fft_concorda_com_soma_de_prismas(self):
+        """Testar zona interna + externa contra a soma exata de prismas de toda a grade"""
+        mde = terreno.carregar_mde(self.caminho)
+        hp = float(self.alturas[20, 20])
+        resultado = terreno.calcular_correcao_terreno(
+            mde, [self.lon, -40.0], [self.lat, -10.0], [hp, np.nan], raio_interno=300, raio_externo=50000
+        )
+
+        dx = 0.001 * terreno.METROS_POR_GRAU_LON * math.cos(math.radians(self.lat))
+        dy = 0.001 * terreno.METROS_POR_GRAU_LAT
+        i, j = np.meshgrid(np.arange(41), np.arange(41), indexing='ij')
+        xc, yc, z = (j - 20) * dx, (20 - i) * dy, self.alturas - hp
+        exato = terreno.atracao_prismas(
+            xc - dx / 2, xc + dx / 2, yc - dy / 2, yc + dy / 2, np.minimum(z, 0), np.maximum(z, 0)
+        ).sum() * terreno.G * 2670 * terreno.SI_PARA_MGAL
+
+        self.assertGreater(exato, 0)
+        self.assertAlmostEqual(resultado[0], exato, delta=exato * 0.02)
+        self.assertTrue(np.isnan(resultado[1]))
+
+    def test_blocos_concordam_com_grade_inteira(self):
+        """Testar que a convolução em blocos com margem (overlap-save) reproduz a passada única"""
+        mde = terreno.carregar_mde(self.caminho)
+        lon = self.lon + np.array([-0.012, -0.004, 0.0, 0.006, 0.013])
+        lat = self.lat + np.array([0.011, -0.007, 0.0, 0.003, -0.014])
+        inteira = terreno.calcular_correcao_terreno(mde, lon, lat, raio_interno=300, raio_externo=5000)
+        with mock.patch.object(terreno, 'BLOCO_GRADE', 8), mock.patch.object(terreno, 'FAIXA_LATITUDE', 0.008):
+            blocos = terreno.calcular_correcao_terreno(mde, lon, lat, raio_interno=300, raio_externo=5000)
+        np.testing.assert_allclose(blocos, inteira, rtol=1e-3)
+
+    def test_espacamento_pela_latitude_de_cada_faixa(self):
+        """Testar estações em latitudes distantes, cada uma contra a soma de prismas com o seu dx"""
+        tamanho, hp = 0.05, 500.0
+        i, j = np.meshgrid(np.arange(1300), np.arange(41), indexing='ij')
+        alturas = np.full(i.shape, hp)
+        for i0 in (100, 1200):
+            alturas += 800 * np.exp(-((i - (i0 - 6)) ** 2 + (j - 26) ** 2) / 8.0)
+        mde = terreno.ModeloDigitalElevacao(alturas, -47.0, 0.0, tamanho, tamanho)
+        lon = np.array([-47.0 + 20.5 * tamanho] * 2)
+        lat = -np.array([100.5, 1200.5]) * tamanho
+        resultado = terreno.calcular_correcao_terreno(
+            mde, lon, lat, [hp, hp], raio_interno=20000, raio_externo=300000
+        )
+
+        dy = tamanho * terreno.METROS_POR_GRAU_LAT
+        for estacao, (i0, latitude) in enumerate(zip((100, 1200), lat)):
+            dx = tamanho * terreno.METROS_POR_GRAU_LON * math.cos(math.radians(latitude))
+            xc, yc, z = (j - 20) * dx, (i0 - i) * dy, alturas - hp
+            exato = terreno.atracao_prismas(
+                xc - dx / 2, xc + dx / 2, yc - dy / 2, yc + dy / 2, np.minimum(z, 0), np.maximum(z, 0)
+            ).sum() * terreno.G * 2670 * terreno.SI_PARA_MGAL
+            self.assertAlmostEqual(resultado[estacao], exato, delta=exato * 0.02)
+
+    def test_comando_terrain_correction(self):
+        """Testar que o comando grava a correção e a anomalia completa"""
+        medicao = MedicaoGravimetrica.objects.create(
+            nome_estacao='Morro',
+            codigo_estacao='TC-01',
+            latitude=Decimal(str(self.lat)),
+            longitude=Decimal(str(self.lon)),
+            altitude=Decimal(str(round(float(self.alturas[20, 20]), 2))),
+            valor_gravidade=Decimal('978100.00000'),
+            data_medicao=date(2025, 1, 1),
+        )
+        call_command('terrain_correction', '--dem', str(self.caminho), '--raio-interno', '300', stdout=StringIO())
+
+        medicao.refresh_from_db()
+        self.assertGreater(medicao.correcao_terreno, 0)
+        self.assertEqual(medicao.anomalia_bouguer_completa, medicao.anomalia_bouguer + medicao.correcao_terreno)
+
+
+class ObservacaoGravimetricaTest(TestCase):
+    """Testes para o histórico de observações por estação"""
+
+    def setUp(self):
+        self.estacao = MedicaoGravimetrica.objects.create(
+            nome_estacao='Monitoramento',
+            codigo_estacao='MON-01',
+            latitude=Decimal('-22.9'),
+            longitude=Decimal('-43.2'),
+            altitude=Decimal('10.00'),
+            valor_gravidade=Decimal('978800.00000'),
+            data_medicao=date(2024, 1, 10),
+        )
+
+    def test_primeira_observacao_criada(self):
+        """Testar que a estação nasce com sua observação inicial"""
+        self.assertEqual(self.estacao.historico.count(), 1)
+        self.assertEqual(self.estacao.historico.get().valor_gravidade, Decimal('978800.00000'))
+
+    def test_reocupacao_atualiza_estacao(self):
+        """Testar que apenas a observação mais recente é materializada na estação"""
+        self.estacao.registrar_observacao(data_medicao=date(2025, 1, 10), valor_gravidade=Decimal('978800.05000'), altitude=Decimal('10.00'))
+        self.estacao.registrar_observacao(data_medicao=date(2023, 1, 10), valor_gravidade=Decimal('978799.90000'), altitude=Decimal('10.00'))
+
+        self.estacao.refresh_from_db()
+        self.assertEqual(self.estacao.historico.count(), 3)
+        self.assertEqual(self.estacao.data_medicao, date(2025, 1, 10))
+        self.assertEqual(self.estacao.valor_gravidade, Decimal('978800.05000'))
+        self.assertEqual(
+            self.estacao.variacao_gravidade(date(2023, 6, 1), date(2025, 6, 1)),
+            Decimal('0.15000'),
+        )
+
+        anotada = MedicaoGravimetrica.objects.annotate(
+            g0=ObservacaoGravimetrica.objects.gravidade_em(date(2024, 6, 1))
+        ).get(pk=self.estacao.pk)
+        self.assertEqual(Decimal(str(anotada.g0)), Decimal('978800.00000'))
+
+    def test_exclusao_da_ultima_observacao(self):
+        """Testar que excluir a observação mais recente restaura a anterior"""
+        recente = self.estacao.registrar_observacao(data_medicao=date(2025, 1, 10), valor_gravidade=Decimal('978801.00000'))
+        recente.delete()
+
+        self.estacao.refresh_from_db()
+        self.assertEqual(self.estacao.valor_gravidade, Decimal('978800.00000'))
+        self.assertEqual(self.estacao.data_medicao, date(2024, 1, 10))
+
+    def test_edicao_da_estacao_sincroniza_observacao(self):
+        """Testar que editar a estação corrige sua observação mais recente"""
+        self.estacao.valor_gravidade = Decimal('978800.10000')
+        self.estacao.save()
+        self.assertEqual(self.estacao.historico.get().valor_gravidade, Decimal('978800.10000'))
+
+
+class AjustamentoRedeTest(TestCase):
+    """Testes para o ajustamento da rede gravimétrica"""
+
+    def criar_estacao(self, codigo, gravidade, referencia=False):
+        return MedicaoGravimetrica.objects.create(
+            nome_estacao=codigo,
+            codigo_estacao=codigo,
+            latitude=Decimal('-15.0'),
+            longitude=Decimal('-47.0'),
+            valor_gravidade=Decimal(gravidade),
+            data_medicao=date(2024, 1, 1),
+            estacao_referencia=referencia,
+        )
+
+    def ligar(self, origem, destino, diferenca, incerteza='0.01000'):
+        return LigacaoGravimetrica.objects.create(
+            estacao_origem=origem,
+            estacao_destino=destino,
+            diferenca=Decimal(diferenca),
+            incerteza=None if incerteza is None else Decimal(incerteza),
+        )
+
+    def setUp(self):
+        # Circuito A → B → C → A com erro de fechamento de -0,03 mGal
+        self.a = self.criar_estacao('A', '978000.00000', referencia=True)
+        self.b = self.criar_estacao('B', '978010.50000')
+        self.c = self.criar_estacao('C', '978015.50000')
+        self.ligar(self.a, self.b, '10.00000')
+        self.ligar(self.b, self.c, '5.00000')
+        self.ligar(self.c, self.a, '-15.03000')
+
+    def test_circuito_distribui_erro_de_fechamento(self):
+        """Testar que o erro de fechamento é repartido igualmente entre ligações de mesmo peso"""
+        stats = ajustar_rede_gravimetrica()
+
+        self.b.refresh_from_db()
+        self.c.refresh_from_db()
+        self.a.refresh_from_db()
+        self.assertEqual(self.b.gravidade_ajustada, Decimal('978010.01000'))
+        self.assertEqual(self.c.gravidade_ajustada, Decimal('978015.02000'))
+        self.assertEqual(self.a.gravidade_ajustada, Decimal('978000.00000'))
+        self.assertEqual(self.a.incerteza_ajustada, Decimal('0.00000'))
+        # σ0 = √3 e diag(N⁻¹) = 2/(3p): σ = 0,01·√2
+        self.assertEqual(self.b.incerteza_ajustada, Decimal('0.01414'))
+        self.assertEqual(stats['graus_liberdade'], 1)
+        self.assertAlmostEqual(stats['sigma0'], math.sqrt(3), places=6)
+
+    def test_componente_sem_referencia_nao_e_ajustada(self):
+        """Testar que estações sem caminho até uma referência ficam sem valor ajustado"""
+        d = self.criar_estacao('D', '979000.00000')
+        e = self.criar_estacao('E', '979001.00000')
+        self.ligar(d, e, '1.00000', incerteza=None)
+
+        stats = ajustar_rede_gravimetrica()
+
+        d.refresh_from_db()
+        self.assertIsNone(d.gravidade_ajustada)
+        self.assertEqual(stats['sem_referencia'], 2)
+        self.assertEqual(stats['ajustadas'], 2)
+
+    def test_peso_pela_incerteza_das_estacoes(self):
+        """Testar que ligações sem incerteza usam a combinação das incertezas das estações"""
+        LigacaoGravimetrica.objects.update(incerteza=None)
+        MedicaoGravimetrica.objects.update(incerteza=Decimal('0.02000'))
+        stats = ajustar_rede_gravimetrica()
+
+        self.b.refresh_from_db()
+        self.assertEqual(self.b.gravidade_ajustada, Decimal('978010.01000'))
+        # σ da ligação = √(0,02² + 0,02²); resíduos de 0,01 dão σ0 = √3·0,01/σ
+        self.assertAlmostEqual(stats['sigma0'], math.sqrt(3) * 0.01 / math.hypot(0.02, 0.02), places=6)
+
+    def test_comando_adjust_network(self):
+        """Testar o comando com estação fixa informada por código"""
+        MedicaoGravimetrica.objects.update(estacao_referencia=False)
+        out = StringIO()
+        call_command('adjust_network', '--fixas', 'A', '--sem-incertezas', stdout=out)
+
+        self.c.refresh_from_db()
+        self.assertEqual(self.c.gravidade_ajustada, Decimal('978015.02000'))
+        self.assertIsNone(self.c.incerteza_ajustada)
+        self.assertIn('Graus de liberdade: 1', out.getvalue())
+
+
+class BuscaEstacoesTest(TestCase):
+    """Testes para a busca textual indexada de estações"""
+
+    def setUp(self):
+        for codigo, nome, operador in [
+            ('BSB-001', 'Brasília Centro', 'Ana'),
+            ('GYN-002', 'Goiânia', 'Bruno'),
+            ('XBSB-03', 'Anápolis', 'Carla'),
+        ]:
+            MedicaoGravimetrica.objects.create(
+                nome_estacao=nome,
+                codigo_estacao=codigo,
+                operador=operador,
+                latitude=Decimal('-15.8'),
+                longitude=Decimal('-47.9'),
+                valor_gravidade=Decimal('978100.00000'),
+                data_medicao=date(2024, 1, 1),
+            )
+
+    def buscar(self, termo):
+        qs = buscar_estacoes(MedicaoGravimetrica.objects.all(), termo).order_by(*ORDEM_RELEVANCIA)
+        return [m.codigo_estacao for m in qs]
+
+    def test_substring_com_prefixo_primeiro(self):
+        """Testar que a busca acha substrings e ordena prefixos antes"""
+        self.assertEqual(self.buscar('bsb'), ['BSB-001', 'XBSB-03'])
+        self.assertEqual(self.buscar('Brasília Centro'), ['BSB-001'])
+        self.assertEqual(self.buscar('bruno'), ['GYN-002'])
+
+    def test_indice_acompanha_edicao_e_exclusao(self):
+        """Testar que os triggers mantêm o índice em dia"""
+        estacao = MedicaoGravimetrica.objects.get(codigo_estacao='GYN-002')
+        estacao.nome_estacao = 'Trindade'
+        estacao.save()
+        self.assertEqual(self.buscar('Goiânia'), [])
+        self.assertEqual(self.buscar('trindade'), ['GYN-002'])
+
+        estacao.delete()
+        self.assertEqual(self.buscar('trindade'), [])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Triggers FTS5 só existem no SQLite')
+    def test_triggers_recriados_apos_migracao(self):
+        """Testar que o post_migrate repõe triggers perdidos quando o SQLite recria a tabela"""
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER medicoes_busca_au')
+        garantir_indice_busca()
+
+        MedicaoGravimetrica.objects.filter(codigo_estacao='GYN-002').update(nome_estacao='Trindade')
+        self.assertEqual(self.buscar('trindade'), ['GYN-002'])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Triggers FTS5 só existem no SQLite')
+    def test_migracao_recria_triggers(self):
+        """Testar que a migração 0018 repõe os triggers com o SQL congelado e reconstrói o índice"""
+        import importlib
+
+        migracao = importlib.import_module('medicoes.migrations.0018_recriar_triggers_busca')
+        with connection.cursor() as cursor:
+            for nome in ('medicoes_busca_ai', 'medicoes_busca_ad', 'medicoes_busca_au'):
+                cursor.execute(f'DROP TRIGGER {nome}')
+        MedicaoGravimetrica.objects.filter(codigo_estacao='GYN-002').update(nome_estacao='Trindade')
+        # O schema_editor do SQLite não abre dentro da transação do teste; a migração só usa execute()
+        with connection.cursor() as cursor:
+            migracao.recriar_triggers(None, mock.Mock(connection=connection, execute=cursor.execute))
+
+        self.assertEqual(self.buscar('trindade'), ['GYN-002'])
+        MedicaoGravimetrica.objects.filter(codigo_estacao='GYN-002').update(nome_estacao='Inhumas')
+        self.assertEqual(self.buscar('inhumas'), ['GYN-002'])
+
+    def test_termo_curto_e_aspas(self):
+        """Testar termos abaixo de um trigrama e caracteres especiais do FTS5"""
+        self.assertEqual(self.buscar('an'), ['XBSB-03', 'BSB-001'])
+        self.assertEqual(self.buscar('"bsb'), [])
+
+    def test_lista_usa_busca(self):
+        """Testar a busca pela listagem de medições"""
+        User.objects.create_user(username='visitante', password='pass123')
+        self.client.login(username='visitante', password='pass123')
+        response = self.client.get(reverse('medicoes:medicao_lista'), {'search': 'anápolis'})
+        self.assertEqual([m.codigo_estacao for m in response.context['medicoes']], ['XBSB-03'])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Triggers FTS5 só existem no SQLite')
+class TriggersBuscaRecriacaoTabelaTest(TransactionTestCase):
+    """Testes dos triggers FTS5 quando o SQLite recria a tabela de estações"""
+
+    def alterar_operador(self, max_length):
+        # AlterField no SQLite recria a tabela (CREATE/INSERT/DROP/RENAME), como numa migração
+        antigo = MedicaoGravimetrica._meta.get_field('operador')
+        novo = antigo.clone()
+        novo.max_length = max_length
+        novo.set_attributes_from_name('operador')
+        novo.model = MedicaoGravimetrica
+        with connection.schema_editor() as editor:
+            editor.alter_field(MedicaoGravimetrica, antigo, novo)
+
+    def triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'medicoes_busca%'")
+            return {nome for nome, in cursor.fetchall()}
+
+    def test_triggers_sobrevivem_a_recriacao_da_tabela(self):
+        """Testar que o índice volta a acompanhar a tabela depois de um AlterField seguido do migrate"""
+        from django.core.management.sql import emit_post_migrate_signal
+
+        estacao = MedicaoGravimetrica.objects.create(
+            nome_estacao='Goiânia', codigo_estacao='GYN-002',
+            latitude=Decimal('-16.7'), longitude=Decimal('-49.3'),
+            valor_gravidade=Decimal('978100.00000'), data_medicao=date(2024, 1, 1),
+        )
+        self.alterar_operador(120)
+        self.addCleanup(self.alterar_operador, 100)
+        self.assertEqual(self.triggers(), set())
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertEqual(self.triggers(), {'medicoes_busca_ai', 'medicoes_busca_ad', 'medicoes_busca_au'})
+
+        MedicaoGravimetrica.objects.filter(pk=estacao.pk).update(nome_estacao='Trindade')
+        busca = buscar_estacoes(MedicaoGravimetrica.objects.all(), 'trindade')
+        self.assertEqual([m.codigo_estacao for m in busca], ['GYN-002'])
+
+
+class PaginacaoCursorTest(TestCase):
+    """Testes para a paginação por cursor da lista de medições"""
+
+    def setUp(self):
+        # Várias estações por data, para exercitar o desempate por id
+        for i in range(25):
+            MedicaoGravimetrica.objects.create(
+                nome_estacao=f'Estação {i}',
+                codigo_estacao=f'PAG-{i:02d}',
+                latitude=Decimal('-15.0'),
+                longitude=Decimal('-47.0'),
+                valor_gravidade=Decimal('978100.00000'),
+                data_medicao=date(2024, 1, 1 + i // 4),
+            )
+        self.esperado = list(MedicaoGravimetrica.objects.order_by('-data_medicao', '-id').values_list('pk', flat=True))
+
+    def test_percorre_para_frente_e_para_tras(self):
+        """Testar que as páginas cobrem tudo sem repetir e que voltar reproduz a anterior"""
+        qs = MedicaoGravimetrica.objects.all()
+        paginas, cursor = [], None
+        while True:
+            pagina = paginar_por_cursor(qs, 10, apos=cursor)
+            paginas.append([m.pk for m in pagina])
+            if not pagina.has_next():
+                break
+            cursor = pagina.next_cursor
+
+        self.assertEqual([pk for p in paginas for pk in p], self.esperado)
+        self.assertEqual([len(p) for p in paginas], [10, 10, 5])
+        self.assertEqual(pagina.count, 25)
+
+        anterior = paginar_por_cursor(qs, 10, antes=pagina.previous_cursor)
+        self.assertEqual([m.pk for m in anterior], paginas[1])
+        self.assertTrue(anterior.has_previous())
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        """Testar que um cursor malformado devolve a primeira página"""
+        pagina = paginar_por_cursor(MedicaoGravimetrica.objects.all(), 10, apos='lixo!')
+        self.assertEqual([m.pk for m in pagina], self.esperado[:10])
+        self.assertFalse(pagina.has_previous())
+
+    def test_lista_nos_dois_modos(self):
+        """Testar a listagem com paginação por cursor e por offset"""
+        User.objects.create_user(username='visitante', password='pass123')
+        self.client.login(username='visitante', password='pass123')
+        url = reverse('medicoes:medicao_lista')
+
+        with override_settings(LISTA_PAGINACAO='cursor'):
+            response = self.client.get(url)
+            self.assertTrue(response.context['paginacao_cursor'])
+            cursor = response.context['page_obj'].next_cursor
+            response = self.client.get(url, {'apos': cursor})
+            self.assertEqual([m.pk for m in response.context['medicoes']], self.esperado[20:])
+            self.assertContains(response, 'Mais recentes')
+
+        with override_settings(LISTA_PAGINACAO='offset'):
+            response = self.client.get(url, {'page': 2})
+            self.assertEqual([m.pk for m in response.context['medicoes']], self.esperado[20:])
+            self.assertContains(response, 'Primeira')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Planos verificados com EXPLAIN QUERY PLAN do SQLite')
+class PlanoConsultasTest(TestCase):
+    """Testes de regressão dos planos de consulta das telas principais"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user(username='visitante', password='pass123')
+        for i in range(6):
+            MedicaoGravimetrica.objects.create(
+                nome_estacao=f'Estação {i}',
+                codigo_estacao=f'PLN-{i}',
+                latitude=Decimal('-15.0') - i,
+                longitude=Decimal('-47.0') + i,
+                altitude=Decimal('1000.00'),
+                valor_gravidade=Decimal('978100.00000') + i,
+                data_medicao=date(2024, 1, 1 + i),
+                ativo=i != 5,
+            )
+
+    def planos(self, consultas, tabela='medicoes_medicaogravimetrica', contagens=True):
+        """EXPLAIN QUERY PLAN de cada SELECT capturado sobre a tabela de medições"""
+        planos = []
+        with connection.cursor() as cursor:
+            for consulta in consultas:
+                sql = consulta['sql']
+                if not contagens and sql.startswith('SELECT COUNT(*)'):
+                    continue
+                if sql.startswith('SELECT') and f'FROM "{tabela}"' in sql:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    planos.append(' '.join(linha[-1] for linha in cursor.fetchall()))
+        return planos
+
+    def capturar(self, funcao, contagens=True):
+        with CaptureQueriesContext(connection) as contexto:
+            funcao()
+        return self.planos(contexto.captured_queries, contagens=contagens)
+
+    def test_lista_e_paginas_seguintes(self):
+        """Testar que a lista (e o cursor) percorrem o índice parcial de data"""
+        self.client.login(username='visitante', password='pass123')
+        url = reverse('medicoes:medicao_lista')
+        with override_settings(LISTA_PAGINACAO='cursor'):
+            planos = self.capturar(lambda: self.client.get(url), contagens=False)
+            # Cursor de (2024-01-03, id 3): a busca começa nele, não no topo do índice
+            planos += self.capturar(lambda: self.client.get(url, {'apos': 'MjAyNC0wMS0wM3wz'}), contagens=False)
+        self.assertEqual(len(planos), 2)
+        self.assertIn('USING INDEX medicao_ativo_data_idx', planos[0])
+        self.assertIn('SEARCH medicoes_medicaogravimetrica USING INDEX medicao_ativo_data_idx (data_medicao<?)', planos[1])
+
+    def test_home(self):
+        """Testar que as medições recentes da home usam o índice parcial de data"""
+        self.client.login(username='visitante', password='pass123')
+        planos = self.capturar(lambda: self.client.get(reverse('medicoes:home')))
+        self.assertTrue(planos)
+        self.assertTrue(all('medicao_ativo_data_idx' in p for p in planos), planos)
+
+    def test_mapa_de_contorno(self):
+        """Testar que a faixa de anomalias do mapa de contorno usa o índice parcial de anomalia"""
+        estacao = MedicaoGravimetrica.objects.first()
+        MedicaoGravimetrica.objects.update(anomalia_bouguer=None)
+        planos = self.capturar(lambda: gerar_mapa_contorno_medicao(estacao))
+        self.assertTrue(planos)
+        self.assertTrue(all('medicao_ativo_anomalia_idx' in p for p in planos), planos)
+
+    def test_faixa_de_gravidade(self):
+        """Testar que os filtros de gravidade da lista usam o índice parcial de gravidade"""
+        self.client.login(username='visitante', password='pass123')
+        planos = self.capturar(lambda: self.client.get(
+            reverse('medicoes:medicao_lista'), {'gravidade_min': '978101', 'gravidade_max': '978103'}
+        ))
+        self.assertTrue(planos)
+        self.assertTrue(all('medicao_ativo_gravidade_idx' in p for p in planos), planos)
+
+
+class ConsultasEspaciaisTest(TestCase):
+    """Testes para as consultas espaciais (geohash, raio e vizinhos)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        cls.pontos = {}
+        estacoes = []
+        for i in range(150):
+            # Metade no Planalto Central, metade espalhada (inclui o antimeridiano)
+            if i % 2:
+                lat, lon = rng.uniform(-17, -15), rng.uniform(-49, -47)
+            else:
+                lat, lon = rng.uniform(-80, 80), rng.uniform(-180, 180)
+            lat, lon = round(lat, 6), round(lon, 6)
+            estacoes.append(MedicaoGravimetrica(
+                nome_estacao=f'Estação {i}',
+                codigo_estacao=f'GEO-{i:03d}',
+                latitude=Decimal(str(lat)),
+                longitude=Decimal(str(lon)),
+                valor_gravidade=Decimal('978100.00000'),
+                data_medicao=date(2024, 1, 1),
+                geohash=espacial.geohash(lat, lon),
+            ))
+            cls.pontos[f'GEO-{i:03d}'] = (lat, lon)
+        MedicaoGravimetrica.objects.bulk_create(estacoes)
+
+    def setUp(self):
+        espacial.invalidar_indice()
+
+    @staticmethod
+    def haversine(lat1, lon1, lat2, lon2):
+        p1, p2 = math.radians(lat1), math.radians(lat2)
+        a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+        return 2 * espacial.RAIO_TERRA_KM * math.asin(math.sqrt(a))
+
+    def codigos(self, queryset):
+        return set(queryset.values_list('codigo_estacao', flat=True))
+
+    def test_geohash_conhecido(self):
+        """Testar o geohash contra o valor de referência"""
+        self.assertEqual(espacial.geohash(57.64911, 10.40744), 'u4pruydqq')
+        estacao = MedicaoGravimetrica.objects.get(codigo_estacao='GEO-001')
+        estacao.latitude = Decimal('-15.793889')
+        estacao.longitude = Decimal('-47.882778')
+        estacao.save(update_fields=['latitude', 'longitude'])
+        estacao.refresh_from_db()
+        self.assertEqual(estacao.geohash, espacial.geohash(-15.793889, -47.882778))
+
+    @override_settings(USA_POSTGIS=True)
+    def test_ponto_postgis_so_no_postgresql(self):
+        """Testar que o post_migrate do PostGIS não toca em outros bancos"""
+        if connection.vendor == 'postgresql':
+            self.skipTest('Só fora do PostgreSQL')
+        with self.assertNumQueries(0):
+            espacial.garantir_ponto_postgis()
+
+    def test_geohash_congelado_da_migracao(self):
+        """Testar que a cópia do geohash na migração 0014 coincide com a do app"""
+        import importlib
+
+        migracao = importlib.import_module('medicoes.migrations.0014_geohash_estacoes')
+        rng = np.random.default_rng(7)
+        lats, lons = rng.uniform(-90, 90, 500), rng.uniform(-180, 180, 500)
+        self.assertEqual(migracao.geohashes(lats, lons), espacial.geohashes(lats, lons))
+
+    def test_bbox_igual_a_forca_bruta(self):
+        """Testar retângulos (inclusive cruzando o antimeridiano) contra a filtragem direta"""
+        for lat_min, lat_max, lon_min, lon_max in [(-16.5, -15.2, -48.7, -47.3), (-60, 60, 150, -150), (-90, 90, -180, 180)]:
+            esperado = {
+                codigo for codigo, (lat, lon) in self.pontos.items()
+                if lat_min <= lat <= lat_max and (
+                    lon_min <= lon <= lon_max if lon_min <= lon_max else lon >= lon_min or lon <= lon_max
+                )
+            }
+            obtido = self.codigos(espacial.filtrar_bbox(MedicaoGravimetrica.objects.all(), lat_min, lat_max, lon_min, lon_max))
+            self.assertEqual(obtido, esperado)
+
+    def test_raio_igual_a_haversine(self):
+        """Testar o filtro por raio contra a distância de haversine"""
+        centro, raio = (-16.0, -48.0), 60.0
+        distancias = {codigo: self.haversine(*centro, *ponto) for codigo, ponto in self.pontos.items()}
+        queryset = espacial.filtrar_raio(MedicaoGravimetrica.objects.all(), *centro, raio)
+        obtido = {m.codigo_estacao: m.distancia_km for m in queryset}
+
+        self.assertTrue(obtido)
+        for codigo, distancia in distancias.items():
+            if abs(distancia - raio) > 0.5:
+                self.assertEqual(codigo in obtido, distancia < raio, codigo)
+        for codigo, distancia in obtido.items():
+            self.assertAlmostEqual(distancia, distancias[codigo], delta=distancias[codigo] * 0.002 + 0.01)
+
+    def test_vizinhos_mais_proximos(self):
+        """Testar a KD-tree contra a ordenação por haversine"""
+        centro = (-16.2, -47.9)
+        esperado = sorted(self.pontos, key=lambda codigo: self.haversine(*centro, *self.pontos[codigo]))[:5]
+        proximas = espacial.estacoes_proximas(*centro, k=5)
+        self.assertEqual([m.codigo_estacao for m in proximas], esperado)
+        self.assertAlmostEqual(proximas[0].distancia_km, self.haversine(*centro, *self.pontos[esperado[0]]), places=6)
+
+        limitadas = espacial.estacoes_proximas(*centro, k=50, raio_km=30)
+        self.assertTrue(all(m.distancia_km <= 30 for m in limitadas))
+
+    def test_api_lista_e_detalhe(self):
+        """Testar a API de estações próximas, o filtro por raio da lista e o painel do detalhe"""
+        User.objects.create_user(username='visitante', password='pass123')
+        self.client.login(username='visitante', password='pass123')
+
+        resposta = self.client.get(reverse('medicoes:estacoes_proximas_api'), {'lat': -16, 'lon': -48, 'k': 3})
+        dados = resposta.json()
+        self.assertEqual(dados['count'], 3)
+        self.assertEqual(dados['estacoes'], sorted(dados['estacoes'], key=lambda e: e['distancia_km']))
+        self.assertEqual(self.client.get(reverse('medicoes:estacoes_proximas_api'), {'lat': 'x'}).status_code, 400)
+
+        with override_settings(LISTA_PAGINACAO='cursor'):
+            resposta = self.client.get(reverse('medicoes:medicao_lista'), {'lat': -16, 'lon': -48, 'raio_km': 60})
+        esperado = self.codigos(espacial.filtrar_raio(MedicaoGravimetrica.objects.all(), -16.0, -48.0, 60.0))
+        self.assertEqual({m.codigo_estacao for m in resposta.context['medicoes']}, esperado)
+
+        resposta = self.client.get(reverse('medicoes:medicao_detail', args=['GEO-001']))
+        self.assertEqual(len(resposta.context['proximas']), 5)
+        self.assertNotIn('GEO-001', [m.codigo_estacao for m in resposta.context['proximas']])
+        self.assertContains(resposta, 'Estações Próximas')
+
+    def test_agrupamento(self):
+        """Testar o agrupamento em células para o mapa"""
+        grupos = espacial.agrupar(MedicaoGravimetrica.objects.all(), 1)
+        self.assertEqual(sum(g['quantidade'] for g in grupos), len(self.pontos))
+        # Com células de 45° as 75 estações do Planalto caem na mesma
+        planalto = max(grupos, key=lambda g: g['quantidade'])
+        self.assertGreaterEqual(planalto['quantidade'], 75)
+        self.assertTrue(-45 <= planalto['latitude'] <= 0 and -90 <= planalto['longitude'] <= -45)
+
+        User.objects.create_user(username='mapa', password='pass123')
+        self.client.login(username='mapa', password='pass123')
+        dados = self.client.get(reverse('medicoes:medicoes_api'), {'agrupar': 2}).json()
+        self.assertEqual(sum(g['quantidade'] for g in dados['grupos']), len(self.pontos))
+        for invalido in (12, 0, 'x'):
+            resposta = self.client.get(reverse('medicoes:medicoes_api'), {'agrupar': invalido})
+            self.assertEqual(resposta.status_code, 400)
+            self.assertFalse(resposta.json()['success'])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'PRAGMAs só existem no SQLite')
+class PragmasSqliteTest(TestCase):
+    """Testes da configuração das conexões SQLite"""
+
+    def pragma(self, nome):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {nome}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_aplicados(self):
+        """Testar que a conexão recebe foreign keys e os PRAGMAs configurados"""
+        self.assertEqual(self.pragma('foreign_keys'), 1)
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('temp_store'), 2)  # MEMORY
+        self.assertEqual(self.pragma('busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(self.pragma('cache_size'), settings.SQLITE_PRAGMAS['cache_size'])
+
+    def test_valores_invalidos(self):
+        """Testar que nomes e valores fora do padrão são recusados"""
+        self.assertEqual(db_signals.comandos_pragma({'journal_mode': 'WAL'}), ['PRAGMA journal_mode = WAL;'])
+        with self.assertRaises(ValueError):
+            db_signals.comandos_pragma({'journal_mode': 'WAL; DROP TABLE x'})
+        with self.assertRaises(ValueError):
+            db_signals.comandos_pragma({'writable_schema': 1})
+
+    def test_benchmark(self):
+        """Testar que o benchmark roda os dois cenários"""
+        saida = StringIO()
+        call_command('benchmark_sqlite', segundos=0.2, leitores=2, estacoes=500, stdout=saida)
+        self.assertIn('journal padrão', saida.getvalue())
+        self.assertIn('SQLITE_PRAGMAS', saida.getvalue())
+
+
+class TransacoesPorViewTest(TransactionTestCase):
+    """Testes da política de transação por view (ATOMIC_REQUESTS seletivo)"""
+
+    def setUp(self):
+        # A view do PDF grava o HTML de depuração em BASE_DIR/tmp_pdf_debug
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.enterContext(override_settings(BASE_DIR=Path(pasta.name)))
+        self.usuario = User.objects.create_user(username='leitor', password='pass123')
+        self.estacao = MedicaoGravimetrica.objects.create(
+            nome_estacao='Estação PDF', codigo_estacao='PDF-001',
+            latitude=Decimal('-15.8'), longitude=Decimal('-47.9'),
+            valor_gravidade=Decimal('978100.00000'), data_medicao=date(2024, 1, 1),
+        )
+
+    def test_views_de_leitura_fora_da_transacao(self):
+        """Testar que as views de leitura dispensam a transação e as de escrita não"""
+        leitura = [('medicao_pdf', 1), ('medicao_pdf_consolidado',), ('medicoes_api',), ('medicao_lista',), ('home',)]
+        escrita = [('medicao_adicionar',), ('medicao_editar', 1), ('importar_excel',), ('bulk_delete',)]
+        for nome, *args in leitura:
+            self.assertIn('default', getattr(resolve_nome(nome, *args), '_non_atomic_requests', set()), nome)
+        for nome, *args in escrita:
+            self.assertFalse(getattr(resolve_nome(nome, *args), '_non_atomic_requests', set()), nome)
+
+    def importar_durante_pdf(self):
+        """Gera o PDF numa thread, parada no mapa de contorno, e tenta importar uma estação no meio"""
+        iniciado, liberar = threading.Event(), threading.Event()
+        respostas = []
+
+        def mapa_lento(medicao):
+            iniciado.set()
+            liberar.wait(10)
+            return None
+
+        def gerar_pdf():
+            cliente = Client()
+            cliente.force_login(self.usuario)
+            try:
+                respostas.append(cliente.get(reverse('medicoes:medicao_pdf', args=[self.estacao.pk])))
+            finally:
+                connections.close_all()
+
+        with mock.patch('medicoes.views.medicoesview.gerar_mapa_contorno_medicao', mapa_lento):
+            thread = threading.Thread(target=gerar_pdf)
+            thread.start()
+            self.assertTrue(iniciado.wait(10))
+            try:
+                inicio = time.perf_counter()
+                MedicaoGravimetrica.objects.create(
+                    nome_estacao='Importada', codigo_estacao='IMP-001',
+                    latitude=Decimal('-16'), longitude=Decimal('-48'),
+                    valor_gravidade=Decimal('978100.00000'), data_medicao=date(2024, 2, 1),
+                )
+                return time.perf_counter() - inicio
+            finally:
+                liberar.set()
+                thread.join()
+                self.assertEqual(respostas[0].status_code, 200)
+
+    def test_importacao_nao_espera_pdf(self):
+        """Testar que uma importação grava enquanto um PDF está sendo gerado"""
+        self.assertLess(self.importar_durante_pdf(), 1.0)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Lock de tabela do SQLite')
+    def test_pdf_atomico_travaria_importacao(self):
+        """Testar o cenário de controle: com a transação aberta a importação é bloqueada"""
+        view = resolve_nome('medicao_pdf', self.estacao.pk)
+        with mock.patch.dict(view.__dict__, {'_non_atomic_requests': set()}):
+            with self.assertRaises(OperationalError):
+                self.importar_durante_pdf()
+
+
+class CacheDadosTest(TestCase):
+    """Testes do cache versionado dos dados das views"""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user(username='cache', email='cache@exemplo.com', password='pass123', is_staff=True)
+        self.client.force_login(self.usuario)
+        self.estacao = MedicaoGravimetrica.objects.create(
+            nome_estacao='Estação Cache', codigo_estacao='CACHE-001',
+            latitude=Decimal('-15.8'), longitude=Decimal('-47.9'),
+            valor_gravidade=Decimal('978100.00000'), data_medicao=date(2024, 1, 1),
+        )
+
+    def consultas_na_tabela(self, funcao):
+        with CaptureQueriesContext(connection) as consultas:
+            funcao()
+        tabela = MedicaoGravimetrica._meta.db_table
+        return [q['sql'] for q in consultas.captured_queries if tabela in q['sql']]
+
+    def test_em_cache_e_versao(self):
+        """Testar que o valor é calculado uma vez por versão do namespace"""
+        calcular = mock.Mock(return_value=[1, 2])
+        self.assertEqual(cache_dados.em_cache('teste', 'a', calcular=calcular), [1, 2])
+        self.assertEqual(cache_dados.em_cache('teste', 'a', calcular=calcular), [1, 2])
+        cache_dados.em_cache('teste', 'b', calcular=calcular)
+        self.assertEqual(calcular.call_count, 2)
+
+        self.estacao.save()
+        cache_dados.em_cache('teste', 'a', calcular=calcular)
+        self.assertEqual(calcular.call_count, 3)
+
+    def test_invalidacao_no_commit(self):
+        """Testar que a versão sobe de novo no commit e nas gravações em lote"""
+        inicial = cache_dados.versao()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.estacao.save()
+            self.assertEqual(cache_dados.versao(), inicial + 1)
+        self.assertEqual(cache_dados.versao(), inicial + 2)
+
+        atualizacao_em_lote(['nome_estacao'])([('Renomeada', self.estacao.pk)])
+        self.assertEqual(cache_dados.versao(), inicial + 3)
+
+    def test_views_em_cache(self):
+        """Testar que mapa e detalhe não consultam o banco de novo até uma gravação"""
+        url_api = reverse('medicoes:medicoes_api')
+        url_detalhe = reverse('medicoes:medicao_detail', args=['CACHE-001'])
+        self.assertEqual(self.client.get(url_api).json()['count'], 1)
+        self.client.get(url_detalhe)
+
+        self.assertEqual(self.consultas_na_tabela(lambda: self.client.get(url_api)), [])
+        self.assertEqual(self.consultas_na_tabela(lambda: self.client.get(url_detalhe)), [])
+
+        self.estacao.nome_estacao = 'Nome Novo'
+        self.estacao.save()
+        self.assertEqual(self.client.get(url_api).json()['medicoes'][0]['nome_estacao'], 'Nome Novo')
+        self.assertContains(self.client.get(url_detalhe), 'Nome Novo')
+
+    def test_estatisticas_de_usuarios(self):
+        """Testar que as estatísticas de usuários são invalidadas por novos cadastros"""
+        url = reverse('medicoes:user_statistics_api')
+        self.assertEqual(self.client.get(url).json()['total'], 1)
+        User.objects.create_user(username='novo', email='novo@exemplo.com', password='pass123')
+        self.assertEqual(self.client.get(url).json()['total'], 2)
+
+
+@mock.patch('medicoes.roteamento.replica_configurada', return_value=True)
+class RoteamentoReplicaTest(TestCase):
+    """Testes do roteamento de leituras para a réplica"""
+
+    def banco_de_leitura(self, request):
+        return HttpResponse(router.db_for_read(MedicaoGravimetrica))
+
+    def test_leituras_marcadas_vao_para_replica(self, _):
+        """Testar que só as leituras marcadas saem do principal e escritas nunca saem"""
+        self.assertEqual(router.db_for_read(MedicaoGravimetrica), 'default')
+        with roteamento.leitura_na_replica():
+            self.assertEqual(router.db_for_read(MedicaoGravimetrica), 'replica')
+            self.assertEqual(router.db_for_write(MedicaoGravimetrica), 'default')
+        self.assertEqual(router.db_for_read(MedicaoGravimetrica), 'default')
+
+    def test_sem_replica_configurada(self, configurada):
+        """Testar que sem a réplica tudo fica no principal"""
+        configurada.return_value = False
+        with roteamento.leitura_na_replica():
+            self.assertEqual(router.db_for_read(MedicaoGravimetrica), 'default')
+
+    def test_aderencia_apos_gravacao(self, _):
+        """Testar que quem acabou de gravar lê do principal"""
+        view = roteamento.leitura_replica(self.banco_de_leitura)
+        request = RequestFactory().get('/')
+        self.assertEqual(view(request).content, b'replica')
+        request.COOKIES[roteamento.COOKIE_ADERENCIA] = '1'
+        self.assertEqual(view(request).content, b'default')
+
+    def test_cache_nao_guarda_leitura_da_replica(self, _):
+        """Testar que quem tem o cookie de aderência não recebe do cache um valor lido da réplica"""
+        cache_dados.invalidar()
+        view = roteamento.leitura_replica(lambda request: HttpResponse(
+            cache_dados.em_cache('aderencia', calcular=lambda: router.db_for_read(MedicaoGravimetrica))
+        ))
+        anonimo = RequestFactory().get('/')
+        aderente = RequestFactory().get('/')
+        aderente.COOKIES[roteamento.COOKIE_ADERENCIA] = '1'
+
+        self.assertEqual(view(anonimo).content, b'replica')
+        self.assertEqual(view(aderente).content, b'default')
+        # O valor do principal fica no cache e serve também a quem lê da réplica
+        self.assertEqual(view(anonimo).content, b'default')
+        self.assertEqual(view(aderente).content, b'default')
+
+    def test_contagem_por_banco_guardada_na_replica(self, _):
+        """Testar que chaves que incluem o alias guardam o que vem da réplica só para a réplica"""
+        cache_dados.invalidar()
+        with roteamento.leitura_na_replica():
+            cache_dados.em_cache('contagem', 'replica', calcular=lambda: 1, por_banco=True)
+            self.assertEqual(cache_dados.em_cache('contagem', 'replica', calcular=lambda: 2, por_banco=True), 1)
+        self.assertEqual(cache_dados.em_cache('contagem', 'default', calcular=lambda: 3, por_banco=True), 3)
+
+    def test_middleware_marca_escritas(self, _):
+        """Testar que requisições POST recebem o cookie de aderência e GET não"""
+        resposta = self.client.get(reverse('medicoes:login'))
+        self.assertNotIn(roteamento.COOKIE_ADERENCIA, resposta.cookies)
+        resposta = self.client.post(reverse('medicoes:login'), {'username': 'x', 'password': 'y'})
+        cookie = resposta.cookies[roteamento.COOKIE_ADERENCIA]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_ADERENCIA_SEGUNDOS)
+        with override_settings(REPLICA_ADERENCIA_SEGUNDOS=0):
+            resposta = Client().post(reverse('medicoes:login'), {'username': 'x', 'password': 'y'})
+        self.assertNotIn(roteamento.COOKIE_ADERENCIA, resposta.cookies)
+
+
+class InstrumentacaoTest(TestCase):
+    """Testes do middleware de instrumentação (Server-Timing)"""
+
+    def setUp(self):
+        # A view do PDF grava o HTML de depuração em BASE_DIR/tmp_pdf_debug
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.enterContext(override_settings(BASE_DIR=Path(pasta.name)))
+        self.usuario = User.objects.create_user(username='medidor', password='pass123')
+        self.client.force_login(self.usuario)
+        for i, (lat, lon, alt) in enumerate([(-15.7, -47.8, 1100), (-15.9, -47.9, 1050), (-15.8, -48.1, 1000), (-16.0, -47.7, 990)]):
+            MedicaoGravimetrica.objects.create(
+                nome_estacao=f'Estação {i}', codigo_estacao=f'INS-{i}',
+                latitude=Decimal(str(lat)), longitude=Decimal(str(lon)), altitude=Decimal(alt),
+                valor_gravidade=Decimal('978050.00000') + i, data_medicao=date(2024, 1, 1 + i),
+            )
+
+    @staticmethod
+    def trechos(resposta):
+        return {item.split(';')[0].strip(): item for item in resposta['Server-Timing'].split(',')}
+
+    @override_settings(INSTRUMENTACAO_ATIVA=True)
+    def test_server_timing_e_log(self):
+        """Testar que a lista informa consultas, banco e template no cabeçalho e no log"""
+        with self.assertLogs('medicoes.instrumentacao', 'INFO') as logs, CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('medicoes:medicao_lista'))
+        trechos = self.trechos(resposta)
+        self.assertIn('total', trechos)
+        self.assertIn('template', trechos)
+        self.assertIn(f'desc="{len(consultas)} consultas"', trechos['db'])
+
+        registro = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(registro['view'], 'medicoes:medicao_lista')
+        self.assertEqual(registro['consultas'], len(consultas))
+        self.assertIn('template', registro['trechos_ms'])
+
+    @override_settings(INSTRUMENTACAO_ATIVA=True)
+    def test_trechos_do_pdf(self):
+        """Testar que o PDF informa interpolação, contorno e renderização"""
+        estacao = MedicaoGravimetrica.objects.get(codigo_estacao='INS-0')
+        with self.assertLogs('medicoes.instrumentacao', 'INFO'):
+            resposta = self.client.get(reverse('medicoes:medicao_pdf', args=[estacao.pk]))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue({'rbf', 'contorno', 'pdf', 'template'} <= set(self.trechos(resposta)))
+
+    def test_desativada(self):
+        """Testar que desativada não há cabeçalho e os trechos não fazem nada"""
+        with override_settings(INSTRUMENTACAO_ATIVA=False):
+            resposta = self.client.get(reverse('medicoes:medicao_lista'))
+        self.assertNotIn('Server-Timing', resposta)
+        with instrumentacao.trecho('solto'):
+            pass
+
+
+class MetricasTest(TestCase):
+    """Testes das métricas Prometheus e do endpoint /metrics"""
+
+    @staticmethod
+    def valor(texto, serie):
+        for linha in texto.splitlines():
+            if linha.startswith(serie + ' '):
+                return float(linha.rsplit(' ', 1)[1])
+        return 0.0
+
+    def coletar(self, **extra):
+        resposta = self.client.get(reverse('medicoes:metricas'), **extra)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return resposta.content.decode()
+
+    def test_formato_do_histograma(self):
+        """Testar faixas cumulativas, soma, contagem e escape de rótulos"""
+        registro = metricas.Registro()
+        histograma = registro.histograma('teste_segundos', 'Teste', ('rota',), faixas=(0.1, 1.0))
+        for valor in (0.05, 0.1, 0.5, 3.0):
+            histograma.observar(valor, rota='a"b')
+        texto = registro.exposicao()
+        self.assertIn('# TYPE teste_segundos histogram', texto)
+        self.assertEqual(self.valor(texto, 'teste_segundos_bucket{rota="a\\"b",le="0.1"}'), 2)
+        self.assertEqual(self.valor(texto, 'teste_segundos_bucket{rota="a\\"b",le="1.0"}'), 3)
+        self.assertEqual(self.valor(texto, 'teste_segundos_bucket{rota="a\\"b",le="+Inf"}'), 4)
+        self.assertEqual(self.valor(texto, 'teste_segundos_count{rota="a\\"b"}'), 4)
+        self.assertAlmostEqual(self.valor(texto, 'teste_segundos_sum{rota="a\\"b"}'), 3.65)
+
+    def test_endpoint_e_metricas_da_aplicacao(self):
+        """Testar latência por rota, cache, bloqueios de login e o controle de acesso"""
+        serie_login = 'gravimeasure_http_requisicoes_total{view="medicoes:login",metodo="GET",status="200"}'
+        serie_cache = 'gravimeasure_cache_consultas_total{nome="teste",resultado="acerto"}'
+        antes = self.coletar()
+
+        self.client.get(reverse('medicoes:login'))
+        cache_dados.em_cache('teste', calcular=lambda: 1)
+        cache_dados.em_cache('teste', calcular=lambda: 1)
+        LoginAttempt.objects.create(identifier='alvo', failed_attempts=5, blocked_until=timezone.now() + timedelta(minutes=5))
+
+        depois = self.coletar()
+        self.assertEqual(self.valor(depois, serie_login) - self.valor(antes, serie_login), 1)
+        self.assertEqual(self.valor(depois, serie_cache) - self.valor(antes, serie_cache), 1)
+        self.assertEqual(self.valor(depois, 'gravimeasure_login_bloqueados'), 1)
+
+        self.assertEqual(self.client.get(reverse('medicoes:metricas'), REMOTE_ADDR='10.0.0.9').status_code, 403)
+        with override_settings(METRICAS_TOKEN='segredo'):
+            self.assertEqual(self.client.get(reverse('medicoes:metricas')).status_code, 403)
+            self.coletar(HTTP_AUTHORIZATION='Bearer segredo')
+
+    def test_soma_entre_processos(self):
+        """Testar que o endpoint soma os valores gravados por outro processo no METRICAS_DIR"""
+        serie = 'gravimeasure_importacao_linhas_total{resultado="sucesso"}'
+        with tempfile.TemporaryDirectory() as pasta, override_settings(METRICAS_DIR=pasta):
+            local = self.valor(self.coletar(), serie)
+            script = (
+                'import django; django.setup(); from django.conf import settings; '
+                'from medicoes.metricas import IMPORTACAO_LINHAS, REGISTRO; '
+                'IMPORTACAO_LINHAS.inc(40, resultado="sucesso"); REGISTRO.gravar(settings.METRICAS_DIR)'
+            )
+            subprocess.run(
+                [sys.executable, '-c', script], cwd=settings.BASE_DIR, check=True, timeout=120,
+                env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'gravimeasure.settings', 'METRICAS_DIR': pasta},
+            )
+            metricas.IMPORTACAO_LINHAS.inc(2, resultado='sucesso')
+            self.assertEqual(len(list(Path(pasta).glob('metricas-*.json'))), 2)
+            self.assertEqual(self.valor(self.coletar(), serie), local + 42)
+
+
+class SeedStationsTest(TestCase):
+    """Testes do gerador de estações sintéticas"""
+
+    def gerar(self, quantidade, **opcoes):
+        call_command('seed_stations', quantidade, batch_size=64, stdout=StringIO(), **opcoes)
+
+    def test_estacoes_plausiveis(self):
+        """Testar posições no Brasil, geohash, anomalia e observação inicial das estações geradas"""
+        versao = cache_dados.versao()
+        self.gerar(150, usuarios=3)
+
+        estacoes = MedicaoGravimetrica.objects.filter(codigo_estacao__startswith='SYN-')
+        self.assertEqual(estacoes.count(), 150)
+        self.assertEqual(ObservacaoGravimetrica.objects.filter(estacao__in=estacoes).count(), 150)
+        self.assertEqual(User.objects.filter(username__startswith='syn-operador-').count(), 3)
+        self.assertNotEqual(cache_dados.versao(), versao)
+
+        for estacao in estacoes.select_related('usuario'):
+            validar_coordenadas_brasil(estacao.latitude, estacao.longitude)
+            validar_gravidade_range(estacao.valor_gravidade)
+            self.assertEqual(estacao.geohash, espacial.geohash(estacao.latitude, estacao.longitude))
+            self.assertEqual(estacao.anomalia_bouguer, estacao.calcular_anomalia_bouguer(estacao.densidade_referencia))
+            self.assertIsNotNone(estacao.usuario)
+            observacao = estacao.historico.get()
+            self.assertEqual(observacao.valor_gravidade, estacao.valor_gravidade)
+            self.assertEqual(observacao.data_medicao, estacao.data_medicao)
+
+        # O campo sintético varia de uma região para outra, não é uma constante com ruído
+        anomalias_bouguer = np.array([float(a) for a in estacoes.values_list('anomalia_bouguer', flat=True)])
+        self.assertGreater(anomalias_bouguer.std(), 5)
+
+    def test_execucoes_seguidas_e_imagens(self):
+        """Testar que uma segunda execução continua a numeração e reaproveita as imagens geradas"""
+        with tempfile.TemporaryDirectory() as pasta, override_settings(MEDIA_ROOT=pasta):
+            self.gerar(10, prefixo='LOTE', imagens=2)
+            self.gerar(5, prefixo='LOTE')
+
+            codigos = list(MedicaoGravimetrica.objects.filter(codigo_estacao__startswith='LOTE-')
+                           .order_by('codigo_estacao').values_list('codigo_estacao', flat=True))
+            self.assertEqual(codigos, [f'LOTE-{i:07d}' for i in range(1, 16)])
+
+            # Com estações excluídas no meio, a numeração segue do maior código e não repete
+            MedicaoGravimetrica.objects.filter(codigo_estacao__in=['LOTE-0000003', 'LOTE-0000007']).delete()
+            MedicaoGravimetrica.objects.filter(codigo_estacao='LOTE-0000015').update(codigo_estacao='LOTE-0000150')
+            self.gerar(2, prefixo='LOTE')
+            self.assertEqual(
+                MedicaoGravimetrica.objects.filter(codigo_estacao__in=['LOTE-0000151', 'LOTE-0000152']).count(), 2,
+            )
+            fotos = set(MedicaoGravimetrica.objects.exclude(foto_estacao='').values_list('foto_estacao', flat=True))
+            self.assertEqual(len(fotos), 2)
+            self.assertTrue(all((Path(pasta) / foto).exists() for foto in fotos))
+
+
+class BenchmarkTest(TestCase):
+    """Testes da bancada de benchmarks dos caminhos críticos"""
+
+    def test_executar_e_comparar(self):
+        """Testar resultados por caso e tamanho, importação desfeita e detecção de regressão"""
+        from medicoes.management.commands import benchmark
+
+        casos = ('api_mapa', 'lista_filtros', 'importacao_excel', 'estatisticas_usuarios')
+        resultados = benchmark.executar([20, 40], 1, casos)
+
+        self.assertEqual([(r['caso'], r['tamanho']) for r in resultados], [(c, t) for t in (20, 40) for c in casos])
+        self.assertEqual(MedicaoGravimetrica.objects.count(), 40)
+        self.assertFalse(MedicaoGravimetrica.objects.filter(codigo_estacao__startswith='BENCHIMP-').exists())
+        importacao = next(r for r in resultados if r['caso'] == 'importacao_excel')
+        self.assertGreater(importacao['linhas_por_segundo'], 0)
+        self.assertIn('template', next(r for r in resultados if r['caso'] == 'lista_filtros')['trechos_ms'])
+        json.dumps(resultados)
+
+        anteriores = [{**r, 'mediana_ms': r['mediana_ms'] / 2} for r in resultados[:2]]
+        comparacao = benchmark.comparar(resultados, anteriores, tolerancia=0.2)
+        self.assertEqual(len(comparacao), 2)
+        self.assertTrue(all(regrediu for *_, regrediu in comparacao))
+        self.assertFalse(any(regrediu for *_, regrediu in benchmark.comparar(resultados, resultados, 0.2)))
+
+
+class CargaHttpTest(LiveServerTestCase):
+    """Testes do teste de carga contra um servidor de verdade"""
+
+    def test_jornadas_e_relatorio(self):
+        """Testar login, mapa, lista, detalhe e importação por HTTP e o relatório por rota"""
+        call_command('seed_stations', 20, stdout=StringIO())
+        User.objects.create_user(username='campo', email='campo@example.com', password='senha-campo-1')
+
+        estatisticas = carga.executar(
+            self.live_server_url, usuarios=1, duracao=1.5, credenciais=[('campo', 'senha-campo-1')],
+            cenarios=['lista', 'detalhe', 'importacao'], pausa=(0, 0.01),
+        )
+        relatorio = {linha['rota']: linha for linha in estatisticas.relatorio()}
+
+        for rota in ('login POST', 'home', 'medicoes_api', 'total'):
+            self.assertIn(rota, relatorio)
+        self.assertEqual(relatorio['total']['falhas'], 0)
+        self.assertTrue({'medicao_lista', 'medicao_detail', 'importar_excel POST'} & set(relatorio))
+        self.assertLessEqual(relatorio['total']['p50_ms'], relatorio['total']['p99_ms'])
+        if 'importar_excel POST' in relatorio:
+            self.assertTrue(MedicaoGravimetrica.objects.filter(codigo_estacao__startswith='CARGA-0-').exists())
+
+    def test_credenciais_erradas(self):
+        """Testar que um login recusado conta como falha e encerra o usuário virtual"""
+        estatisticas = carga.executar(self.live_server_url, 1, 5, [('ninguem', 'errada')], pausa=(0, 0))
+        relatorio = {linha['rota']: linha for linha in estatisticas.relatorio()}
+        self.assertEqual(relatorio['login POST']['falhas'], 1)
+        self.assertNotIn('home', relatorio)
+
+
+class LimiteLoginTest(TestCase):
+    """Testes do limite de tentativas de login no cache"""
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='campo', email='campo@example.com', password='senha-certa-1')
+
+    def entrar(self, username='campo', password='errada', ip='10.0.0.1'):
+        return self.client.post(reverse('medicoes:login'), {'username': username, 'password': password}, REMOTE_ADDR=ip)
+
+    def mensagens(self, resposta):
+        return [str(m) for m in resposta.context['messages']]
+
+    def test_bloqueio_so_grava_no_banco_ao_bloquear(self):
+        """Testar 5 falhas para bloquear, sem escrita em LoginAttempt antes do bloqueio"""
+        with CaptureQueriesContext(connection) as consultas:
+            for _ in range(4):
+                resposta = self.entrar()
+        self.assertIn('Credenciais incorretas. (1 tentativas restantes)', self.mensagens(resposta))
+        self.assertFalse(LoginAttempt.objects.exists())
+        escritas = [q['sql'] for q in consultas if 'loginattempt' in q['sql'].lower() and not q['sql'].startswith('SELECT')]
+        self.assertEqual(escritas, [])
+
+        resposta = self.entrar()
+        self.assertIn('Muitas tentativas falhadas. Bloqueado por 15 minutos.', self.mensagens(resposta))
+        registro = LoginAttempt.objects.get(identifier='campo')
+        self.assertGreater(registro.blocked_until, timezone.now() + timedelta(minutes=14))
+
+        # Bloqueado, nem a senha certa entra; e o bloqueio vale mesmo sem o cache
+        cache.clear()
+        resposta = self.entrar(password='senha-certa-1')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('Conta bloqueada temporariamente. Tente novamente mais tarde.', self.mensagens(resposta))
+
+    def test_sucesso_zera_o_identificador(self):
+        """Testar que um login certo zera as falhas do identificador"""
+        for _ in range(4):
+            self.entrar()
+        self.assertEqual(self.entrar(password='senha-certa-1').status_code, 302)
+        self.client.logout()
+        for _ in range(4):
+            resposta = self.entrar()
+        self.assertIn('Credenciais incorretas. (1 tentativas restantes)', self.mensagens(resposta))
+        self.assertFalse(LoginAttempt.objects.exists())
+
+    @override_settings(LOGIN_MAX_TENTATIVAS_IP=3)
+    def test_limite_por_ip(self):
+        """Testar bloqueio do IP que tenta vários identificadores diferentes"""
+        for nome in ('a', 'b', 'c'):
+            self.entrar(username=nome)
+        self.assertTrue(LoginAttempt.objects.filter(identifier='ip:10.0.0.1', blocked_until__isnull=False).exists())
+
+        resposta = self.entrar(password='senha-certa-1')
+        self.assertIn('Conta bloqueada temporariamente. Tente novamente mais tarde.', self.mensagens(resposta))
+        self.assertEqual(self.entrar(password='senha-certa-1', ip='10.0.0.2').status_code, 302)
+
+    def test_janela_deslizante(self):
+        """Testar que falhas da janela anterior pesam pela fração que ainda cabe na janela"""
+        janela = settings.LOGIN_JANELA_SEGUNDOS
+        inicio = (int(time.time() // janela) + 10) * janela
+        with mock.patch('medicoes.limite_login.time.time', return_value=inicio + 1):
+            for _ in range(4):
+                limite_login.registrar_falha('campo')
+        with mock.patch('medicoes.limite_login.time.time', return_value=inicio + 1.5 * janela):
+            self.assertAlmostEqual(limite_login.tentativas(limite_login.IDENTIFICADOR, 'campo'), 2)
+            restantes, bloqueio = limite_login.registrar_falha('campo')
+            self.assertEqual((restantes, bloqueio), (2, None))
+        with mock.patch('medicoes.limite_login.time.time', return_value=inicio + 2.5 * janela):
+            self.assertAlmostEqual(limite_login.tentativas(limite_login.IDENTIFICADOR, 'campo'), 0.5)
+
+    def test_fim_do_bloqueio_nao_reaproveita_falhas(self):
+        """Testar que, vencido o bloqueio, uma falha só não bloqueia de novo"""
+        janela = settings.LOGIN_JANELA_SEGUNDOS
+        inicio = (int(time.time() // janela) + 10) * janela
+        with mock.patch('medicoes.limite_login.time.time', return_value=inicio + 1):
+            for _ in range(5):
+                restantes, bloqueio = limite_login.registrar_falha('campo')
+        self.assertIsNotNone(bloqueio)
+
+        LoginAttempt.objects.update(blocked_until=timezone.now() - timedelta(seconds=1))
+        with mock.patch('medicoes.limite_login.time.time', return_value=inicio + janela + 2):
+            self.assertIsNone(limite_login.bloqueado_ate('campo'))
+            self.assertEqual(limite_login.registrar_falha('campo'), (4, None))
+
+    def test_consulta_ao_banco_fica_no_cache(self):
+        """Testar que o banco só é consultado quando falta a marca no cache, com ou sem bloqueio"""
+        with self.assertNumQueries(1):
+            self.assertIsNone(limite_login.bloqueado_ate('campo', '10.0.0.1'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(limite_login.bloqueado_ate('campo', '10.0.0.1'))
+
+        for _ in range(5):
+            limite_login.registrar_falha('campo', '10.0.0.1')
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(limite_login.bloqueado_ate('campo', '10.0.0.1'))
+
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(limite_login.bloqueado_ate('Campo', '10.0.0.1'))
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(limite_login.bloqueado_ate('campo', '10.0.0.1'))
+
+    def test_bloqueio_de_outro_worker(self):
+        """Testar que a ausência de bloqueio só fica no cache por LIVRE_SEGUNDOS"""
+        self.assertIsNone(limite_login.bloqueado_ate('campo'))
+        # Outro worker (com cache próprio) bloqueia e grava só no banco
+        LoginAttempt.objects.create(identifier='campo', blocked_until=timezone.now() + timedelta(minutes=10))
+        self.assertIsNone(limite_login.bloqueado_ate('campo'))
+        depois = time.time() + limite_login.LIVRE_SEGUNDOS + 1
+        with mock.patch('medicoes.limite_login.time.time', return_value=depois):
+            self.assertIsNotNone(limite_login.bloqueado_ate('campo'))
+
+    def test_limpeza(self):
+        """Testar que prune_login_attempts remove só registros vencidos"""
+        agora = timezone.now()
+        LoginAttempt.objects.bulk_create([
+            LoginAttempt(identifier='antigo'),
+            LoginAttempt(identifier='vencido', blocked_until=agora - timedelta(days=9)),
+            LoginAttempt(identifier='ativo', blocked_until=agora + timedelta(minutes=5)),
+            LoginAttempt(identifier='recente'),
+        ])
+        LoginAttempt.objects.exclude(identifier='recente').update(last_attempt=agora - timedelta(days=10))
+
+        saida = StringIO()
+        call_command('prune_login_attempts', dry_run=True, stdout=saida)
+        self.assertIn('2 registros', saida.getvalue())
+        call_command('prune_login_attempts', stdout=StringIO())
+        self.assertEqual(
+            set(LoginAttempt.objects.values_list('identifier', flat=True)), {'ativo', 'recente'},
+        )
+        with self.assertRaises(CommandError):
+            call_command('prune_login_attempts', lote=0, stdout=StringIO())
+
+
+class AutenticacaoEmailTest(TestCase):
+    """Testes do backend de autenticação por username ou email"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='campo', email='campo@example.com', password='senha-certa-1')
+        autenticacao._hash_ficticio()  # calculado uma vez por processo, fora das contagens
+
+    def autenticar(self, identificador, senha):
+        from django.contrib.auth import authenticate
+        from django.contrib.auth.hashers import get_hasher
+
+        hasher = type(get_hasher())
+        with mock.patch.object(hasher, 'encode', autospec=True, side_effect=hasher.encode) as encode, \
+                CaptureQueriesContext(connection) as consultas:
+            usuario = authenticate(username=identificador, password=senha)
+        return usuario, encode.call_count, len(consultas)
+
+    def test_username_e_email(self):
+        """Testar login por username e por email com uma consulta"""
+        for identificador in ('campo', 'campo@example.com'):
+            usuario, hashes, consultas = self.autenticar(identificador, 'senha-certa-1')
+            self.assertEqual(usuario, self.usuario)
+            self.assertEqual((hashes, consultas), (1, 1))
+
+    def test_falhas_custam_um_hash(self):
+        """Testar que email com senha errada e conta inexistente verificam um hash só"""
+        for identificador in ('campo@example.com', 'campo', 'ninguem@example.com', 'ninguem'):
+            usuario, hashes, consultas = self.autenticar(identificador, 'errada')
+            self.assertIsNone(usuario)
+            self.assertEqual((hashes, consultas), (1, 1), identificador)
+
+    def test_username_tem_prioridade_e_inativo(self):
+        """Testar que o username é tentado antes de um email igual de outra conta e que inativos não entram"""
+        outro = User.objects.create_user(username='campo@example.org', email='x@example.com', password='outra-senha-1')
+        User.objects.filter(pk=self.usuario.pk).update(email='campo@example.org')
+        self.assertEqual(self.autenticar('campo@example.org', 'outra-senha-1'), (outro, 1, 1))
+        # A dona do email também entra com a própria senha
+        self.assertEqual(self.autenticar('campo@example.org', 'senha-certa-1'), (self.usuario, 2, 1))
+        self.assertEqual(self.autenticar('campo@example.org', 'errada')[:2], (None, 2))
+
+        User.objects.filter(pk=outro.pk).update(is_active=False)
+        self.assertIsNone(self.autenticar('campo@example.org', 'outra-senha-1')[0])
+
+    def test_login_view_por_email(self):
+        """Testar a tela de login com email"""
+        resposta = self.client.post(reverse('medicoes:login'), {'username': 'campo@example.com', 'password': 'senha-certa-1'})
+        self.assertRedirects(resposta, reverse('medicoes:home'), fetch_redirect_response=False)
+
+
+class FilaEmailTest(TestCase):
+    """Testes da fila de saída de emails e do worker send_queued_emails"""
+
+    def test_cadastro_enfileira(self):
+        """Testar que o cadastro grava o email na fila e só o worker o envia"""
+        resposta = self.client.post(reverse('medicoes:signup'), {
+            'email': 'novo@example.com', 'first_name': 'Nova', 'user_type': 'viewer', 'role_category': 'student',
+            'password1': 'Senha#Forte123', 'password2': 'Senha#Forte123',
+        })
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(mail.outbox, [])
+        email = EmailEnfileirado.objects.get()
+        self.assertEqual((email.destinatarios, email.status), (['novo@example.com'], EmailEnfileirado.PENDENTE))
+        self.assertIn('/activate/', email.corpo_html)
+        self.assertNotIn('<', email.corpo)
+        self.assertNotIn('font-family', email.corpo)
+
+        call_command('send_queued_emails', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['novo@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailEnfileirado.ENVIADO)
+        self.assertIsNotNone(email.enviado_em)
+
+    def test_lote_usa_uma_conexao(self):
+        """Testar que um lote abre uma conexão só e respeita o tamanho e a ordem"""
+        for i in range(5):
+            fila_email.enfileirar(f'Aviso {i}', 'corpo', [f'u{i}@example.com'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', autospec=True) as abrir:
+            resultado = fila_email.enviar_lote(3)
+        self.assertEqual(abrir.call_count, 1)
+        self.assertEqual(resultado, {'enviados': 3, 'adiados': 0, 'desistidos': 0})
+        self.assertEqual([m.subject for m in mail.outbox], ['Aviso 0', 'Aviso 1', 'Aviso 2'])
+        self.assertEqual(fila_email.enviar_lote(10)['enviados'], 2)
+        self.assertEqual(fila_email.enviar_lote(10)['enviados'], 0)
+
+    def test_reserva_exclusiva(self):
+        """Testar que um email reservado não é entregue a outro worker"""
+        fila_email.enfileirar('Aviso', 'corpo', ['a@example.com'])
+        self.assertEqual(len(fila_email.reservar(10)), 1)
+        self.assertEqual(fila_email.reservar(10), [])
+
+    @override_settings(EMAIL_FILA_MAX_TENTATIVAS=3, EMAIL_FILA_ESPERA_SEGUNDOS=60)
+    def test_falhas_espera_e_desistencia(self):
+        """Testar a espera exponencial após falhas e a desistência no limite de tentativas"""
+        email = fila_email.enfileirar('Aviso', 'corpo', ['a@example.com'])
+        enviar = mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('recusado'))
+
+        esperas = []
+        for tentativa in (1, 2, 3):
+            EmailEnfileirado.objects.filter(pk=email.pk).update(proxima_tentativa=timezone.now())
+            antes = timezone.now()
+            with enviar, self.assertLogs('medicoes.fila_email', 'WARNING'):
+                resultado = fila_email.enviar_lote(1)
+            email.refresh_from_db()
+            self.assertEqual(email.tentativas, tentativa)
+            self.assertEqual(email.ultimo_erro, 'recusado')
+            if tentativa < 3:
+                self.assertEqual(resultado['adiados'], 1)
+                esperas.append((email.proxima_tentativa - antes).total_seconds())
+        self.assertEqual(resultado['desistidos'], 1)
+        self.assertEqual(email.status, EmailEnfileirado.FALHOU)
+        self.assertTrue(60 <= esperas[0] < 67 and 120 <= esperas[1] < 133, esperas)
+
+        # O email que falhou não trava o resto da fila
+        outro = fila_email.enfileirar('Outro', 'corpo', ['b@example.com'])
+        self.assertEqual(fila_email.enviar_lote()['enviados'], 1)
+        self.assertEqual(mail.outbox[0].subject, outro.assunto)
+
+    def test_falha_na_conexao_adia_o_lote(self):
+        """Testar que sem servidor de email o lote inteiro é adiado"""
+        for i in range(3):
+            fila_email.enfileirar(f'Aviso {i}', 'corpo', ['a@example.com'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('sem rede')), \
+                self.assertLogs('medicoes.fila_email', 'WARNING'):
+            self.assertEqual(fila_email.enviar_lote(), {'enviados': 0, 'adiados': 3, 'desistidos': 0})
+        self.assertEqual(set(EmailEnfileirado.objects.values_list('tentativas', flat=True)), {1})
+        self.assertEqual(mail.outbox, [])
+
+
+class LimpezaTest(TestCase):
+    """Testes das tarefas de limpeza e do comando housekeeping"""
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.pasta, ignore_errors=True)
+
+    def envelhecer(self, caminho, horas):
+        antigo = time.time() - horas * 3600
+        os.utime(caminho, (antigo, antigo))
+
+    def test_registros_em_lotes(self):
+        """Testar a remoção em lotes de pré-cadastros, tentativas e emails vencidos"""
+        antigo = timezone.now() - timedelta(days=8)
+        for i in range(5):
+            PendingRegistration.objects.create(email=f'p{i}@example.com', token=f't{i}', data={})
+        PendingRegistration.objects.filter(email__in=['p0@example.com', 'p1@example.com', 'p2@example.com']).update(created_at=antigo)
+        LoginAttempt.objects.create(identifier='velho')
+        LoginAttempt.objects.create(identifier='bloqueado', blocked_until=timezone.now() + timedelta(minutes=5))
+        LoginAttempt.objects.filter(identifier__in=['velho', 'bloqueado']).update(last_attempt=antigo)
+        LoginAttempt.objects.create(identifier='recente')
+        enviado = fila_email.enfileirar('Aviso', 'corpo', ['a@example.com'])
+        fila_email.enfileirar('Pendente', 'corpo', ['a@example.com'])
+        EmailEnfileirado.objects.filter(pk=enviado.pk).update(
+            status=EmailEnfileirado.ENVIADO, enviado_em=timezone.now() - timedelta(days=31),
+        )
+
+        tarefas = ['registros_pendentes', 'tentativas_login', 'emails_enviados']
+        saida = StringIO()
+        call_command('housekeeping', tarefas=tarefas, dry_run=True, stdout=saida)
+        self.assertIn('registros_pendentes: 3 seriam removidos', saida.getvalue())
+        self.assertEqual(PendingRegistration.objects.count(), 5)
+
+        with CaptureQueriesContext(connection) as consultas:
+            removidos = limpeza.limpar_registros_pendentes(lote=2)
+        self.assertEqual(removidos, 3)
+        self.assertEqual(sum('DELETE' in c['sql'] for c in consultas.captured_queries), 2)
+
+        saida = StringIO()
+        call_command('housekeeping', tarefas=tarefas, lote=2, stdout=saida)
+        self.assertIn('tentativas_login: 1 removidos', saida.getvalue())
+        self.assertIn('emails_enviados: 1 removidos', saida.getvalue())
+        self.assertEqual(PendingRegistration.objects.count(), 2)
+        self.assertEqual(set(LoginAttempt.objects.values_list('identifier', flat=True)), {'bloqueado', 'recente'})
+        self.assertEqual(list(EmailEnfileirado.objects.values_list('assunto', flat=True)), ['Pendente'])
+
+    def test_midia_orfa(self):
+        """Testar que só fotos e croquis antigos sem estação são removidos"""
+        with override_settings(MEDIA_ROOT=self.pasta):
+            estacao = MedicaoGravimetrica.objects.create(
+                codigo_estacao='LIMP-1', nome_estacao='Limpeza', latitude=Decimal('-15'), longitude=Decimal('-47'),
+                valor_gravidade=Decimal('978100'), data_medicao=date(2020, 1, 1), foto_estacao='estacoes/2020/01/usada.png',
+            )
+            for nome in ('estacoes/2020/01/usada.png', 'estacoes/2020/01/orfa.png', 'croquis/2020/01/orfa.png',
+                         'estacoes/2020/01/recente.png', 'outros/antigo.png'):
+                caminho = Path(self.pasta, nome)
+                caminho.parent.mkdir(parents=True, exist_ok=True)
+                caminho.write_bytes(b'png')
+                if 'recente' not in nome:
+                    self.envelhecer(caminho, 48)
+
+            self.assertEqual(limpeza.limpar_midia_orfa(simular=True), 2)
+            self.assertEqual(limpeza.limpar_midia_orfa(), 2)
+            restantes = sorted(str(p.relative_to(self.pasta)) for p in Path(self.pasta).rglob('*.png'))
+        self.assertEqual(restantes, ['estacoes/2020/01/recente.png', 'estacoes/2020/01/usada.png', 'outros/antigo.png'])
+        self.assertTrue(estacao.foto_estacao)
+
+    def test_relatorios_e_cache_em_arquivo(self):
+        """Testar a remoção de HTML de relatórios antigos e de entradas vencidas do cache em arquivo"""
+        relatorios = Path(self.pasta, limpeza.PASTA_RELATORIOS)
+        relatorios.mkdir()
+        (relatorios / 'medicao_1.html').write_text('velho')
+        (relatorios / 'medicao_2.html').write_text('novo')
+        self.envelhecer(relatorios / 'medicao_1.html', 48)
+
+        arquivo = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(Path(self.pasta, 'cache')),
+        }}
+        with override_settings(BASE_DIR=Path(self.pasta), CACHES=arquivo):
+            from django.core.cache import caches
+            caches['default'].set('vencida', 1, 1)
+            caches['default'].set('valida', 2, 300)
+            with mock.patch('time.time', return_value=time.time() + 5):
+                self.assertEqual(limpeza.limpar_relatorios(simular=True), 2)
+                self.assertEqual(limpeza.limpar_relatorios(), 2)
+            self.assertEqual(len(list(Path(self.pasta, 'cache').iterdir())), 1)
+            self.assertEqual(caches['default'].get('valida'), 2)
+        self.assertEqual([p.name for p in relatorios.iterdir()], ['medicao_2.html'])
+
+
+class ProvisionamentoTest(TestCase):
+    """Testes do cadastro em lote por CSV com convites"""
+
+    def setUp(self):
+        AreaOfExpertise.objects.create(key='geosciences', label='Geociências')
+        AreaOfExpertise.objects.create(key='physics', label='Física')
+        User.objects.create_user(username='ana', email='ana@antiga.org', password='x')
+        User.objects.create_user(username='ana1', email='ana1@antiga.org', password='x')
+
+    def csv(self, *linhas, cabecalho='email,first_name,role_category,areas,organization'):
+        arquivo = Path(tempfile.mkdtemp(), 'usuarios.csv')
+        self.addCleanup(shutil.rmtree, arquivo.parent, ignore_errors=True)
+        arquivo.write_text('\n'.join((cabecalho,) + linhas), encoding='utf-8')
+        return str(arquivo)
+
+    def test_erros_nao_gravam_nada(self):
+        """Testar que um arquivo com erros é recusado inteiro, com o número de cada linha"""
+        arquivo = self.csv(
+            'ok@uni.br,Ok,student,physics,UNI',
+            'sem-arroba,X,student,,UNI',
+            'ok@uni.br,Repetido,student,,UNI',
+            'b@uni.br,B,astronauta,quimica,UNI',
+        )
+        erros = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('provision_users', arquivo, stdout=StringIO(), stderr=erros)
+        self.assertIn('Linha 3: email inválido', erros.getvalue())
+        self.assertIn('Linha 4: email repetido', erros.getvalue())
+        self.assertIn('Linha 5: categoria desconhecida', erros.getvalue())
+        self.assertIn('Linha 5: áreas desconhecidas: quimica', erros.getvalue())
+        self.assertFalse(User.objects.filter(email__endswith='@uni.br').exists())
+
+    def test_usernames_alocados_em_uma_consulta(self):
+        """Testar a alocação de usernames do lote sem colidir com o banco nem entre si"""
+        with self.assertNumQueries(1):
+            usernames = provisionamento.alocar_usernames(['ana@uni.br', 'joao@uni.br', 'ana@outra.br', 'a+b@uni.br'])
+        self.assertEqual(usernames, ['ana2', 'joao', 'ana3', 'a+b'])
+
+    def test_cadastro_em_lote(self):
+        """Testar usuários, áreas e convites criados em poucas consultas"""
+        linhas = [f'aluno{i}@uni.br,Aluno {i},Estudante,geosciences;Física,UNI' for i in range(60)]
+        arquivo = self.csv('ana@antiga.org,Ana,academic,,UNI', 'ana@uni.br,Ana,student,,UNI', *linhas)
+
+        saida = StringIO()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('provision_users', arquivo, lote=25, url_base='https://grav.example', stdout=saida)
+        self.assertLess(len(consultas), 25)
+        self.assertIn('61 usuários criados, 61 convites enfileirados', saida.getvalue())
+        self.assertIn('Já cadastrado, ignorado: ana@antiga.org', saida.getvalue())
+
+        aluno = User.objects.get(email='aluno7@uni.br')
+        self.assertEqual((aluno.username, aluno.role_category, aluno.organization), ('aluno7', 'student', 'UNI'))
+        self.assertEqual(set(aluno.areas.values_list('key', flat=True)), {'geosciences', 'physics'})
+        self.assertFalse(aluno.has_usable_password())
+        self.assertEqual(User.objects.get(email='ana@uni.br').username, 'ana2')
+
+        convite = EmailEnfileirado.objects.get(destinatarios=['aluno7@uni.br'])
+        self.assertIn('https://grav.example/convite/', convite.corpo_html)
+        self.assertIn('aluno7', convite.corpo)
+        self.assertEqual(mail.outbox, [])
+
+    def test_convite_define_senha(self):
+        """Testar o link do convite: define a senha uma vez e depois permite o login"""
+        provisionamento.provisionar(provisionamento.ler_csv(StringIO('email\nnova@uni.br'))[0], 'http://testserver')
+        corpo = EmailEnfileirado.objects.get().corpo
+        link = re.search(r'http://testserver(/convite/\S+/)', corpo).group(1)
+
+        # O token sai da URL antes de o formulário ser exibido
+        token = link.rstrip('/').rsplit('/', 1)[1]
+        resposta = self.client.get(link)
+        sem_token = link.replace(token, 'definir-senha')
+        self.assertRedirects(resposta, sem_token, fetch_redirect_response=False)
+        self.assertContains(self.client.get(sem_token), 'nova@uni.br')
+        self.assertEqual(Client().get(sem_token).status_code, 302)
+
+        resposta = self.client.post(sem_token, {'new_password1': 'Nova#Senha2024', 'new_password2': 'Nova#Senha2024'})
+        self.assertRedirects(resposta, reverse('medicoes:login'), fetch_redirect_response=False)
+        self.assertTrue(self.client.login(username='nova@uni.br', password='Nova#Senha2024'))
+
+        self.client.logout()
+        for url in (link, sem_token):
+            resposta = self.client.post(url, {'new_password1': 'Outra#Senha2024', 'new_password2': 'Outra#Senha2024'})
+            self.assertRedirects(resposta, reverse('medicoes:login'), fetch_redirect_response=False)
+        self.assertTrue(User.objects.get(email='nova@uni.br').check_password('Nova#Senha2024'))
+
+    def test_emails_existentes_sem_diferenciar_maiusculas(self):
+        """Testar que contas e pré-cadastros com o mesmo email em outra caixa são ignorados"""
+        PendingRegistration.objects.create(email='pendente@uni.br', token='t', data={})
+        linhas, _ = provisionamento.ler_csv(StringIO('email\nAna@Antiga.org\nPendente@UNI.br\nnova@uni.br'))
+        resultado = provisionamento.provisionar(linhas, 'http://testserver', convidar=False)
+
+        self.assertEqual([u.email for u in resultado['criados']], ['nova@uni.br'])
+        self.assertEqual(resultado['existentes'], ['Ana@antiga.org', 'Pendente@uni.br'])
+        self.assertEqual(User.objects.filter(email__iexact='ana@antiga.org').count(), 1)
+
+    @override_settings(CONVITE_DIAS=-1)
+    def test_convite_expirado(self):
+        """Testar que o link do convite expira após CONVITE_DIAS"""
+        usuario = provisionamento.provisionar(
+            provisionamento.ler_csv(StringIO('email\nvelha@uni.br'))[0], 'http://testserver', convidar=False,
+        )['criados'][0]
+        self.assertFalse(provisionamento.token_convite.check_token(usuario, provisionamento.token_convite.make_token(usuario)))
+
+    def test_upload_no_admin(self):
+        """Testar a importação de CSV pelo admin"""
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='x')
+        self.client.force_login(admin)
+        url = reverse('admin:medicoes_customuser_importar_csv')
+        self.assertContains(self.client.get(reverse('admin:medicoes_customuser_changelist')), url)
+
+        with open(self.csv('prof@uni.br;Prof;Acadêmico;physics;UNI', cabecalho='email;first_name;role_category;areas;organization'), 'rb') as arquivo:
+            resposta = self.client.post(url, {'arquivo': arquivo, 'convidar': 'on'})
+        self.assertRedirects(resposta, reverse('admin:medicoes_customuser_changelist'), fetch_redirect_response=False)
+        self.assertEqual(User.objects.get(email='prof@uni.br').role_category, 'academic')
+        self.assertEqual(EmailEnfileirado.objects.count(), 1)
+
+
+class TempoImportacaoTest(unittest.TestCase):
+    """Testes do custo de inicialização (python -X importtime)"""
+
+    PACOTES_PESADOS = ('pandas', 'matplotlib', 'scipy', 'weasyprint', 'xhtml2pdf')
+
+    def test_urlconf_sem_bibliotecas_pesadas(self):
+        """Testar que carregar o Django, as URLs e as views não importa as bibliotecas científicas pesadas"""
+        script = (
+            'import json, sys, django; django.setup(); import gravimeasure.urls, medicoes.views; '
+            f'print(json.dumps([p for p in {self.PACOTES_PESADOS!r} if p in sys.modules]))'
+        )
+        resultado = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=120,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'gravimeasure.settings'},
+        )
+        self.assertEqual(resultado.returncode, 0, resultado.stderr[-2000:])
+        self.assertEqual(json.loads(resultado.stdout), [])
+
+        cumulativo = {}
+        for linha in resultado.stderr.splitlines():
+            partes = linha.split('|')
+            if len(partes) == 3 and partes[1].strip().isdigit():
+                cumulativo[partes[2].strip()] = int(partes[1])
+        # O tempo varia com a máquina: só informado, não é critério do teste
+        # (antes dos imports tardios, medicoes.views sozinho levava ~1,2 s)
+        if 'medicoes.views' in cumulativo:
+            sys.stderr.write(f"\nimport de medicoes.views: {cumulativo['medicoes.views'] / 1000:.0f} ms ... ")
+
+
+@unittest.skipUnless(settings.USA_POSTGIS, 'Requer DB_ENGINE=postgis')
+class PostgisTest(TestCase):
+    """Testes da coluna geométrica do PostGIS (as consultas de ConsultasEspaciaisTest também passam por ela)"""
+
+    def test_ponto_sincronizado(self):
+        """Testar que o trigger mantém o ponto igual à latitude/longitude"""
+        estacao = MedicaoGravimetrica.objects.create(
+            nome_estacao='Brasília', codigo_estacao='PG-001',
+            latitude=Decimal('-15.793889'), longitude=Decimal('-47.882778'),
+            valor_gravidade=Decimal('978100.00000'), data_medicao=date(2024, 1, 1),
+        )
+        # A coluna fica fora do modelo (migração 0015); lida por SQL como em medicoes.espacial
+        ponto = MedicaoGravimetrica.objects.filter(pk=estacao.pk).annotate(
+            x=RawSQL('ST_X(ponto)', (), output_field=FloatField()),
+            y=RawSQL('ST_Y(ponto)', (), output_field=FloatField()),
+        )
+        x, y = ponto.values_list('x', 'y').get()
+        self.assertAlmostEqual(x, -47.882778)
+        self.assertAlmostEqual(y, -15.793889)
+
+        MedicaoGravimetrica.objects.filter(pk=estacao.pk).update(latitude=Decimal('-16'))
+        self.assertAlmostEqual(ponto.values_list('y', flat=True).get(), -16)
+
+    def test_post_migrate_recria_trigger(self):
+        """Testar que o post_migrate repõe o trigger e preenche o ponto de um banco sem ele"""
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER medicoes_ponto_sincronizado ON medicoes_medicaogravimetrica')
+        estacao = MedicaoGravimetrica.objects.create(
+            nome_estacao='Goiânia', codigo_estacao='PG-002',
+            latitude=Decimal('-16.7'), longitude=Decimal('-49.3'),
+            valor_gravidade=Decimal('978100.00000'), data_medicao=date(2024, 1, 1),
+        )
+        espacial.garantir_ponto_postgis()
+        espacial.garantir_ponto_postgis()  # idempotente
+
+        y = MedicaoGravimetrica.objects.filter(pk=estacao.pk).annotate(
+            y=RawSQL('ST_Y(ponto)', (), output_field=FloatField()),
+        ).values_list('y', flat=True).get()
+        self.assertAlmostEqual(y, -16.7)
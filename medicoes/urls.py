@@ -9,6 +9,7 @@ urlpatterns = [
     path('signup/', views.signup_view, name='signup'),
     path('email-confirmation/', views.email_confirmation_view, name='email_confirmation'),
     path('activate/<uidb64>/<token>/', views.activate_account, name='activate'),
+    path('convite/<uidb64>/<token>/', views.aceitar_convite, name='aceitar_convite'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('profile/', views.profile_view, name='profile'),
@@ -27,6 +28,8 @@ urlpatterns = [
     
     # API
     path('api/dados-mapa/', views.medicoes_api, name='medicoes_api'),
+    path('api/estacoes-proximas/', views.estacoes_proximas_api, name='estacoes_proximas_api'),
+    path('metrics', views.metricas_view, name='metricas'),
     
     # Medições
     path('medicoes/', views.MedicaoListView.as_view(), name='medicao_lista'),
@@ -3,5 +3,6 @@
 from .autenticacaoview import *
 from .importarexcelview import *
 from .mapacontornoview import *
+from .metricasview import *
 from .medicoesview import *
 from .privacyview import *
\ No newline at end of file
@@ -13,14 +13,19 @@ from django.urls import reverse_lazy
 from django.utils import timezone
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
 from django.conf import settings
 
-from ..models import CustomUser, PendingRegistration, AreaOfExpertise, LoginAttempt
-from ..forms import SignUpForm, LoginForm, UserProfileForm
+from ..models import CustomUser, PendingRegistration, AreaOfExpertise
+from ..forms import SignUpForm, LoginForm, UserProfileForm, DefinirSenhaConviteForm
+from .. import fila_email, limite_login
+from ..provisionamento import token_convite
 
 logger = logging.getLogger(__name__)
 
+# Segmento da URL do convite depois que o token foi guardado na sessão
+TOKEN_CONVITE_NA_SESSAO = 'definir-senha'
+SESSAO_TOKEN_CONVITE = '_token_convite'
+
 @require_http_methods(["GET", "POST"])
 def signup_view(request):
     """Página de registro de novo usuário com pré-cadastro pendente"""
@@ -61,13 +66,8 @@ def signup_view(request):
                 'activation_link': activation_link,
             })
             
-            try:
-                send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [email], fail_silently=False, html_message=message)
-            except Exception as e:
-                pending.delete()
-                form.add_error(None, 'Falha ao enviar email de ativação. Verifique o endereço e tente novamente.')
-                logger.exception(f'Erro ao enviar email para {email}: {str(e)}')
-                return render(request, 'medicoes/signup.html', {'form': form})
+            # O envio fica para o worker (send_queued_emails); a resposta não espera o SMTP
+            fila_email.enfileirar(subject, fila_email.texto_simples(message), [email], corpo_html=message)
 
             return redirect(f'{reverse_lazy("medicoes:email_confirmation")}?email={email}')
         else:
@@ -92,42 +92,28 @@ def login_view(request):
             username_or_email = form.cleaned_data.get('username')
             password = form.cleaned_data.get('password')
             
-            attempt_record, _ = LoginAttempt.objects.get_or_create(identifier=username_or_email)
+            ip = request.META.get('REMOTE_ADDR')
             
-            if attempt_record.blocked_until and timezone.now() < attempt_record.blocked_until:
+            # Falhas contam no cache; o banco só é gravado quando há bloqueio
+            if limite_login.bloqueado_ate(username_or_email, ip):
                 messages.error(request, 'Conta bloqueada temporariamente. Tente novamente mais tarde.')
                 return render(request, 'medicoes/login.html', {'form': form})
             
-            if attempt_record.blocked_until and timezone.now() >= attempt_record.blocked_until:
-                attempt_record.failed_attempts = 0
-                attempt_record.blocked_until = None
-                attempt_record.save()
-            
-            user = authenticate(username=username_or_email, password=password)
-            
-            if user is None and '@' in username_or_email:
-                try:
-                    user_obj = CustomUser.objects.get(email=username_or_email)
-                    user = authenticate(username=user_obj.username, password=password)
-                except CustomUser.DoesNotExist:
-                    pass
+            # EmailOuUsuarioBackend aceita username ou email numa consulta só
+            user = authenticate(request, username=username_or_email, password=password)
             
             if user is not None:
-                attempt_record.failed_attempts = 0
-                attempt_record.blocked_until = None
-                attempt_record.save()
+                limite_login.registrar_sucesso(username_or_email)
                 login(request, user)
                 messages.success(request, f'Bem-vindo, {user.first_name or user.username}!')
                 return redirect('medicoes:home')
             else:
-                attempt_record.failed_attempts += 1
-                if attempt_record.failed_attempts >= 5:
-                    attempt_record.blocked_until = timezone.now() + timedelta(minutes=15)
-                    messages.error(request, 'Muitas tentativas falhadas. Bloqueado por 15 minutos.')
+                remaining, bloqueio = limite_login.registrar_falha(username_or_email, ip)
+                if bloqueio:
+                    minutos = settings.LOGIN_JANELA_SEGUNDOS // 60
+                    messages.error(request, f'Muitas tentativas falhadas. Bloqueado por {minutos} minutos.')
                 else:
-                    remaining = 5 - attempt_record.failed_attempts
                     messages.error(request, f'Credenciais incorretas. ({remaining} tentativas restantes)')
-                attempt_record.save()
     else:
         form = LoginForm()
     
@@ -169,7 +155,7 @@ def activate_account(request, uidb64, token):
         messages.error(request, 'Link de ativação inválido.')
         return redirect('medicoes:signup')
 
-    if timezone.now() - pending.created_at > timedelta(days=7):
+    if timezone.now() - pending.created_at > timedelta(days=settings.REGISTRO_PENDENTE_DIAS):
         pending.delete()
         messages.error(request, 'O link expirou. Registre-se novamente.')
         return redirect('medicoes:signup')
@@ -211,6 +197,37 @@ def activate_account(request, uidb64, token):
     return redirect('medicoes:login')
 
 
+@require_http_methods(["GET", "POST"])
+def aceitar_convite(request, uidb64, token):
+    """Definição de senha pelo link do convite do cadastro em lote"""
+    try:
+        user = CustomUser.objects.get(pk=force_str(urlsafe_base64_decode(uidb64)))
+    except (ValueError, CustomUser.DoesNotExist):
+        user = None
+
+    # Como no PasswordResetConfirmView: o token vai para a sessão e sai da URL,
+    # para não vazar pelo Referer de recursos carregados pelo formulário
+    if token == TOKEN_CONVITE_NA_SESSAO:
+        token = request.session.get(SESSAO_TOKEN_CONVITE)
+    elif user is not None and token_convite.check_token(user, token):
+        request.session[SESSAO_TOKEN_CONVITE] = token
+        return redirect(request.path.replace(token, TOKEN_CONVITE_NA_SESSAO))
+
+    # O token muda quando a senha é definida: o link só vale uma vez
+    if user is None or not token_convite.check_token(user, token):
+        messages.error(request, 'Convite inválido ou expirado. Peça um novo ao administrador.')
+        return redirect('medicoes:login')
+
+    form = DefinirSenhaConviteForm(user, request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        form.save()
+        del request.session[SESSAO_TOKEN_CONVITE]
+        messages.success(request, f'Senha definida! Entre com seu email ou com o usuário {user.username}.')
+        return redirect('medicoes:login')
+
+    return render(request, 'medicoes/aceitar_convite.html', {'form': form, 'convidado': user})
+
+
 @require_http_methods(["GET", "POST"])
 def email_confirmation_view(request):
     email = request.GET.get('email', '')
@@ -228,7 +245,7 @@ def email_confirmation_view(request):
                 'user': {'first_name': pending.data.get('first_name'), 'username': email.split('@')[0]},
                 'activation_link': activation_link,
             })
-            send_mail('Ative sua conta - Gravimeasure', message, settings.DEFAULT_FROM_EMAIL, [email], html_message=message)
+            fila_email.enfileirar('Ative sua conta - Gravimeasure', fila_email.texto_simples(message), [email], corpo_html=message)
             messages.success(request, 'Email reenviado!')
         except Exception:
             messages.error(request, 'Erro ao reenviar.')
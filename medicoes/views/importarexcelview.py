@@ -1,4 +1,4 @@
-import pandas as pd
+import time
 from decimal import Decimal, InvalidOperation
 from django.db import transaction
 from django.shortcuts import render, redirect
@@ -8,7 +8,8 @@ from django.views.decorators.http import require_http_methods
 from django.http import JsonResponse
 
 from ..forms import UploadExcelForm
-from ..models import MedicaoGravimetrica
+from ..metricas import IMPORTACAO_LINHAS, IMPORTACAO_SEGUNDOS
+from ..models import MedicaoGravimetrica, ObservacaoGravimetrica
 
 # ============================================================================
 # Helpers
@@ -16,6 +17,8 @@ from ..models import MedicaoGravimetrica
 
 def clean_decimal(value, default=None):
     """Converte valores do Excel para Decimal aceito pelo Django."""
+    import pandas as pd
+
     if pd.isna(value) or value == "":
         return default
     try:
@@ -58,11 +61,20 @@ def importar_medicoes_excel(request):
             arquivo = request.FILES["arquivo"]
 
             try:
+                # pandas só é carregado quando há uma planilha para ler
+                import pandas as pd
+
                 df = pd.read_excel(arquivo)
                 df.columns = [c.strip().lower() for c in df.columns]
 
                 sucesso = 0
+                reocupadas = 0
                 erros = []
+                inicio = time.perf_counter()
+
+                # Estações já cadastradas recebem a linha como nova observação (reocupação)
+                codigos = [str(c).strip() for c in df.get("codigo_estacao", [])]
+                existentes = MedicaoGravimetrica.objects.in_bulk(codigos, field_name="codigo_estacao")
 
                 # Usando transaction.atomic para não salvar pela metade se der erro grave
                 with transaction.atomic():
@@ -87,6 +99,21 @@ def importar_medicoes_excel(request):
                                 linha.get("incerteza") or linha.get("erro") or linha.get("sigma")
                             )
 
+                            existente = existentes.get(codigo)
+                            if existente is not None:
+                                observacao = ObservacaoGravimetrica(
+                                    estacao=existente,
+                                    valor_gravidade=grav,
+                                    altitude=altitude if altitude is not None else existente.altitude,
+                                    incerteza=incerteza,
+                                    data_medicao=data_medicao,
+                                    usuario=request.user
+                                )
+                                observacao.full_clean()
+                                observacao.save()
+                                reocupadas += 1
+                                continue
+
                             estacao = MedicaoGravimetrica(
                                 codigo_estacao=codigo,
                                 nome_estacao=nome,
@@ -101,12 +128,23 @@ def importar_medicoes_excel(request):
 
                             estacao.full_clean()
                             estacao.save()
+                            existentes[codigo] = estacao
 
                             sucesso += 1
 
                         except Exception as e:
                             erros.append(f"Linha {index+2} | Estação {codigo} → {str(e)}")
 
+                IMPORTACAO_SEGUNDOS.inc(time.perf_counter() - inicio)
+                IMPORTACAO_LINHAS.inc(sucesso + reocupadas, resultado='sucesso')
+                IMPORTACAO_LINHAS.inc(len(erros), resultado='erro')
+
+                if reocupadas:
+                    messages.info(
+                        request,
+                        f"{reocupadas} linhas registradas como novas observações de estações existentes."
+                    )
+
                 if erros:
                     messages.warning(
                         request,
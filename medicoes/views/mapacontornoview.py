@@ -2,15 +2,8 @@ import io
 import base64
 import logging
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
-from scipy.interpolate import griddata, RBFInterpolator
-from scipy.spatial import ConvexHull
-from matplotlib.path import Path
-
-# Configuração para backend não interativo (essencial para Django/Threads)
-matplotlib.use('Agg')
 
+from ..instrumentacao import trecho
 from ..models import MedicaoGravimetrica
 
 logger = logging.getLogger(__name__)
@@ -30,6 +23,14 @@ def gerar_mapa_contorno_medicao(medicao_foco):
     if qs.count() < 4:
         return None
 
+    # matplotlib e scipy.interpolate custam ~1 s de import: só entram quando um mapa é gerado
+    import matplotlib
+    matplotlib.use('Agg')  # backend não interativo (essencial para Django/Threads)
+    import matplotlib.pyplot as plt
+    from matplotlib.path import Path
+    from scipy.interpolate import griddata, RBFInterpolator
+    from scipy.spatial import ConvexHull
+
     longs = np.array([float(m.longitude) for m in qs])
     lats = np.array([float(m.latitude) for m in qs])
     vals = np.array([float(m.anomalia_bouguer) for m in qs])
@@ -46,23 +47,24 @@ def gerar_mapa_contorno_medicao(medicao_foco):
     yi = np.linspace(lats.min() - 0.1, lats.max() + 0.1, 300)
     X, Y = np.meshgrid(xi, yi)
 
-    try:
-        obs_coords = np.column_stack((longs, lats))
-        grid_coords = np.column_stack((X.ravel(), Y.ravel()))
-        
-        interpolador = RBFInterpolator(
-            obs_coords, 
-            vals, 
-            kernel='thin_plate_spline', 
-            smoothing=0.1
-        )
-        Z_flat = interpolador(grid_coords)
-        Z = Z_flat.reshape(X.shape)
-        
-    except Exception as e:
-        logger.error(f"Erro na interpolação RBF: {e}")
-        # Fallback de segurança: Linear
-        Z = griddata((longs, lats), vals, (X, Y), method='linear')
+    with trecho('rbf'):
+        try:
+            obs_coords = np.column_stack((longs, lats))
+            grid_coords = np.column_stack((X.ravel(), Y.ravel()))
+            
+            interpolador = RBFInterpolator(
+                obs_coords, 
+                vals, 
+                kernel='thin_plate_spline', 
+                smoothing=0.1
+            )
+            Z_flat = interpolador(grid_coords)
+            Z = Z_flat.reshape(X.shape)
+            
+        except Exception as e:
+            logger.error(f"Erro na interpolação RBF: {e}")
+            # Fallback de segurança: Linear
+            Z = griddata((longs, lats), vals, (X, Y), method='linear')
 
     # MÁSCARA CONVEX HULL
     pts = np.column_stack((longs, lats))
@@ -89,35 +91,36 @@ def gerar_mapa_contorno_medicao(medicao_foco):
         levels = 50
         isoline_levels = 10
 
-    fig, ax = plt.subplots(figsize=(8, 7), dpi=200)
+    with trecho('contorno'):
+        fig, ax = plt.subplots(figsize=(8, 7), dpi=200)
     
-    if isinstance(levels, np.ndarray):
-        # Fundo colorido
-        cntr = ax.contourf(X, Y, Z, levels=levels, cmap="turbo", extend='both', vmin=z_min, vmax=z_max)
-        fig.colorbar(cntr, ax=ax, label='Anomalia Observada (mGal)')
+        if isinstance(levels, np.ndarray):
+            # Fundo colorido
+            cntr = ax.contourf(X, Y, Z, levels=levels, cmap="turbo", extend='both', vmin=z_min, vmax=z_max)
+            fig.colorbar(cntr, ax=ax, label='Anomalia Observada (mGal)')
         
-        # Isolinhas
-        lines = ax.contour(X, Y, Z, levels=isoline_levels, colors='black', linewidths=0.5, alpha=0.6, vmin=z_min, vmax=z_max)
-        ax.clabel(lines, inline=True, fontsize=7, fmt='%.1f')
+            # Isolinhas
+            lines = ax.contour(X, Y, Z, levels=isoline_levels, colors='black', linewidths=0.5, alpha=0.6, vmin=z_min, vmax=z_max)
+            ax.clabel(lines, inline=True, fontsize=7, fmt='%.1f')
 
-    # Marcadores
-    ax.scatter(longs, lats, c='black', s=10, alpha=0.3, zorder=3)
-    ax.scatter(f_long, f_lat, c='gold', s=350, marker='*', edgecolors='black', linewidths=1.2, zorder=10)
+        # Marcadores
+        ax.scatter(longs, lats, c='black', s=10, alpha=0.3, zorder=3)
+        ax.scatter(f_long, f_lat, c='gold', s=350, marker='*', edgecolors='black', linewidths=1.2, zorder=10)
 
-    ax.set_xlim(xlims)
-    ax.set_ylim(ylims)
-    ax.set_aspect('equal')
+        ax.set_xlim(xlims)
+        ax.set_ylim(ylims)
+        ax.set_aspect('equal')
     
-    ax.set_xlabel('Longitude (°W)')
-    ax.set_ylabel('Latitude (°S)')
+        ax.set_xlabel('Longitude (°W)')
+        ax.set_ylabel('Latitude (°S)')
     
-    codigo = getattr(medicao_foco, 'codigo_estacao', 'Desconhecida')
-    ax.set_title(f"Mapa Bouguer: Estação {codigo}", pad=20)
-    ax.grid(True, linestyle='--', alpha=0.1)
+        codigo = getattr(medicao_foco, 'codigo_estacao', 'Desconhecida')
+        ax.set_title(f"Mapa Bouguer: Estação {codigo}", pad=20)
+        ax.grid(True, linestyle='--', alpha=0.1)
 
-    # Conversão para Base64
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=200, bbox_inches='tight')
-    plt.close(fig)
+        # Conversão para Base64
+        buf = io.BytesIO()
+        plt.savefig(buf, format='png', dpi=200, bbox_inches='tight')
+        plt.close(fig)
     
     return f"data:image/png;base64,{base64.b64encode(buf.getvalue()).decode('utf-8')}"
\ No newline at end of file
@@ -9,10 +9,19 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.http import JsonResponse, HttpResponse, HttpResponseServerError
 from django.template.loader import render_to_string
-from django.db import models
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils.decorators import method_decorator
 
 # Importações Absolutas (Garante que vai achar o models e forms)
+from medicoes import espacial
+from medicoes.cache_dados import em_cache
+from medicoes.instrumentacao import trecho
+from medicoes.metricas import PDF_SEGUNDOS
 from medicoes.models import MedicaoGravimetrica
+from medicoes.busca import buscar_estacoes, ORDEM_RELEVANCIA
+from medicoes.paginacao import PaginadorContagemCache, paginar_por_cursor
+from medicoes.roteamento import leitura_replica
 from medicoes.forms import MedicaoGravimetricaForm
 from .mapacontornoview import gerar_mapa_contorno_medicao
 
@@ -31,12 +40,18 @@ def is_admin(user):
 # MEDICOES VIEWS - Com restrições de permissão baseadas em user_type
 # ============================================================================
 
+# Views só de leitura (ou com renderização demorada de PDF/mapa) ficam fora do
+# ATOMIC_REQUESTS: no SQLite a transação seguraria o lock de leitura durante
+# todo o processamento e travaria as importações concorrentes.
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
 class MedicaoListView(ListView):
     """Lista todas as medições gravimétricas com filtros avançados"""
     model = MedicaoGravimetrica
     template_name = 'medicoes/lista.html'
     context_object_name = 'medicoes'
     paginate_by = 20
+    paginator_class = PaginadorContagemCache
+    PARAMETROS_PAGINACAO = ('page', 'apos', 'antes')
     
     def dispatch(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
@@ -46,14 +61,10 @@ class MedicaoListView(ListView):
     def get_queryset(self):
         queryset = MedicaoGravimetrica.objects.all()
         
-        # Filtro de busca por texto
-        search = self.request.GET.get('search', '')
+        # Filtro de busca por texto (índice trigram, ordenado por relevância)
+        search = self.request.GET.get('search', '').strip()
         if search:
-            queryset = queryset.filter(
-                models.Q(nome_estacao__icontains=search) |
-                models.Q(codigo_estacao__icontains=search) |
-                models.Q(operador__icontains=search)
-            )
+            queryset = buscar_estacoes(queryset, search)
         
         # Filtro por data inicial
         data_inicio = self.request.GET.get('data_inicio', '')
@@ -96,11 +107,39 @@ class MedicaoListView(ListView):
             except ValueError:
                 pass
         
+        # Filtros espaciais: bbox=lon_min,lat_min,lon_max,lat_max ou lat/lon/raio_km
+        queryset = espacial.filtrar_por_parametros(queryset, self.request.GET)
+        
         # Mostrar todas as medições (ativas e inativas para admin)
         if not self.request.user.is_admin():
             queryset = queryset.filter(ativo=True)
         
-        return queryset.order_by('-data_medicao')
+        if search:
+            return queryset.order_by(*ORDEM_RELEVANCIA)
+        return queryset.order_by('-data_medicao', '-id')
+
+    def usa_cursor(self):
+        # Resultados de busca seguem a relevância, que não serve de chave de cursor
+        return settings.LISTA_PAGINACAO == 'cursor' and not self.request.GET.get('search', '').strip()
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.usa_cursor():
+            return super().paginate_queryset(queryset, page_size)
+        pagina = paginar_por_cursor(
+            queryset, page_size,
+            apos=self.request.GET.get('apos'),
+            antes=self.request.GET.get('antes'),
+        )
+        return None, pagina, pagina.object_list, pagina.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        filtros = self.request.GET.copy()
+        for parametro in self.PARAMETROS_PAGINACAO:
+            filtros.pop(parametro, None)
+        context['paginacao_cursor'] = self.usa_cursor()
+        context['filtros_querystring'] = filtros.urlencode()
+        return context
 
 
 class MedicaoCreateView(CreateView):
@@ -157,6 +196,9 @@ class MedicaoDeleteView(DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
+@transaction.non_atomic_requests
+@leitura_replica
+@PDF_SEGUNDOS.cronometrar(tipo='medicao')
 def gerar_pdf_medicao(request, pk):
     """Gera PDF de uma medição específica"""
     if not request.user.is_authenticated:
@@ -311,7 +353,8 @@ def gerar_pdf_medicao(request, pk):
         print(f"[PDF DEBUG] css_path={css_path} exists={os.path.exists(css_path)} stylesheets={stylesheets}")
         
         pdf_file = io.BytesIO()
-        html.write_pdf(pdf_file, stylesheets=stylesheets, font_config=font_config)
+        with trecho('pdf'):
+            html.write_pdf(pdf_file, stylesheets=stylesheets, font_config=font_config)
         pdf_file.seek(0)
         
     except (ImportError, OSError):
@@ -335,7 +378,8 @@ def gerar_pdf_medicao(request, pk):
                 html_for_pisa = html_string
 
             pdf_file = io.BytesIO()
-            result = pisa.CreatePDF(html_for_pisa, dest=pdf_file, encoding='utf-8')
+            with trecho('pdf'):
+                result = pisa.CreatePDF(html_for_pisa, dest=pdf_file, encoding='utf-8')
             pdf_file.seek(0)
 
             if result.err:
@@ -355,6 +399,9 @@ def gerar_pdf_medicao(request, pk):
     return response
 
 
+@transaction.non_atomic_requests
+@leitura_replica
+@PDF_SEGUNDOS.cronometrar(tipo='consolidado')
 def gerar_pdf_consolidado(request):
     """Gera PDF consolidado com todas as medições ativas"""
     if not request.user.is_authenticated:
@@ -381,7 +428,8 @@ def gerar_pdf_consolidado(request):
             stylesheets.append(CSS(filename=css_path))
 
         pdf_file = io.BytesIO()
-        html.write_pdf(pdf_file, stylesheets=stylesheets, font_config=font_config)
+        with trecho('pdf'):
+            html.write_pdf(pdf_file, stylesheets=stylesheets, font_config=font_config)
         pdf_file.seek(0)
         
     except (ImportError, OSError):
@@ -389,7 +437,8 @@ def gerar_pdf_consolidado(request):
             from xhtml2pdf import pisa
             
             pdf_file = io.BytesIO()
-            result = pisa.CreatePDF(html_string, dest=pdf_file, encoding='utf-8')
+            with trecho('pdf'):
+                result = pisa.CreatePDF(html_string, dest=pdf_file, encoding='utf-8')
             pdf_file.seek(0)
             
             if result.err:
@@ -402,13 +451,16 @@ def gerar_pdf_consolidado(request):
     return response
 
 
+@transaction.non_atomic_requests
 def home(request):
     """Página inicial com mapa e lista de medições"""
     if not request.user.is_authenticated:
         return redirect('medicoes:login')
     
     from datetime import datetime
-    medicoes = MedicaoGravimetrica.objects.filter(ativo=True).order_by('-data_medicao')[:10]
+    medicoes = em_cache(
+        'home', calcular=lambda: list(MedicaoGravimetrica.objects.filter(ativo=True).order_by('-data_medicao')[:10])
+    )
     
     context = {
         'medicoes': medicoes,
@@ -422,57 +474,130 @@ def home(request):
     return render(request, 'medicoes/home.html', context)
 
 
+@transaction.non_atomic_requests
 @login_required
 @require_http_methods(["GET"])
+@leitura_replica
 def medicoes_api(request):
     """API que retorna todas as medições ativas em formato JSON para o mapa"""
+    # Escalas pequenas: ?agrupar=1..8 devolve células agregadas no banco
+    precisao = None
+    if request.GET.get('agrupar'):
+        try:
+            precisao = int(request.GET['agrupar'])
+        except ValueError:
+            precisao = 0
+        if not 1 <= precisao <= 8:
+            return JsonResponse({'success': False, 'error': 'agrupar deve ser um inteiro entre 1 e 8.', 'medicoes': []}, status=400)
+
     try:
-        medicoes = MedicaoGravimetrica.objects.filter(ativo=True).order_by('nome_estacao')
-        
-        dados = []
-        for medicao in medicoes:
-            try:
-                dados.append({
-                    'id': medicao.id,
-                    'nome_estacao': medicao.nome_estacao,
-                    'codigo_estacao': medicao.codigo_estacao,
-                    'latitude': float(medicao.latitude),
-                    'longitude': float(medicao.longitude),
-                    'altitude': float(medicao.altitude) if medicao.altitude else None,
-                    'data_medicao': medicao.data_medicao.strftime('%d/%m/%Y'),
-                    'gravidade_medida': float(medicao.valor_gravidade),
-                    'operador': medicao.operador or 'N/A',
-                    'marker_icon': medicao.marker_icon if hasattr(medicao, 'marker_icon') else 'default',
-                    'marker_custom_url': medicao.marker_custom_url if hasattr(medicao, 'marker_custom_url') else None,
-                    'url_pdf': f'/medicoes/{medicao.pk}/pdf/',
-                })
-            except Exception as e:
-                print(f"Erro ao processar medição {medicao.id}: {str(e)}")
-                continue
-        
-        return JsonResponse({
-            'success': True,
-            'count': len(dados),
-            'medicoes': dados
-        })
-    except Exception as e:
+        # Mesmos parâmetros, mesma resposta até a próxima gravação de estação
+        dados = em_cache('api_mapa', sorted(request.GET.lists()), calcular=lambda: _dados_mapa(request.GET, precisao))
+        return JsonResponse(dados)
+    except DatabaseError:
+        logger.exception('Erro ao consultar as medições do mapa')
         return JsonResponse({
             'success': False,
-            'error': str(e),
+            'error': 'Erro ao consultar as medições.',
             'medicoes': []
         }, status=500)
 
 
+def _dados_mapa(params, precisao=None):
+    medicoes = MedicaoGravimetrica.objects.filter(ativo=True).order_by('nome_estacao')
+    # Recorte opcional da área visível do mapa (?bbox=lon_min,lat_min,lon_max,lat_max)
+    medicoes = espacial.filtrar_por_parametros(medicoes, params)
+
+    if precisao:
+        grupos = espacial.agrupar(medicoes, precisao)
+        return {'success': True, 'count': len(grupos), 'grupos': grupos}
+    
+    dados = []
+    for medicao in medicoes:
+        try:
+            dados.append({
+                'id': medicao.id,
+                'nome_estacao': medicao.nome_estacao,
+                'codigo_estacao': medicao.codigo_estacao,
+                'latitude': float(medicao.latitude),
+                'longitude': float(medicao.longitude),
+                'altitude': float(medicao.altitude) if medicao.altitude else None,
+                'data_medicao': medicao.data_medicao.strftime('%d/%m/%Y'),
+                'gravidade_medida': float(medicao.valor_gravidade),
+                'operador': medicao.operador or 'N/A',
+                'marker_icon': medicao.marker_icon if hasattr(medicao, 'marker_icon') else 'default',
+                'marker_custom_url': medicao.marker_custom_url if hasattr(medicao, 'marker_custom_url') else None,
+                'url_pdf': f'/medicoes/{medicao.pk}/pdf/',
+            })
+        except Exception as e:
+            print(f"Erro ao processar medição {medicao.id}: {str(e)}")
+            continue
+    
+    return {
+        'success': True,
+        'count': len(dados),
+        'medicoes': dados
+    }
+
+
+@transaction.non_atomic_requests
+@login_required
+@require_http_methods(["GET"])
+def estacoes_proximas_api(request):
+    """API com as estações ativas mais próximas de um ponto (?lat=&lon=&k=&raio_km=)"""
+    try:
+        lat = float(request.GET['lat'])
+        lon = float(request.GET['lon'])
+        k = min(int(request.GET.get('k', 10)), 100)
+        raio_km = float(request.GET['raio_km']) if request.GET.get('raio_km') else None
+    except (KeyError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Informe lat, lon numéricos (e opcionalmente k e raio_km).'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or k < 1:
+        return JsonResponse({'success': False, 'error': 'Coordenadas ou k fora do intervalo.'}, status=400)
+
+    estacoes = espacial.estacoes_proximas(lat, lon, k=k, raio_km=raio_km)
+    return JsonResponse({
+        'success': True,
+        'count': len(estacoes),
+        'estacoes': [
+            {
+                'id': estacao.id,
+                'codigo_estacao': estacao.codigo_estacao,
+                'nome_estacao': estacao.nome_estacao,
+                'latitude': float(estacao.latitude),
+                'longitude': float(estacao.longitude),
+                'distancia_km': round(estacao.distancia_km, 3),
+                'gravidade_medida': float(estacao.valor_gravidade),
+            }
+            for estacao in estacoes
+        ],
+    })
+
+
+@transaction.non_atomic_requests
 @login_required
 @require_http_methods(["GET"])
 def medicao_detail(request, codigo_estacao):
     """Exibe detalhes de uma medição específica"""
-    medicao = get_object_or_404(MedicaoGravimetrica, codigo_estacao=codigo_estacao)
-    
     from datetime import datetime
+
+    def carregar():
+        medicao = get_object_or_404(MedicaoGravimetrica, codigo_estacao=codigo_estacao)
+        # Histórico de reocupações (índice estacao + data_medicao)
+        historico = list(medicao.historico.ordem_cronologica_inversa()[:50])
+        proximas = espacial.estacoes_proximas(medicao.latitude, medicao.longitude, k=5, excluir=[medicao.pk])
+        return medicao, historico, proximas
+
+    medicao, historico, proximas = em_cache('detalhe', codigo_estacao, calcular=carregar)
+    variacao = None
+    if len(historico) > 1:
+        variacao = historico[0].valor_gravidade - historico[1].valor_gravidade
     
     context = {
         'medicao': medicao,
+        'historico': historico,
+        'variacao_gravidade': variacao,
+        'proximas': proximas,
         'year': datetime.now().year,
         'can_edit': request.user.is_authenticated and (
             request.user.is_operator() or request.user.is_admin()
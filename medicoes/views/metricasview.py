@@ -0,0 +1,27 @@
+import hmac
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_http_methods
+
+from ..metricas import REGISTRO
+
+TIPO_EXPOSICAO = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _coletor_autorizado(request):
+    """Token Bearer quando METRICAS_TOKEN está definido; senão, só os IPs de METRICAS_IPS"""
+    if settings.METRICAS_TOKEN:
+        enviado = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        return hmac.compare_digest(enviado, settings.METRICAS_TOKEN)
+    return request.META.get('REMOTE_ADDR') in settings.METRICAS_IPS
+
+
+@transaction.non_atomic_requests
+@require_http_methods(["GET"])
+def metricas_view(request):
+    """Métricas da aplicação no formato texto do Prometheus"""
+    if not _coletor_autorizado(request):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRO.exposicao(), content_type=TIPO_EXPOSICAO)